@@ -0,0 +1,136 @@
+"""
+Komprimierung für gestreamte und vollständige Antworten (gzip, optional brotli).
+"""
+import gzip
+import os
+import zlib
+from typing import Iterator, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '5'))
+# Kleinere Antworten werden unkomprimiert ausgeliefert
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+_COMPRESSIBLE_TYPES = (b'application/json', b'text/', b'application/geo+json')
+
+
+def accepted_encodings(header: Optional[str]) -> dict:
+    """Accept-Encoding als {encoding: q}; Einträge mit q=0 werden ausgelassen."""
+    encodings = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            encodings[name] = q
+    return encodings
+
+
+def accepts_gzip(header: Optional[str]) -> bool:
+    encodings = accepted_encodings(header)
+    return 'gzip' in encodings or '*' in encodings
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """Komprimiert einen Byte-Stream blockweise im gzip-Format."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def choose_encoding(header: Optional[str]) -> Optional[str]:
+    """Bevorzugt brotli (falls installiert) vor gzip; None, wenn der Client keines von beiden akzeptiert."""
+    encodings = accepted_encodings(header)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings or '*' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Komprimiert vollständig vorliegende JSON-/Text-Antworten ab COMPRESSION_MIN_SIZE Bytes.
+
+    Gestreamte Antworten (mehrere Body-Nachrichten) und Antworten mit eigener
+    Content-Encoding (z.B. der gzip-Stream des GeoJSON-Endpunkts) bleiben unverändert.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for name, value in scope.get('headers', []):
+            if name == b'accept-encoding':
+                accept = value.decode('latin-1')
+                break
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Die Start-Nachricht wird zurückgehalten, bis klar ist, ob der Body komprimiert wird
+        held_start = None
+
+        async def send_wrapper(message):
+            nonlocal held_start
+            if message['type'] == 'http.response.start':
+                held_start = message
+                return
+            if held_start is not None:
+                start, held_start = held_start, None
+                if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                    compressed = self._compressed(start, message.get('body', b''), encoding)
+                    if compressed is not None:
+                        start, body = compressed
+                        message = {'type': 'http.response.body', 'body': body}
+                await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _compressed(self, start, body: bytes, encoding: str):
+        headers = list(start.get('headers', []))
+        names = {k.lower() for k, _ in headers}
+        content_type = next((v for k, v in headers if k.lower() == b'content-type'), b'')
+        if (b'content-encoding' in names or len(body) < self.minimum_size or start['status'] < 200
+                or not content_type.startswith(_COMPRESSIBLE_TYPES)):
+            return None
+        compressed = compress(body, encoding)
+        vary = [v for k, v in headers if k.lower() == b'vary']
+        headers = [(k, v) for k, v in headers if k.lower() not in (b'content-length', b'vary')]
+        # Die komprimierte Darstellung ist nicht byte-identisch: starke ETags werden schwach (wie bei nginx)
+        headers = [(k, b'W/' + v if k.lower() == b'etag' and v.startswith(b'"') else v) for k, v in headers]
+        vary_value = b', '.join(vary + [b'Accept-Encoding']) if vary else b'Accept-Encoding'
+        headers += [
+            (b'content-encoding', encoding.encode()),
+            (b'content-length', str(len(compressed)).encode()),
+            (b'vary', vary_value)
+        ]
+        return {**start, 'headers': headers}, compressed
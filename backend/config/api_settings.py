@@ -0,0 +1,39 @@
+"""
+Schlanke Django-Einstellungen für die FastAPI-Worker (main.py).
+
+Die API braucht vom ORM nur settings_app. Admin, DRF, CORS, Sessions, Messages,
+Staticfiles, Templates und Middleware werden nicht geladen, Logs gehen nach stderr statt
+in die Datei unter /var/log. Datenbank, Schlüssel und Zeitzone kommen aus config.settings,
+Migrationen und Admin laufen weiterhin mit config.settings (manage.py, wsgi).
+"""
+from .settings import (  # noqa: F401
+    BASE_DIR, SECRET_KEY, DEBUG, DATABASES, DEFAULT_AUTO_FIELD, FIELD_ENCRYPTION_KEY,
+    LANGUAGE_CODE, TIME_ZONE, USE_I18N, USE_TZ,
+)
+
+INSTALLED_APPS = [
+    'settings_app',
+]
+
+MIDDLEWARE = []
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+        'gis': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
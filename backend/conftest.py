@@ -0,0 +1,12 @@
+# Macht die Module in backend/ für die Tests unter tests/ importierbar.
+# Django wird mit den schlanken API-Einstellungen initialisiert, damit Module mit
+# ORM-Importen (spatial_index, ...) ohne Datenbank geladen werden können.
+import os
+
+import django
+from cryptography.fernet import Fernet
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.api_settings')
+os.environ.setdefault('DJANGO_SECRET_KEY', 'test')
+os.environ.setdefault('FIELD_ENCRYPTION_KEY', Fernet.generate_key().decode())
+django.setup()
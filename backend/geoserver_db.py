@@ -0,0 +1,65 @@
+"""
+Async-Verbindungspool für die Geoserver PostGIS-Datenbank (Vektorkacheln, Abfragen).
+
+Aufbau wie umap_db: der Pool entsteht aus der 'geoserver'-Zeile von Settings und wird
+neu erstellt, sobald sich die Verbindungsparameter ändern.
+"""
+import asyncio
+import os
+from typing import Optional, Dict, Any
+
+from psycopg_pool import AsyncConnectionPool
+
+import metrics
+from umap_db import build_conninfo
+
+GEOSERVER_POOL_MIN_SIZE = int(os.getenv('GEOSERVER_POOL_MIN_SIZE', '1'))
+GEOSERVER_POOL_MAX_SIZE = int(os.getenv('GEOSERVER_POOL_MAX_SIZE', '10'))
+GEOSERVER_POOL_TIMEOUT = float(os.getenv('GEOSERVER_POOL_TIMEOUT', '10'))
+GEOSERVER_POOL_MAX_IDLE = float(os.getenv('GEOSERVER_POOL_MAX_IDLE', '300'))
+
+_pool: Optional[AsyncConnectionPool] = None
+_pool_conninfo: Optional[str] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool(config: Dict[str, Any]) -> AsyncConnectionPool:
+    global _pool, _pool_conninfo
+    conninfo = build_conninfo(config)
+    if _pool is not None and _pool_conninfo == conninfo:
+        return _pool
+
+    async with _pool_lock:
+        if _pool is not None and _pool_conninfo == conninfo:
+            return _pool
+
+        old_pool = _pool
+        pool = AsyncConnectionPool(
+            conninfo,
+            min_size=GEOSERVER_POOL_MIN_SIZE,
+            max_size=GEOSERVER_POOL_MAX_SIZE,
+            timeout=GEOSERVER_POOL_TIMEOUT,
+            max_idle=GEOSERVER_POOL_MAX_IDLE,
+            check=AsyncConnectionPool.check_connection,
+            name='geoserver',
+            kwargs={'cursor_factory': metrics.timed_cursor('geoserver_db')},
+            open=False
+        )
+        await pool.open()
+        _pool, _pool_conninfo = pool, conninfo
+
+    if old_pool is not None:
+        await old_pool.close()
+    return pool
+
+
+def pool_stats() -> Dict[str, int]:
+    return _pool.get_stats() if _pool is not None else {}
+
+
+async def close_pool():
+    global _pool, _pool_conninfo
+    async with _pool_lock:
+        pool, _pool, _pool_conninfo = _pool, None, None
+    if pool is not None:
+        await pool.close()
@@ -0,0 +1,356 @@
+"""
+Export von uMap-Datalayern in das Geoserver-Schema der PostGIS-Datenbank.
+
+Jede Datalayer-Datei wird zweimal gestreamt: im ersten Durchlauf werden die
+Spaltentypen der Properties bestimmt, im zweiten werden die Features als
+typisierte Zeilen per COPY in Batches geladen. Der Speicherbedarf hängt damit
+nicht von der Größe des Layers ab. Pro Datalayer entsteht eine Tabelle
+umap_<map_id>_<datalayer_id>, die innerhalb einer Transaktion ersetzt wird.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+import psycopg
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+import umap_files
+import geoserver_rest
+import vector_tiles
+import metrics
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))
+# Gleichzeitig exportierte Karten beim Bulk-Export (Standard und Obergrenze)
+EXPORT_PARALLELISM = int(os.getenv('EXPORT_PARALLELISM', '4'))
+EXPORT_MAX_PARALLELISM = int(os.getenv('EXPORT_MAX_PARALLELISM', '8'))
+EXPORT_SRID = 4326
+
+_TYPE_SQL = {
+    'boolean': 'boolean',
+    'bigint': 'bigint',
+    'double': 'double precision',
+    'text': 'text',
+    'jsonb': 'jsonb',
+}
+_RESERVED_COLUMNS = {'fid', 'geom'}
+_GEOMETRY_TYPES = {'Point', 'LineString', 'Polygon', 'MultiPoint', 'MultiLineString', 'MultiPolygon', 'GeometryCollection'}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def table_name(map_id: int, datalayer_id: int) -> str:
+    return f"umap_{map_id}_{datalayer_id}"
+
+
+def _value_kind(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'bigint' if -2**63 <= value < 2**63 else 'double'
+    if isinstance(value, float):
+        return 'double'
+    if isinstance(value, (dict, list)):
+        return 'jsonb'
+    return 'text'
+
+
+def _merge_kinds(current: Optional[str], new: Optional[str]) -> Optional[str]:
+    if current is None or current == new:
+        return new or current
+    if new is None:
+        return current
+    if {current, new} == {'bigint', 'double'}:
+        return 'double'
+    return 'text'
+
+
+def _column_name(key: str, used: set) -> str:
+    name = re.sub(r'[^a-z0-9_]', '_', key.lower()).strip('_') or 'property'
+    if name[0].isdigit() or name in _RESERVED_COLUMNS:
+        name = f"p_{name}"
+    name = name[:60]
+    candidate, suffix = name, 1
+    while candidate in used:
+        suffix += 1
+        candidate = f"{name[:56]}_{suffix}"
+    used.add(candidate)
+    return candidate
+
+
+def infer_columns(relative_path: str) -> List[Tuple[str, str, str]]:
+    """Erster Durchlauf: (Property-Schlüssel, Spaltenname, Spaltentyp) für alle Properties."""
+    kinds: Dict[str, Optional[str]] = {}
+    for feature in umap_files.iter_features(relative_path):
+        for key, value in _properties(feature).items():
+            kinds[key] = _merge_kinds(kinds.get(key), _value_kind(value))
+    used = set()
+    return [(key, _column_name(key, used), kind or 'text') for key, kind in kinds.items()]
+
+
+def _properties(feature) -> Dict[str, Any]:
+    properties = feature.get('properties') if isinstance(feature, dict) else None
+    return properties if isinstance(properties, dict) else {}
+
+
+def _convert(value, kind: str):
+    if value is None:
+        return None
+    if kind == 'jsonb':
+        return Jsonb(value)
+    if kind == 'text':
+        return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else str(value)
+    if kind == 'double':
+        return float(value)
+    return value
+
+
+def _position(position) -> str:
+    return f"{float(position[0])!r} {float(position[1])!r}"
+
+
+def _path(positions) -> str:
+    return '(' + ', '.join(_position(p) for p in positions) + ')'
+
+
+def _wkt(geometry: Dict[str, Any]) -> str:
+    geometry_type = geometry.get('type') if isinstance(geometry, dict) else None
+    if geometry_type not in _GEOMETRY_TYPES:
+        raise ValueError(f"Unbekannter Geometrietyp: {geometry_type}")
+    if geometry_type == 'GeometryCollection':
+        parts = [_wkt(g) for g in geometry.get('geometries') or []]
+        return f"GEOMETRYCOLLECTION({', '.join(parts)})" if parts else 'GEOMETRYCOLLECTION EMPTY'
+    coordinates = geometry.get('coordinates')
+    if not coordinates:
+        return f"{geometry_type.upper()} EMPTY"
+    if geometry_type == 'Point':
+        return f"POINT({_position(coordinates)})"
+    if geometry_type == 'LineString':
+        return f"LINESTRING{_path(coordinates)}"
+    if geometry_type == 'Polygon':
+        return f"POLYGON({', '.join(_path(ring) for ring in coordinates)})"
+    if geometry_type == 'MultiPoint':
+        return f"MULTIPOINT({', '.join('(' + _position(p) + ')' for p in coordinates)})"
+    if geometry_type == 'MultiLineString':
+        return f"MULTILINESTRING({', '.join(_path(line) for line in coordinates)})"
+    if geometry_type == 'MultiPolygon':
+        polygons = ('(' + ', '.join(_path(ring) for ring in polygon) + ')' for polygon in coordinates)
+        return f"MULTIPOLYGON({', '.join(polygons)})"
+
+
+def to_ewkt(geometry: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    GeoJSON-Geometrie als 2D-EWKT (SRID 4326) für COPY in eine geometry-Spalte.
+    Wirft ValueError für ungültige Geometrien (fehlender/unbekannter Typ, fehlerhafte Koordinaten).
+    """
+    if not geometry:
+        return None
+    try:
+        return f"SRID={EXPORT_SRID};{_wkt(geometry)}"
+    except (TypeError, IndexError, AttributeError) as e:
+        raise ValueError(f"Ungültige Geometrie: {e}") from e
+
+
+def export_layer(conn: psycopg.Connection, schema: str, map_id: int, layer: Dict[str, Any],
+                 progress: Optional[Callable[[int], None]] = None,
+                 cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    """
+    Ersetzt die Tabelle eines Datalayers im Schema. Läuft in der Transaktion von conn;
+    der Aufrufer committet.
+    """
+    started = time.perf_counter()
+    table = table_name(map_id, layer['id'])
+    columns = infer_columns(layer['geojson'])
+    qualified = sql.Identifier(schema, table)
+
+    conn.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(qualified))
+    column_defs = [sql.SQL("fid bigint PRIMARY KEY")]
+    column_defs += [sql.SQL("{} {}").format(sql.Identifier(column), sql.SQL(_TYPE_SQL[kind])) for _, column, kind in columns]
+    column_defs.append(sql.SQL("geom geometry(Geometry, {})").format(sql.Literal(EXPORT_SRID)))
+    conn.execute(sql.SQL("CREATE TABLE {} ({})").format(qualified, sql.SQL(', ').join(column_defs)))
+
+    copy_statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        qualified,
+        sql.SQL(', ').join(sql.Identifier(c) for c in ['fid', *(column for _, column, _ in columns), 'geom'])
+    )
+
+    features = umap_files.iter_features(layer['geojson'])
+    fid = 0
+    # Features mit ungültiger Geometrie werden ohne Geometrie (NULL) übernommen und gezählt
+    invalid_geometries = 0
+    exhausted = False
+    with conn.cursor() as cur:
+        while not exhausted:
+            if cancelled and cancelled():
+                raise ExportCancelled()
+            # Ein COPY pro Batch, damit Fortschritt und Abbruch zwischen den Batches greifen
+            with cur.copy(copy_statement) as copy:
+                for _ in range(EXPORT_BATCH_SIZE):
+                    feature = next(features, None)
+                    if feature is None:
+                        exhausted = True
+                        break
+                    if not isinstance(feature, dict):
+                        continue
+                    fid += 1
+                    properties = _properties(feature)
+                    try:
+                        geometry = to_ewkt(feature.get('geometry'))
+                    except ValueError:
+                        geometry = None
+                        invalid_geometries += 1
+                    copy.write_row([
+                        fid,
+                        *(_convert(properties.get(key), kind) for key, _, kind in columns),
+                        geometry
+                    ])
+            if progress:
+                progress(fid)
+
+        cur.execute(sql.SQL("CREATE INDEX ON {} USING GIST (geom)").format(qualified))
+        cur.execute(sql.SQL("ANALYZE {}").format(qualified))
+        # Export-Version im Kommentar: Grundlage für die Invalidierung des Kachel-Caches
+        cur.execute(sql.SQL("COMMENT ON TABLE {} IS {}").format(qualified, sql.Literal(vector_tiles.export_comment(
+            map_id=map_id, datalayer_id=layer['id'], exported_at=datetime.now(timezone.utc).isoformat()
+        ))))
+
+    return {
+        'datalayer_id': layer['id'],
+        'name': layer.get('name'),
+        'table': f"{schema}.{table}",
+        'feature_count': fid,
+        'invalid_geometries': invalid_geometries,
+        'columns': [column for _, column, _ in columns],
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def export_map(geoserver_config: Dict[str, Any], map_id: int, layers: List[Dict[str, Any]],
+               progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+               cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+    """
+    Exportiert alle Datalayer einer Karte (Liste von {'id', 'name', 'geojson'}) in das
+    konfigurierte Workspace-Schema. Alle Tabellen werden in einer Transaktion ersetzt.
+    """
+    schema = geoserver_config['workspace']
+    results = []
+    with psycopg.connect(
+        host=geoserver_config['db_host'],
+        port=geoserver_config['db_port'],
+        dbname=geoserver_config['db_name'],
+        user=geoserver_config['db_user'],
+        password=geoserver_config['db_password'],
+        connect_timeout=5,
+        cursor_factory=metrics.timed_cursor('geoserver_db', sync=True)
+    ) as conn:
+        for index, layer in enumerate(layers):
+            def layer_progress(features_done, index=index, layer=layer):
+                if progress:
+                    progress({'layer_index': index, 'layer_count': len(layers), 'datalayer_id': layer['id'], 'features': features_done})
+            results.append(export_layer(conn, schema, map_id, layer, layer_progress, cancelled))
+        # Verlassen des with-Blocks committet die Transaktion
+    for layer in layers:
+        vector_tiles.invalidate_layer(schema, table_name(map_id, layer['id']))
+    return results
+
+
+def publish_layers(geoserver_config: Dict[str, Any], results: List[Dict[str, Any]]):
+    """
+    Veröffentlicht exportierte Tabellen als Feature Types (nur mit konfigurierten
+    REST-Zugangsdaten). Ergänzt jedes Ergebnis um 'published' ('created', 'updated',
+    'failed' oder None ohne Zugangsdaten) und bei Fehlern um 'publish_error'. Die Tabellen
+    sind bereits committet; ein fehlgeschlagenes Veröffentlichen lässt sich durch einen
+    erneuten Export wiederholen.
+    """
+    if not geoserver_config.get('rest_user'):
+        for result in results:
+            result['published'] = None
+        return
+    client = geoserver_rest.get_client(geoserver_config)
+    workspace = geoserver_config['workspace']
+    try:
+        client.prepare(workspace, geoserver_config)
+    except geoserver_rest.GeoServerError as e:
+        for result in results:
+            result['published'], result['publish_error'] = 'failed', str(e)
+        return
+    for result in results:
+        table = result['table'].split('.', 1)[1]
+        try:
+            result['published'] = client.publish_feature_type(workspace, table, result.get('name'))
+        except geoserver_rest.GeoServerError as e:
+            result['published'], result['publish_error'] = 'failed', str(e)
+
+
+def export_and_publish(geoserver_config: Dict[str, Any], map_id: int, layers: List[Dict[str, Any]],
+                       progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+    results = export_map(geoserver_config, map_id, layers, progress, cancelled)
+    publish_layers(geoserver_config, results)
+    return results
+
+
+def export_maps_bulk(geoserver_config: Dict[str, Any], maps: Dict[int, List[Dict[str, Any]]],
+                     parallelism: int = EXPORT_PARALLELISM,
+                     progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    """
+    Exportiert und veröffentlicht mehrere Karten parallel (map_id -> Datalayer-Liste).
+    Fehler einzelner Karten brechen den Bulk-Export nicht ab, sondern werden pro Karte
+    mit Laufzeiten gemeldet. Karten ohne Datalayer-Liste (None) gelten als nicht gefunden.
+    """
+    parallelism = max(1, min(parallelism, EXPORT_MAX_PARALLELISM))
+    lock = threading.Lock()
+    done = {'maps': 0, 'failed': 0}
+    started = time.perf_counter()
+
+    def run(map_id: int, layers: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        entry = {'map_id': map_id, 'status': 'done', 'error': None, 'layers': [],
+                 'publish_failed': 0, 'export_ms': None, 'publish_ms': None}
+        try:
+            if layers is None:
+                raise LookupError("Karte nicht gefunden")
+            if cancelled and cancelled():
+                raise ExportCancelled()
+            t0 = time.perf_counter()
+            entry['layers'] = export_map(geoserver_config, map_id, layers, cancelled=cancelled)
+            t1 = time.perf_counter()
+            publish_layers(geoserver_config, entry['layers'])
+            entry['publish_failed'] = sum(1 for layer in entry['layers'] if layer['published'] == 'failed')
+            entry['export_ms'] = round((t1 - t0) * 1000, 1)
+            entry['publish_ms'] = round((time.perf_counter() - t1) * 1000, 1)
+        except ExportCancelled:
+            entry['status'] = 'cancelled'
+        except Exception as e:
+            entry['status'] = 'failed'
+            entry['error'] = str(e) or type(e).__name__
+        with lock:
+            done['maps'] += 1
+            done['failed'] += entry['status'] == 'failed'
+            if progress:
+                progress({'maps_done': done['maps'], 'maps_total': len(maps), 'maps_failed': done['failed']})
+        return entry
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='export') as pool:
+        futures = [pool.submit(run, map_id, layers) for map_id, layers in maps.items()]
+        entries = [future.result() for future in futures]
+
+    return {
+        'parallelism': parallelism,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        'succeeded': sum(1 for e in entries if e['status'] == 'done'),
+        'failed': sum(1 for e in entries if e['status'] == 'failed'),
+        'cancelled': sum(1 for e in entries if e['status'] == 'cancelled'),
+        # Exportiert, aber mindestens ein Layer nicht veröffentlicht
+        'publish_failed': sum(1 for e in entries if e['publish_failed']),
+        'maps': entries
+    }
@@ -0,0 +1,134 @@
+"""
+Client für die Geoserver REST-API (Workspaces, PostGIS-Datastores, Feature Types).
+
+Ein httpx.Client mit Keep-Alive-Verbindungspool pro Geoserver-Konfiguration wird von
+allen Export-Threads geteilt und bei geänderten Zugangsdaten neu aufgebaut. Der alte
+Client wird dabei nicht geschlossen, da laufende Exporte ihn noch nutzen können; er wird
+mit der letzten Referenz freigegeben.
+"""
+import hashlib
+import os
+import threading
+from typing import Optional, Dict, Any
+
+import httpx
+
+GEOSERVER_DATASTORE = os.getenv('GEOSERVER_DATASTORE', 'umap_export')
+GEOSERVER_HTTP_TIMEOUT = float(os.getenv('GEOSERVER_HTTP_TIMEOUT', '30'))
+GEOSERVER_HTTP_MAX_CONNECTIONS = int(os.getenv('GEOSERVER_HTTP_MAX_CONNECTIONS', '10'))
+
+
+class GeoServerError(Exception):
+    pass
+
+
+class GeoServerClient:
+
+    def __init__(self, url: str, user: str, password: str):
+        self.base_url = url.rstrip('/') + '/rest'
+        self.http = httpx.Client(
+            base_url=self.base_url,
+            auth=(user, password or ''),
+            timeout=GEOSERVER_HTTP_TIMEOUT,
+            headers={'Accept': 'application/json'},
+            limits=httpx.Limits(
+                max_connections=GEOSERVER_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=GEOSERVER_HTTP_MAX_CONNECTIONS
+            )
+        )
+        self._setup_lock = threading.Lock()
+
+    def _request(self, method: str, path: str, allow_404: bool = False, **kwargs) -> httpx.Response:
+        """Wirft GeoServerError bei Status >= 400; 404 nur mit allow_404 (Existenzprüfung) zulässig."""
+        try:
+            response = self.http.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            raise GeoServerError(f"Geoserver nicht erreichbar ({method} {path}): {str(e)}")
+        if response.status_code >= 400 and not (allow_404 and response.status_code == 404):
+            raise GeoServerError(
+                f"Geoserver-Fehler {response.status_code} bei {method} {path}: {response.text[:300]}"
+            )
+        return response
+
+    def _exists(self, path: str) -> bool:
+        return self._request('GET', path, allow_404=True).status_code != 404
+
+    def ensure_workspace(self, workspace: str):
+        if not self._exists(f"/workspaces/{workspace}"):
+            self._request('POST', '/workspaces', json={'workspace': {'name': workspace}})
+
+    def ensure_datastore(self, workspace: str, db: Dict[str, Any], store: str = GEOSERVER_DATASTORE):
+        """PostGIS-Datastore, der auf das Workspace-Schema der Geoserver-Datenbank zeigt."""
+        if self._exists(f"/workspaces/{workspace}/datastores/{store}"):
+            return
+        entries = {
+            'dbtype': 'postgis',
+            'host': db['db_host'],
+            'port': str(db['db_port']),
+            'database': db['db_name'],
+            'schema': workspace,
+            'user': db['db_user'],
+            'passwd': db['db_password'] or '',
+            'Expose primary keys': 'true',
+        }
+        self._request('POST', f"/workspaces/{workspace}/datastores", json={
+            'dataStore': {
+                'name': store,
+                'connectionParameters': {'entry': [{'@key': k, '$': v} for k, v in entries.items()]}
+            }
+        })
+
+    def prepare(self, workspace: str, db: Dict[str, Any]):
+        """Workspace und Datastore anlegen; serialisiert, damit parallele Exporte sie nicht doppelt anlegen."""
+        with self._setup_lock:
+            self.ensure_workspace(workspace)
+            self.ensure_datastore(workspace, db)
+
+    def publish_feature_type(self, workspace: str, table: str, title: Optional[str] = None,
+                             store: str = GEOSERVER_DATASTORE) -> str:
+        """
+        Veröffentlicht eine Tabelle als Feature Type. Existiert er bereits, werden nur die
+        Bounding Boxes neu berechnet. Gibt 'created' oder 'updated' zurück.
+        """
+        path = f"/workspaces/{workspace}/datastores/{store}/featuretypes"
+        if self._exists(f"{path}/{table}"):
+            self._request('PUT', f"{path}/{table}", params={'recalculate': 'nativebbox,latlonbbox'},
+                          json={'featureType': {'name': table, 'enabled': True}})
+            return 'updated'
+        self._request('POST', path, json={
+            'featureType': {
+                'name': table,
+                'nativeName': table,
+                'title': title or table,
+                'srs': 'EPSG:4326',
+                'enabled': True
+            }
+        })
+        return 'created'
+
+    def close(self):
+        self.http.close()
+
+
+_client: Optional[GeoServerClient] = None
+_client_key: Optional[tuple] = None
+_client_lock = threading.Lock()
+
+
+def get_client(config: Dict[str, Any]) -> GeoServerClient:
+    """Gemeinsamer Client für die aktuelle Geoserver-Konfiguration (url, rest_user, rest_password)."""
+    global _client, _client_key
+    key = (config['url'], config['rest_user'], hashlib.sha256((config['rest_password'] or '').encode()).hexdigest())
+    with _client_lock:
+        if _client is None or _client_key != key:
+            _client = GeoServerClient(config['url'], config['rest_user'], config['rest_password'])
+            _client_key = key
+        return _client
+
+
+def close_client():
+    global _client, _client_key
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client, _client_key = None, None
@@ -0,0 +1,237 @@
+"""
+Tiefe Health-Prüfung aller aktiven Services und Instanzen aus Settings (/api/health/services).
+
+Pro Service laufen die passenden Prüfungen gleichzeitig:
+- database: neue Verbindung zur konfigurierten PostgreSQL-Datenbank und SELECT 1
+- rest: Erreichbarkeit der Web-/REST-Schnittstelle
+- token: Gültigkeit der hinterlegten Zugangsdaten (Geoserver REST-Login, Traccar-Token,
+  KeyCloak-Client-Secret)
+
+Jede Prüfung hat eine eigene Frist (HEALTH_PROBE_TIMEOUT), alle zusammen ein Gesamtbudget
+(HEALTH_TIMEOUT_BUDGET). Das Ergebnis wird HEALTH_CACHE_TTL Sekunden gehalten; gleichzeitige
+Abfragen teilen sich einen laufenden Prüfdurchgang, sodass Monitoring-Scrapes die Upstreams
+nicht vervielfacht belasten.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable, Awaitable, List, Tuple
+
+import httpx
+import psycopg
+
+import metrics
+import umap_db
+
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '3'))
+HEALTH_TIMEOUT_BUDGET = float(os.getenv('HEALTH_TIMEOUT_BUDGET', '5'))
+HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', '10'))
+
+Probe = Callable[[], Awaitable[None]]
+
+_http: Optional[httpx.AsyncClient] = None
+_result: Optional[Dict[str, Any]] = None
+_checked_at = 0.0
+_inflight: Optional[asyncio.Task] = None
+
+
+class ProbeError(Exception):
+    pass
+
+
+def _client() -> httpx.AsyncClient:
+    global _http
+    if _http is None or _http.is_closed:
+        # Keine Redirects folgen: Login-Weiterleitungen zählen als erreichbar
+        _http = httpx.AsyncClient(timeout=HEALTH_PROBE_TIMEOUT, follow_redirects=False)
+    return _http
+
+
+def _expect(response: httpx.Response, accepted=(200,)):
+    if response.status_code in (401, 403):
+        raise ProbeError(f"Zugangsdaten abgelehnt (HTTP {response.status_code})")
+    if response.status_code not in accepted:
+        raise ProbeError(f"HTTP {response.status_code}")
+
+
+async def _probe_database(setting) -> None:
+    conninfo = umap_db.build_conninfo({
+        'db_host': setting.db_host,
+        'db_port': setting.db_port or 5432,
+        'db_name': setting.db_name,
+        'db_user': setting.db_user,
+        'db_password': setting.db_password
+    })
+    async with await psycopg.AsyncConnection.connect(conninfo) as conn:
+        await conn.execute("SELECT 1")
+
+
+async def _probe_website(url: str) -> None:
+    response = await _client().get(url)
+    if response.status_code >= 500:
+        raise ProbeError(f"HTTP {response.status_code}")
+
+
+async def _probe_geoserver_rest(setting) -> None:
+    response = await _client().get(f"{setting.website_url.rstrip('/')}/rest/about/version.json",
+                                   auth=(setting.service_user or '', setting.service_password or ''))
+    _expect(response)
+
+
+async def _probe_traccar_server(setting) -> None:
+    _expect(await _client().get(f"{setting.website_url.rstrip('/')}/api/server"))
+
+
+async def _probe_traccar_token(setting) -> None:
+    # Derselbe Aufruf, mit dem traccar_sync die Geräte abfragt
+    response = await _client().get(f"{setting.website_url.rstrip('/')}/api/devices",
+                                   headers={'Authorization': f"Bearer {setting.traccar_token}"})
+    _expect(response)
+
+
+def _keycloak_endpoint(setting, name: str) -> str:
+    return f"{setting.website_url.rstrip('/')}/realms/{setting.keycloak_realm}/protocol/openid-connect/{name}"
+
+
+async def _probe_keycloak_certs(setting) -> None:
+    response = await _client().get(_keycloak_endpoint(setting, 'certs'))
+    _expect(response)
+    if not response.json().get('keys'):
+        raise ProbeError("JWKS enthält keine Schlüssel")
+
+
+async def _probe_keycloak_client(setting) -> None:
+    response = await _client().post(_keycloak_endpoint(setting, 'token'), data={
+        'grant_type': 'client_credentials',
+        'client_id': setting.keycloak_client_id,
+        'client_secret': setting.keycloak_client_secret
+    })
+    # Ohne Service-Account lehnt KeyCloak den Grant ab (400), hat den Client dann aber bereits
+    # authentifiziert; ein falsches Secret ergibt 401 invalid_client
+    if response.status_code == 400 and response.json().get('error') != 'invalid_client':
+        return
+    _expect(response)
+
+
+def probes_for(setting) -> Dict[str, Probe]:
+    """Die für einen Settings-Eintrag möglichen Prüfungen (nicht konfigurierte entfallen)."""
+    probes: Dict[str, Probe] = {}
+    service = setting.service_name
+    if setting.db_host and setting.db_name and setting.db_user:
+        probes['database'] = lambda: _probe_database(setting)
+    if not setting.website_url:
+        return probes
+    if service == 'geoserver':
+        probes['rest'] = lambda: _probe_geoserver_rest(setting)
+    elif service == 'traccar':
+        probes['rest'] = lambda: _probe_traccar_server(setting)
+        if setting.traccar_token:
+            probes['token'] = lambda: _probe_traccar_token(setting)
+    elif service == 'keycloak' and setting.keycloak_realm:
+        probes['rest'] = lambda: _probe_keycloak_certs(setting)
+        if setting.keycloak_client_id and setting.keycloak_client_secret:
+            probes['token'] = lambda: _probe_keycloak_client(setting)
+    else:
+        probes['rest'] = lambda: _probe_website(setting.website_url)
+    return probes
+
+
+async def _run_probe(service: str, check: str, probe: Probe) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        with metrics.track(service, f"health_{check}"):
+            await asyncio.wait_for(probe(), HEALTH_PROBE_TIMEOUT)
+        outcome = {'status': 'ok'}
+    except asyncio.TimeoutError:
+        outcome = {'status': 'timeout', 'error': f"Keine Antwort innerhalb von {HEALTH_PROBE_TIMEOUT:g} s"}
+    except (ProbeError, httpx.HTTPError, psycopg.Error, OSError, ValueError) as e:
+        outcome = {'status': 'error', 'error': str(e) or e.__class__.__name__}
+    outcome['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+async def run_checks(settings: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """
+    Prüft alle Instanzen aller übergebenen Services (service_name -> Instanzen) gleichzeitig
+    innerhalb von HEALTH_TIMEOUT_BUDGET. Ergebnisse stehen unter Settings.instance_key.
+    """
+    started = time.perf_counter()
+    instances = {setting.instance_key: setting for service in settings.values() for setting in service}
+    tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+    for name, setting in instances.items():
+        for check, probe in probes_for(setting).items():
+            tasks[(name, check)] = asyncio.create_task(_run_probe(setting.service_name, check, probe))
+
+    if tasks:
+        _, pending = await asyncio.wait(tasks.values(), timeout=HEALTH_TIMEOUT_BUDGET)
+        for task in pending:
+            task.cancel()
+
+    services: Dict[str, Dict[str, Any]] = {name: {'checks': {}} for name in instances}
+    for (name, check), task in tasks.items():
+        if task.done() and not task.cancelled():
+            outcome = task.result()
+        else:
+            outcome = {'status': 'timeout', 'error': f"Gesamtbudget von {HEALTH_TIMEOUT_BUDGET:g} s überschritten",
+                       'latency_ms': round(HEALTH_TIMEOUT_BUDGET * 1000, 1)}
+        services[name]['checks'][check] = outcome
+
+    for service in services.values():
+        outcomes: List[Dict[str, Any]] = list(service['checks'].values())
+        failed = [o['status'] for o in outcomes if o['status'] != 'ok']
+        service['status'] = failed[0] if failed else 'ok' if outcomes else 'skipped'
+        # Prüfungen laufen parallel: die Latenz des Service ist die der langsamsten Prüfung
+        service['latency_ms'] = max((o['latency_ms'] for o in outcomes), default=0.0)
+
+    return {
+        'status': 'ok' if all(s['status'] in ('ok', 'skipped') for s in services.values()) else 'degraded',
+        'timestamp': datetime.now().isoformat(),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        'services': services
+    }
+
+
+async def check(load_settings: Callable[[], Awaitable[Dict[str, List[Any]]]]) -> Dict[str, Any]:
+    """
+    Zwischengespeichertes Ergebnis von run_checks. Ist es älter als HEALTH_CACHE_TTL, startet
+    genau ein neuer Prüfdurchgang, auf den alle gleichzeitigen Aufrufer warten.
+    """
+    global _inflight
+    age = time.monotonic() - _checked_at
+    if _result is not None and age < HEALTH_CACHE_TTL:
+        return {**_result, 'cached': True, 'age_s': round(age, 1)}
+    if _inflight is None:
+        _inflight = asyncio.create_task(_refresh(load_settings))
+        _inflight.add_done_callback(_clear_inflight)
+    # shield: bricht ein Client ab, läuft der gemeinsame Durchgang für die übrigen weiter
+    result = await asyncio.shield(_inflight)
+    return {**result, 'cached': False, 'age_s': 0.0}
+
+
+async def _refresh(load_settings: Callable[[], Awaitable[Dict[str, List[Any]]]]) -> Dict[str, Any]:
+    global _result, _checked_at
+    result = await run_checks(await load_settings())
+    _result, _checked_at = result, time.monotonic()
+    return result
+
+
+def _clear_inflight(task: asyncio.Task):
+    global _inflight
+    if _inflight is task:
+        _inflight = None
+
+
+def stats() -> Dict[str, Any]:
+    if _result is None:
+        return {}
+    return {name: int(service['status'] in ('ok', 'skipped')) for name, service in _result['services'].items()}
+
+
+async def close():
+    global _http, _result
+    if _inflight is not None:
+        _inflight.cancel()
+    if _http is not None:
+        await _http.aclose()
+    _http, _result = None, None
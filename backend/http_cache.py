@@ -0,0 +1,57 @@
+"""
+Hilfsfunktionen für bedingte GET-Anfragen (ETag / Last-Modified, 304 Not Modified).
+
+Antworten werden mit "Cache-Control: private, no-cache" ausgeliefert: der Browser
+speichert sie, fragt aber bei jeder Nutzung mit If-None-Match nach. Ist der Stand
+unverändert, antwortet der Server mit 304 ohne Body.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Dict
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def has_validators(request: Request, last_modified: bool = True) -> bool:
+    """Bedingte Anfrage (If-None-Match oder, falls der Endpunkt Last-Modified liefert, If-Modified-Since)?"""
+    return 'if-none-match' in request.headers or (last_modified and 'if-modified-since' in request.headers)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """If-None-Match hat Vorrang (schwacher Vergleich); sonst If-Modified-Since (Sekundengenauigkeit)."""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,305 @@
+"""
+Hintergrund-Jobs für lang laufende GIS-Operationen (Geoserver-Export, Synchronisation, ...).
+
+Jobs laufen in einem begrenzten Thread-Pool außerhalb des Request-Pfads. Pro Benutzer
+ist die Anzahl gleichzeitig wartender/laufender Jobs begrenzt; gezählt wird in der
+Datenbank, damit das Limit über alle Worker-Prozesse gilt. Der Zustand wird in der
+Tabelle gis_jobs gespeichert (Fortschritt gedrosselt), laufende Jobs werden zusätzlich
+im Prozess gehalten, damit GET /api/jobs/{id} den aktuellen Fortschritt liefert.
+
+Ein Heartbeat-Thread pro Prozess hält updated_at der eigenen wartenden/laufenden Jobs
+aktuell, damit sie weder aus dem Benutzerlimit fallen noch von recover_stale anderer
+Worker als verwaist markiert werden. Abbrüche für Jobs anderer Worker werden als
+cancel_requested gespeichert; der ausführende Prozess liest das Flag beim Heartbeat,
+beim Start und beim Speichern des Fortschritts.
+
+Job-Funktionen sind synchron und erhalten die Schlüsselwortargumente progress
+(Callable[[dict], None]) und cancelled (Callable[[], bool]).
+"""
+import logging
+import threading
+import time
+import uuid
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional, Dict, Any, Callable
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from settings_app.models import Job
+from orm_executor import run_orm
+
+JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', '2'))
+JOB_MAX_PER_USER = int(os.getenv('JOB_MAX_PER_USER', '2'))
+# Fortschritt wird höchstens alle N Sekunden in die Datenbank geschrieben
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '2'))
+# Wartende/laufende Jobs ohne Aktualisierung seit N Sekunden gelten beim Start als verwaist
+JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '900'))
+# Abstand des Heartbeats (Sekunden); muss deutlich unter JOB_STALE_AFTER liegen
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', '30'))
+# Versuche für das Schreiben des Endzustands, bevor der Job verwaist zurückbleibt
+JOB_FINAL_SAVE_ATTEMPTS = int(os.getenv('JOB_FINAL_SAVE_ATTEMPTS', '5'))
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+logger = logging.getLogger('gis.jobs')
+
+
+class JobLimitExceeded(Exception):
+    pass
+
+
+class RunningJob:
+    __slots__ = ('id', 'kind', 'username', 'params', 'status', 'progress', 'result', 'error',
+                 'created_at', 'started_at', 'finished_at', 'cancel_event', '_progress_saved')
+
+    def __init__(self, kind: str, username: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.username = username
+        self.params = params
+        self.status = 'queued'
+        self.progress: Dict[str, Any] = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self.created_at = timezone.now()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._progress_saved = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _job_dict(self)
+
+
+def _job_dict(job) -> Dict[str, Any]:
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'params': job.params,
+        'progress': job.progress,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def _save(job: RunningJob, *fields: str):
+    values = {field: getattr(job, field) for field in fields}
+    Job.objects.filter(id=job.id).update(updated_at=timezone.now(), **values)
+
+
+def _cancel_requested(job_id: str) -> bool:
+    return Job.objects.filter(id=job_id, cancel_requested=True).exists()
+
+
+def _save_final(job: RunningJob):
+    """Endzustand schreiben; bei Datenbankfehlern mit Backoff wiederholen statt den Job als 'running' zu hinterlassen."""
+    for attempt in range(JOB_FINAL_SAVE_ATTEMPTS):
+        try:
+            _save(job, 'status', 'progress', 'result', 'error', 'finished_at')
+            return
+        except Exception:
+            if attempt == JOB_FINAL_SAVE_ATTEMPTS - 1:
+                logger.exception("Endzustand von Job %s (%s) konnte nicht gespeichert werden", job.id, job.status)
+                return
+            # Defekte Verbindung verwerfen, der nächste Versuch baut eine neue auf
+            close_old_connections()
+            time.sleep(min(2 ** attempt, 10))
+
+
+def _create(job: RunningJob, max_per_user: int):
+    """Legt den Job an, sofern der Benutzer prozessübergreifend weniger als max_per_user aktive Jobs hat."""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Serialisiert gleichzeitige Submits desselben Benutzers aus verschiedenen Workern
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"gis_jobs:{job.username}"])
+        # Verwaiste Jobs (siehe recover_stale) zählen nicht
+        cutoff = timezone.now() - timedelta(seconds=JOB_STALE_AFTER)
+        active = Job.objects.filter(username=job.username, status__in=ACTIVE_STATUSES, updated_at__gte=cutoff).count()
+        if active >= max_per_user:
+            raise JobLimitExceeded(
+                f"Maximal {max_per_user} gleichzeitige Jobs pro Benutzer - bitte Abschluss abwarten"
+            )
+        Job.objects.create(id=job.id, kind=job.kind, username=job.username, status=job.status, params=job.params)
+
+
+class JobRunner:
+
+    def __init__(self, max_workers: int = JOB_MAX_WORKERS, max_per_user: int = JOB_MAX_PER_USER):
+        self.max_workers = max_workers
+        self.max_per_user = max_per_user
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, RunningJob] = {}
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    async def submit(self, kind: str, username: str, func: Callable, *args,
+                     params: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Legt einen Job an und reiht ihn in den Pool ein. Wirft JobLimitExceeded,
+        wenn der Benutzer bereits JOB_MAX_PER_USER aktive Jobs hat.
+        """
+        job = RunningJob(kind, username, params or {})
+        await run_orm(_create, job, self.max_per_user)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._start_heartbeat()
+        self._executor.submit(self._execute, job, func, args, kwargs)
+        return job.to_dict()
+
+    def _start_heartbeat(self):
+        # Aufruf unter self._lock
+        if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+            self._heartbeat_thread.start()
+
+    def _heartbeat(self):
+        """Aktualisiert updated_at der eigenen aktiven Jobs und übernimmt Abbruchanforderungen anderer Worker."""
+        while not self._stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            with self._lock:
+                jobs = dict(self._jobs)
+            if not jobs:
+                continue
+            try:
+                close_old_connections()
+                Job.objects.filter(id__in=list(jobs), status__in=ACTIVE_STATUSES).update(updated_at=timezone.now())
+                for job_id in Job.objects.filter(id__in=list(jobs), cancel_requested=True).values_list('id', flat=True):
+                    jobs[job_id].cancel_event.set()
+            except Exception:
+                logger.warning("Heartbeat für Jobs fehlgeschlagen", exc_info=True)
+        close_old_connections()
+
+    def _report_progress(self, job: RunningJob, progress: Dict[str, Any]):
+        job.progress = progress
+        now = time.monotonic()
+        if now - job._progress_saved >= JOB_PROGRESS_INTERVAL:
+            job._progress_saved = now
+            _save(job, 'progress')
+            if _cancel_requested(job.id):
+                job.cancel_event.set()
+
+    def _execute(self, job: RunningJob, func: Callable, args, kwargs):
+        close_old_connections()
+        try:
+            try:
+                if _cancel_requested(job.id):
+                    job.cancel_event.set()
+            except Exception:
+                close_old_connections()
+            if job.cancel_event.is_set():
+                job.status = 'cancelled'
+            else:
+                job.status = 'running'
+                job.started_at = timezone.now()
+                try:
+                    _save(job, 'status', 'started_at')
+                except Exception:
+                    # Nur Zwischenstand - der Endzustand wird mit Wiederholungen geschrieben
+                    close_old_connections()
+                try:
+                    job.result = func(
+                        *args,
+                        progress=lambda p: self._report_progress(job, p),
+                        cancelled=job.cancel_event.is_set,
+                        **kwargs
+                    )
+                    job.status = 'done'
+                except Exception as e:
+                    # Abbruch äußert sich in der Job-Funktion als beliebige Exception
+                    if job.cancel_event.is_set():
+                        job.status = 'cancelled'
+                    else:
+                        job.status = 'failed'
+                        job.error = str(e) or type(e).__name__
+            job.finished_at = timezone.now()
+            _save_final(job)
+        finally:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                if job.status == 'done':
+                    self.completed += 1
+                elif job.status == 'cancelled':
+                    self.cancelled += 1
+                else:
+                    self.failed += 1
+            close_old_connections()
+
+    async def get(self, job_id: str, username: str) -> Optional[Dict[str, Any]]:
+        """Aktueller Stand eines Jobs des Benutzers oder None."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict() if job.username == username else None
+        stored = await run_orm(Job.objects.filter(id=job_id, username=username).first)
+        return _job_dict(stored) if stored else None
+
+    async def list_jobs(self, username: str, limit: int = 20):
+        stored = await run_orm(lambda: list(Job.objects.filter(username=username)[:limit]))
+        # Laufende Jobs mit aktuellem Fortschritt aus dem Speicher
+        running = dict(self._jobs)
+        return [running[j.id].to_dict() if j.id in running else _job_dict(j) for j in stored]
+
+    async def cancel(self, job_id: str, username: str) -> bool:
+        """Fordert den Abbruch an; False, wenn der Job nicht (mehr) aktiv ist."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if job.username != username:
+                return False
+            job.cancel_event.set()
+            return True
+        # Job läuft ggf. in einem anderen Worker-Prozess - Abbruch in der Datenbank vormerken
+        updated = await run_orm(lambda: Job.objects.filter(
+            id=job_id, username=username, status__in=ACTIVE_STATUSES
+        ).update(cancel_requested=True))
+        return updated > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            'max_workers': self.max_workers,
+            'max_per_user': self.max_per_user,
+            'queued': sum(1 for j in jobs if j.status == 'queued'),
+            'running': sum(1 for j in jobs if j.status == 'running'),
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled
+        }
+
+    async def recover_stale(self):
+        """
+        Markiert verwaiste Jobs früherer Prozesse (z.B. nach Neustart) als fehlgeschlagen.
+        Jobs lebender Worker bleiben durch deren Heartbeat jünger als JOB_STALE_AFTER.
+        """
+        def mark_stale():
+            cutoff = timezone.now() - timedelta(seconds=JOB_STALE_AFTER)
+            return Job.objects.filter(status__in=ACTIVE_STATUSES, updated_at__lt=cutoff).exclude(
+                id__in=list(self._jobs)
+            ).update(status='failed', error='Job wurde durch einen Neustart unterbrochen', finished_at=timezone.now())
+        return await run_orm(mark_stale)
+
+    async def shutdown(self):
+        self._stopped.set()
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel_event.set()
+            queued = [job.id for job in self._jobs.values() if job.status == 'queued']
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # Noch nicht gestartete Jobs laufen nicht mehr an - Zustand direkt festhalten
+        if queued:
+            await run_orm(lambda: Job.objects.filter(id__in=queued, status='queued').update(
+                status='cancelled', finished_at=timezone.now()
+            ))
+
+
+runner = JobRunner()
@@ -0,0 +1,156 @@
+"""
+KeyCloak-Anbindung: gemeinsamer Keep-Alive HTTP-Client, lokale JWT-Prüfung
+gegen einen zwischengespeicherten JWKS und Token-Refresh.
+"""
+import asyncio
+import os
+import time
+from typing import Optional, Dict, Any, Tuple
+
+import httpx
+import jwt
+
+import metrics
+
+KEYCLOAK_HTTP_TIMEOUT = float(os.getenv('KEYCLOAK_HTTP_TIMEOUT', '10'))
+KEYCLOAK_JWKS_REFRESH_INTERVAL = float(os.getenv('KEYCLOAK_JWKS_REFRESH_INTERVAL', '3600'))
+# Frühestens nach dieser Zeit wird der JWKS wegen einer unbekannten Key-ID erneut geladen
+KEYCLOAK_JWKS_MIN_RELOAD = float(os.getenv('KEYCLOAK_JWKS_MIN_RELOAD', '60'))
+KEYCLOAK_JWT_LEEWAY = int(os.getenv('KEYCLOAK_JWT_LEEWAY', '30'))
+
+
+class KeycloakError(Exception):
+    pass
+
+
+class KeycloakClient:
+
+    def __init__(self, base_url: str, realm: str, client_id: str, client_secret: str):
+        self.issuer = f"{base_url}/realms/{realm}"
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._http: Optional[httpx.AsyncClient] = None
+        # Key-ID -> (öffentlicher Schlüssel, Algorithmus)
+        self._jwks: Dict[str, Tuple[Any, str]] = {}
+        self._jwks_loaded_at = 0.0
+        self._jwks_lock = asyncio.Lock()
+        self._jwks_task: Optional[asyncio.Task] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=KEYCLOAK_HTTP_TIMEOUT,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            )
+        return self._http
+
+    def _endpoint(self, name: str) -> str:
+        return f"{self.issuer}/protocol/openid-connect/{name}"
+
+    async def _token_request(self, data: Dict[str, str]) -> Dict[str, Any]:
+        with metrics.track('keycloak', data['grant_type']):
+            response = await self.http.post(self._endpoint('token'), data={
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                **data
+            })
+            if response.status_code != 200:
+                raise KeycloakError(f"Token-Anfrage fehlgeschlagen: {response.status_code}")
+            return response.json()
+
+    async def exchange_code(self, code: str, redirect_uri: str) -> Dict[str, Any]:
+        return await self._token_request({
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': redirect_uri
+        })
+
+    async def refresh(self, refresh_token: str) -> Dict[str, Any]:
+        return await self._token_request({
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token
+        })
+
+    async def userinfo(self, access_token: str) -> Dict[str, Any]:
+        with metrics.track('keycloak', 'userinfo'):
+            response = await self.http.get(self._endpoint('userinfo'), headers={'Authorization': f'Bearer {access_token}'})
+            if response.status_code != 200:
+                raise KeycloakError(f"Userinfo-Anfrage fehlgeschlagen: {response.status_code}")
+            return response.json()
+
+    async def load_jwks(self):
+        with metrics.track('keycloak', 'certs'):
+            response = await self.http.get(self._endpoint('certs'))
+            if response.status_code != 200:
+                raise KeycloakError(f"JWKS konnte nicht geladen werden: {response.status_code}")
+        keys = {}
+        for key_data in response.json().get('keys', []):
+            # Nur asymmetrische Signaturschlüssel; Verschlüsselungsschlüssel (use=enc) ignorieren
+            if key_data.get('use', 'sig') != 'sig' or 'kid' not in key_data or key_data.get('kty') not in ('RSA', 'EC'):
+                continue
+            algorithm = key_data.get('alg') or ('RS256' if key_data['kty'] == 'RSA' else 'ES256')
+            try:
+                keys[key_data['kid']] = (jwt.PyJWK(key_data, algorithm).key, algorithm)
+            except (jwt.PyJWKError, jwt.InvalidKeyError):
+                continue
+        self._jwks = keys
+        self._jwks_loaded_at = time.monotonic()
+
+    async def _signing_key(self, kid: str) -> Tuple[Any, str]:
+        key = self._jwks.get(kid)
+        if key is not None:
+            return key
+        async with self._jwks_lock:
+            # Schlüsselrotation: bei unbekannter Key-ID JWKS neu laden (begrenzt)
+            if kid not in self._jwks and time.monotonic() - self._jwks_loaded_at > KEYCLOAK_JWKS_MIN_RELOAD:
+                await self.load_jwks()
+        key = self._jwks.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unbekannte Key-ID: {kid}")
+        return key
+
+    async def verify(self, token: str, audience: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Prüft Signatur, Aussteller und Ablauf eines Tokens lokal und gibt die Claims zurück.
+        Ohne audience wird stattdessen geprüft, dass das Token für diesen Client ausgestellt wurde (azp).
+        Wirft jwt.InvalidTokenError bei ungültigem Token.
+        """
+        header = jwt.get_unverified_header(token)
+        key, algorithm = await self._signing_key(header.get('kid'))
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            issuer=self.issuer,
+            audience=audience,
+            leeway=KEYCLOAK_JWT_LEEWAY,
+            options={'verify_aud': audience is not None}
+        )
+        if audience is None and claims.get('azp') != self.client_id:
+            raise jwt.InvalidTokenError("Token wurde nicht für diesen Client ausgestellt")
+        return claims
+
+    async def _run_jwks_refresher(self):
+        while True:
+            try:
+                await self.load_jwks()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # KeyCloak nicht erreichbar - vorhandene Schlüssel weiter verwenden
+                pass
+            await asyncio.sleep(KEYCLOAK_JWKS_REFRESH_INTERVAL)
+
+    def start(self):
+        if self._jwks_task is None or self._jwks_task.done():
+            self._jwks_task = asyncio.create_task(self._run_jwks_refresher())
+
+    async def close(self):
+        if self._jwks_task is not None:
+            self._jwks_task.cancel()
+            await asyncio.gather(self._jwks_task, return_exceptions=True)
+            self._jwks_task = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
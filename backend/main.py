@@ -1,21 +1,52 @@
-from fastapi import FastAPI, HTTPException, Request, Response, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import httpx
+import jwt
 import secrets
+import hashlib
+import asyncio
 import os
+import time
 import django
 from datetime import datetime, timedelta
-from asgiref.sync import sync_to_async
-import psycopg2
+import psycopg
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Schlankes Profil ohne Admin/DRF/Datei-Logging; manage.py und wsgi nutzen config.settings
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.api_settings')
 django.setup()
 
 from settings_app.models import Settings
+from settings_app import cache as settings_cache
+from settings_app import schema_catalog
+import umap_db
+import umap_cache
+import umap_files
+import geoserver_rest
+import job_runner
+import traccar_sync
+import traccar_live
+import geoserver_db
+import vector_tiles
+import tile_cache
+import compression
+import http_cache
+import metrics
+import health
+import request_profiler
+import spatial_index
+import session_store
+import keycloak_auth
+import orm_executor
+
+settings_cache.use_orm_runner(orm_executor.run_orm)
 
 app = FastAPI()
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(request_profiler.ProfilingMiddleware, authorize=lambda request: profiling_allowed(request))
+# Zuletzt hinzugefügt = äußerste Middleware: misst auch die Komprimierung
+app.add_middleware(metrics.MetricsMiddleware)
 
 KEYCLOAK_URL = os.getenv('KEYCLOAK_URL', 'https://auth.eizes.com')
 KEYCLOAK_REALM = os.getenv('KEYCLOAK_REALM', 'eizes')
@@ -25,8 +56,18 @@ if not REQUIRED_GROUP:
     raise ValueError("CRITICAL: REQUIRED_GROUP environment variable must be set in .env file!")
 KEYCLOAK_CLIENT_SECRET = os.getenv('KEYCLOAK_CLIENT_SECRET', '')
 REDIRECT_URI = 'https://gis.eizes.com/api/auth/callback'
+# Access-Token wird erneuert, wenn es innerhalb dieser Zeit (Sekunden) abläuft
+TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '60'))
+# Wartezeit (Sekunden) nach einem Refresh, der an KeyCloak/Netzwerk gescheitert ist
+TOKEN_REFRESH_RETRY = int(os.getenv('TOKEN_REFRESH_RETRY', '30'))
+# Frist pro uMap-Instanz bei Abfragen über alle Instanzen
+UMAP_INSTANCE_TIMEOUT = float(os.getenv('UMAP_INSTANCE_TIMEOUT', '10'))
+
+keycloak = keycloak_auth.KeycloakClient(KEYCLOAK_URL, KEYCLOAK_REALM, KEYCLOAK_CLIENT_ID, KEYCLOAK_CLIENT_SECRET)
+token_refreshes: Dict[str, asyncio.Task] = {}
+umap_pool_prunes: set = set()
 
-sessions: Dict[str, Dict[str, Any]] = {}
+sessions = session_store.create_store()
 
 class ServiceUpdate(BaseModel):
     website: Optional[Dict] = None
@@ -48,34 +89,264 @@ class WorkspaceValidationResponse(BaseModel):
     message: str
     workspace: str
 
+class BulkExportRequest(BaseModel):
+    map_ids: List[int]
+    parallelism: Optional[int] = None
+
 async def get_current_user(request: Request):
     session_id = request.cookies.get("session_id")
-    if not session_id or session_id not in sessions:
+    session = await sessions.get(session_id) if session_id else None
+    if not session:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    session_data = sessions[session_id]
-    if session_data['expires'] < datetime.now():
-        del sessions[session_id]
+    if session.is_expired():
+        await sessions.delete(session_id)
         raise HTTPException(status_code=401, detail="Session expired")
-    return session_data['user']
+    if (session.refresh_token and session.token_expires
+            and session.token_expires - datetime.now() < timedelta(seconds=TOKEN_REFRESH_MARGIN)
+            and (session.refresh_retry_after is None or session.refresh_retry_after <= datetime.now())
+            and session_id not in token_refreshes):
+        task = asyncio.create_task(refresh_session_tokens(session_id, session.refresh_token))
+        token_refreshes[session_id] = task
+        task.add_done_callback(lambda _: token_refreshes.pop(session_id, None))
+    return session.user
 
-async def get_umap_config():
+async def profiling_allowed(request: Request) -> bool:
     try:
-        setting = await sync_to_async(Settings.objects.get)(service_name='umap', is_active=True)
-        return {
-            'url': setting.website_url,
-            'db_host': setting.db_host,
-            'db_port': setting.db_port,
-            'db_name': setting.db_name,
-            'db_user': setting.db_user,
-            'db_password': setting.db_password
-        }
+        user = await get_current_user(request)
+    except HTTPException:
+        return False
+    return request_profiler.is_authorized(user)
+
+async def require_monitoring_access(request: Request):
+    # Prometheus/Monitoring meldet sich per Bearer-Token (METRICS_TOKEN) an, Benutzer über ihre Session
+    # und benötigen die Gruppe MONITORING_GROUP
+    authorization = request.headers.get('authorization', '')
+    if metrics.METRICS_TOKEN and secrets.compare_digest(authorization, f"Bearer {metrics.METRICS_TOKEN}"):
+        return
+    user = await get_current_user(request)
+    if not metrics.is_monitoring_user(user):
+        raise HTTPException(status_code=403, detail="Keine Berechtigung für Monitoring-Daten")
+
+async def get_profiling_user(user: dict = Depends(get_current_user)):
+    if not request_profiler.is_authorized(user):
+        raise HTTPException(status_code=403, detail="Keine Berechtigung für Profiling-Daten")
+    return user
+
+async def refresh_session_tokens(session_id: str, refresh_token: str):
+    """
+    Erneuert die Tokens einer Session im Hintergrund kurz vor Ablauf des Access-Tokens.
+    Fehlt dem Benutzer inzwischen die erforderliche Gruppe, wird die Session beendet.
+    Geschrieben wird nur in eine noch bestehende Session: ein Logout oder Ablauf während des
+    KeyCloak-Aufrufs wird nicht rückgängig gemacht.
+    """
+    token_data = claims = None
+    retry = False
+    try:
+        token_data = await keycloak.refresh(refresh_token)
+        claims = await keycloak.verify(token_data['access_token'])
+    except keycloak_auth.KeycloakError:
+        # Refresh-Token abgelaufen oder widerrufen - Session läuft bis zu ihrem eigenen Ablauf weiter
+        pass
+    except (jwt.InvalidTokenError, httpx.HTTPError):
+        # IdP gestört - nicht bei jedem Request erneut versuchen
+        retry = True
+
+    session = await sessions.get(session_id)
+    if session is None or session.is_expired():
+        return
+    if claims is None:
+        if retry:
+            session.refresh_retry_after = datetime.now() + timedelta(seconds=TOKEN_REFRESH_RETRY)
+        else:
+            session.refresh_token = None
+        await sessions.replace(session_id, session)
+        return
+    if 'groups' in claims and REQUIRED_GROUP not in claims['groups']:
+        await sessions.delete(session_id)
+        return
+    if 'groups' in claims:
+        session.user['groups'] = claims['groups']
+    session.access_token = token_data['access_token']
+    session.refresh_token = token_data.get('refresh_token', session.refresh_token)
+    session.token_expires = datetime.now() + timedelta(seconds=token_data.get('expires_in', 300))
+    session.refresh_retry_after = None
+    await sessions.replace(session_id, session)
+
+def umap_config(setting: Settings) -> Dict[str, Any]:
+    return {
+        'instance': setting.instance_name,
+        'url': setting.website_url,
+        'db_host': setting.db_host,
+        'db_port': setting.db_port,
+        'db_name': setting.db_name,
+        'db_user': setting.db_user,
+        'db_password': setting.db_password
+    }
+
+async def get_umap_config(instance: Optional[str] = None):
+    try:
+        return umap_config(await settings_cache.get_setting('umap', instance))
     except Settings.DoesNotExist:
+        if instance is not None:
+            raise HTTPException(status_code=404, detail=f"uMap-Instanz '{instance}' nicht konfiguriert")
+        raise HTTPException(status_code=500, detail="uMap settings not configured")
+
+async def get_umap_instances() -> List[Dict[str, Any]]:
+    instances = await settings_cache.get_instances('umap')
+    if not instances:
         raise HTTPException(status_code=500, detail="uMap settings not configured")
+    return [umap_config(setting) for setting in instances]
+
+async def query_umap_instances(configs: List[Dict[str, Any]], query) -> Dict[str, tuple]:
+    """
+    Führt query(config) für alle uMap-Instanzen gleichzeitig aus, jede mit UMAP_INSTANCE_TIMEOUT.
+    Liefert Instanz -> (Ergebnis oder None, Status); der Fehler einer Instanz bricht die übrigen nicht ab.
+    """
+    async def run(config):
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await asyncio.wait_for(query(config), UMAP_INSTANCE_TIMEOUT)
+            status = {'status': 'ok'}
+        except asyncio.TimeoutError:
+            status = {'status': 'timeout', 'error': f"Keine Antwort innerhalb von {UMAP_INSTANCE_TIMEOUT:g} s"}
+        except psycopg.Error as e:
+            status = {'status': 'error', 'error': f"Datenbankfehler: {str(e)}"}
+        except Exception as e:
+            status = {'status': 'error', 'error': str(e) or e.__class__.__name__}
+        status['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return config['instance'], result, status
+
+    return {instance: (result, status) for instance, result, status in await asyncio.gather(*map(run, configs))}
+
+async def get_geoserver_config():
+    try:
+        setting = await settings_cache.get_setting('geoserver')
+    except Settings.DoesNotExist:
+        raise HTTPException(status_code=500, detail="Geoserver settings not configured")
+    if not setting.geoserver_workspace:
+        raise HTTPException(status_code=400, detail="Kein Geoserver-Workspace konfiguriert")
+    if not all([setting.db_host, setting.db_name, setting.db_user]):
+        raise HTTPException(status_code=400, detail="Geoserver-Datenbank nicht vollständig konfiguriert")
+    return {
+        'url': setting.website_url,
+        'workspace': setting.geoserver_workspace,
+        'db_host': setting.db_host,
+        'db_port': setting.db_port or 5432,
+        'db_name': setting.db_name,
+        'db_user': setting.db_user,
+        'db_password': setting.db_password,
+        'rest_user': setting.service_user,
+        'rest_password': setting.service_password
+    }
+
+async def get_traccar_config():
+    try:
+        setting = await settings_cache.get_setting('traccar')
+    except Settings.DoesNotExist:
+        raise HTTPException(status_code=500, detail="Traccar settings not configured")
+    if not setting.traccar_token:
+        raise HTTPException(status_code=400, detail="Kein Traccar API-Token konfiguriert")
+    return {'url': setting.website_url, 'token': setting.traccar_token}
+
+async def prune_umap_pools():
+    """Schließt Pools deaktivierter, gelöschter oder umbenannter uMap-Instanzen."""
+    try:
+        active = {setting.instance_name for setting in await settings_cache.get_instances('umap')}
+    except Exception:
+        # Settings-Datenbank nicht erreichbar - Pools bleiben bis zur nächsten Invalidierung
+        return
+    await umap_db.close_pools_except(active)
+
+def schedule_umap_pool_prune(loop: asyncio.AbstractEventLoop):
+    def start():
+        task = loop.create_task(prune_umap_pools())
+        umap_pool_prunes.add(task)
+        task.add_done_callback(umap_pool_prunes.discard)
+    if loop.is_closed():
+        return
+    # Invalidierung kommt auch aus ORM-Threads (post_save/post_delete)
+    loop.call_soon_threadsafe(start)
+
+async def warm_up():
+    """Datenbankzugriffe beim Start; laufen im Hintergrund, damit der Worker sofort Anfragen annimmt."""
+    try:
+        await umap_db.get_pool(await get_umap_config())
+    except Exception:
+        # uMap nicht konfiguriert oder nicht erreichbar - Pool wird beim ersten Request aufgebaut
+        pass
+    try:
+        await job_runner.runner.recover_stale()
+    except Exception:
+        pass
+
+@app.on_event("startup")
+async def startup():
+    app.state.warm_up = asyncio.create_task(warm_up())
+    umap_cache.start_refresher(get_umap_config)
+    sessions.start_sweeper()
+    keycloak.start()
+    settings_cache.start_listener()
+    loop = asyncio.get_running_loop()
+    settings_cache.on_invalidate(lambda: schedule_umap_pool_prune(loop))
+    traccar_sync.start_scheduler(get_traccar_config, get_geoserver_config)
+    traccar_live.hub.configure(get_traccar_config)
+    metrics.start_gauge_refresher(refresh_gauges)
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.warm_up.cancel()
+    await umap_cache.stop_refresher()
+    await umap_db.close_pool()
+    await geoserver_db.close_pool()
+    await sessions.close()
+    await keycloak.close()
+    await settings_cache.stop_listener()
+    await traccar_sync.stop_scheduler()
+    await traccar_live.hub.close()
+    await job_runner.runner.shutdown()
+    geoserver_rest.close_client()
+    await health.close()
+    await metrics.stop_gauge_refresher()
+    orm_executor.executor.shutdown()
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "timestamp": datetime.now().isoformat()}
 
+@app.get("/api/health/services", dependencies=[Depends(require_monitoring_access)])
+async def service_health():
+    try:
+        result = await health.check(settings_cache.get_all)
+    except Exception as e:
+        # Settings-Datenbank selbst nicht erreichbar
+        return JSONResponse(status_code=503, content={
+            "status": "down", "timestamp": datetime.now().isoformat(), "error": str(e), "services": {}
+        })
+    return JSONResponse(status_code=200 if result['status'] == 'ok' else 503, content=result)
+
+async def refresh_gauges():
+    """Gauges dieses Workers; läuft periodisch in jedem Worker und zusätzlich beim Abruf."""
+    for instance in umap_db.instances():
+        pool_name = 'umap' if instance == umap_db.DEFAULT_INSTANCE else f"umap:{instance}"
+        metrics.set_stats(metrics.POOL_STATS, (pool_name,), umap_db.pool_stats(instance))
+    metrics.set_stats(metrics.POOL_STATS, ('geoserver',), geoserver_db.pool_stats())
+    metrics.set_stats(metrics.SESSION_STATS, (), await sessions.stats())
+    for component, stats in (
+        ('orm', orm_executor.executor.stats()),
+        ('jobs', job_runner.runner.stats()),
+        ('tile_cache', tile_cache.cache.stats()),
+        ('spatial_index', spatial_index.index.stats()),
+        ('traccar_live', traccar_live.hub.stats()),
+        ('health', health.stats())
+    ):
+        metrics.set_stats(metrics.COMPONENT_STATS, (component,), stats)
+
+@app.get("/api/metrics", dependencies=[Depends(require_monitoring_access)])
+async def prometheus_metrics():
+    await refresh_gauges()
+    return Response(content=metrics.exposition(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/api/auth/login")
 async def login():
     state = secrets.token_urlsafe(32)
@@ -92,37 +363,38 @@ async def login():
 
 @app.get("/api/auth/callback")
 async def callback(code: str, state: str):
-    token_url = f"{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}/protocol/openid-connect/token"
-    async with httpx.AsyncClient() as client:
-        token_response = await client.post(token_url, data={
-            'grant_type': 'authorization_code',
-            'client_id': KEYCLOAK_CLIENT_ID,
-            'client_secret': KEYCLOAK_CLIENT_SECRET,
-            'code': code,
-            'redirect_uri': REDIRECT_URI
-        })
-    if token_response.status_code != 200:
+    try:
+        token_data = await keycloak.exchange_code(code, REDIRECT_URI)
+    except (keycloak_auth.KeycloakError, httpx.HTTPError):
         raise HTTPException(status_code=400, detail="Failed to get token")
-    token_data = token_response.json()
     access_token = token_data['access_token']
-    userinfo_url = f"{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}/protocol/openid-connect/userinfo"
-    async with httpx.AsyncClient() as client:
-        userinfo_response = await client.get(userinfo_url, headers={'Authorization': f'Bearer {access_token}'})
-    if userinfo_response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed to get user info")
-    user_info = userinfo_response.json()
+    user_info = None
+    # Benutzerdaten und Gruppen lokal aus dem signierten ID-Token lesen (kein Userinfo-Roundtrip)
+    if token_data.get('id_token'):
+        try:
+            claims = await keycloak.verify(token_data['id_token'], audience=KEYCLOAK_CLIENT_ID)
+        except (jwt.InvalidTokenError, keycloak_auth.KeycloakError, httpx.HTTPError):
+            raise HTTPException(status_code=400, detail="Invalid ID token")
+        if 'groups' in claims:
+            user_info = claims
+    if user_info is None:
+        # Fallback: Gruppen-Mapper nicht für das ID-Token aktiviert
+        try:
+            user_info = await keycloak.userinfo(access_token)
+        except (keycloak_auth.KeycloakError, httpx.HTTPError):
+            raise HTTPException(status_code=400, detail="Failed to get user info")
     user_groups = user_info.get('groups', [])
     if REQUIRED_GROUP not in user_groups:
         error_html = f"""<!DOCTYPE html><html lang="de"><head><title>Zugriff verweigert</title><meta charset="utf-8"><meta name="viewport" content="width=device-width,initial-scale=1"><style>*{{margin:0;padding:0;box-sizing:border-box}}body{{font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,sans-serif;display:flex;justify-content:center;align-items:center;min-height:100vh;background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);padding:20px}}.container{{background:white;padding:3rem;border-radius:20px;box-shadow:0 20px 60px rgba(0,0,0,0.3);text-align:center;max-width:600px;width:100%}}.icon{{font-size:4rem;margin-bottom:1rem}}h1{{color:#dc2626;margin-bottom:1rem;font-size:1.8rem}}p{{color:#4b5563;margin:1rem 0;line-height:1.6}}.group{{background:linear-gradient(135deg,#fef3c7 0%,#fde68a 100%);padding:1.25rem;border-radius:12px;font-weight:bold;color:#78350f;margin:1.5rem 0;font-size:1.1rem;border:2px solid #fbbf24;box-shadow:0 4px 12px rgba(251,191,36,0.2)}}.group-name{{display:inline-block;background:rgba(255,255,255,0.6);padding:0.5rem 1rem;border-radius:8px;font-family:'Courier New',monospace;font-size:1.15rem;color:#92400e;margin-top:0.5rem;border:1px solid #f59e0b}}.user-info{{background:#f3f4f6;padding:1.25rem;border-radius:12px;margin:1.5rem 0;font-size:0.95rem;color:#374151;border:1px solid #e5e7eb}}.user-info strong{{display:block;margin-bottom:0.5rem;color:#1f2937}}.info-box{{background:#eff6ff;padding:1rem;border-radius:10px;margin:1.5rem 0;font-size:0.9rem;color:#1e40af;border-left:4px solid #3b82f6;text-align:left}}.btn{{display:inline-block;margin-top:1.5rem;padding:0.875rem 2.5rem;background:#3b82f6;color:white;text-decoration:none;border-radius:12px;font-weight:600;transition:all 0.3s;cursor:pointer;box-shadow:0 4px 12px rgba(59,130,246,0.3)}}.btn:hover{{background:#2563eb;transform:translateY(-2px);box-shadow:0 6px 16px rgba(59,130,246,0.4)}}</style></head><body><div class="container"><div class="icon">🔒</div><h1>Zugriff verweigert</h1><p>Sie haben keine Berechtigung für die GIS Management Anwendung.</p><div class="group">Erforderliche Gruppe:<div class="group-name">{REQUIRED_GROUP}</div></div><div class="user-info"><strong>Angemeldet als:</strong>{user_info.get('preferred_username','Unbekannt')}<br>{user_info.get('email','')}</div><div class="info-box"><strong>💡 Was können Sie tun?</strong><br>Kontaktieren Sie Ihren Administrator, um der Gruppe <strong>{REQUIRED_GROUP}</strong> im KeyCloak-System hinzugefügt zu werden.</div><a href="https://gis.eizes.com/api/auth/login" class="btn">Erneut anmelden</a></div></body></html>"""
         return HTMLResponse(content=error_html, status_code=403)
     session_id = secrets.token_urlsafe(32)
-    sessions[session_id] = {
-        'user': {'username': user_info.get('preferred_username'), 'email': user_info.get('email'), 'name': user_info.get('name'), 'groups': user_groups},
-        'groups': user_groups,
-        'access_token': access_token,
-        'refresh_token': token_data.get('refresh_token'),
-        'expires': datetime.now() + timedelta(hours=8)
-    }
+    await sessions.set(session_id, session_store.Session(
+        user={'username': user_info.get('preferred_username'), 'email': user_info.get('email'), 'name': user_info.get('name'), 'groups': user_groups},
+        access_token=access_token,
+        refresh_token=token_data.get('refresh_token'),
+        expires=datetime.now() + timedelta(hours=8),
+        token_expires=datetime.now() + timedelta(seconds=token_data.get('expires_in', 300))
+    ))
     response = RedirectResponse(url='https://gis.eizes.com')
     response.set_cookie(key="session_id", value=session_id, httponly=True, secure=True, samesite="lax", max_age=28800)
     return response
@@ -130,8 +402,8 @@ async def callback(code: str, state: str):
 @app.get("/api/auth/logout")
 async def logout(request: Request, response: Response):
     session_id = request.cookies.get("session_id")
-    if session_id and session_id in sessions:
-        del sessions[session_id]
+    if session_id:
+        await sessions.delete(session_id)
     response.delete_cookie("session_id")
     return {"message": "Logged out"}
 
@@ -139,115 +411,681 @@ async def logout(request: Request, response: Response):
 async def profile(user: dict = Depends(get_current_user)):
     return user
 
+@app.get("/api/sessions/stats", dependencies=[Depends(require_monitoring_access)])
+async def session_stats():
+    return await sessions.stats()
+
+@app.get("/api/umap/index/stats", dependencies=[Depends(require_monitoring_access)])
+async def spatial_index_stats():
+    return spatial_index.index.stats()
+
+@app.get("/api/orm/stats", dependencies=[Depends(require_monitoring_access)])
+async def orm_stats():
+    return orm_executor.executor.stats()
+
+@app.get("/api/admin/profiles")
+async def list_request_profiles(user: dict = Depends(get_profiling_user)):
+    return {"profiles": request_profiler.list_profiles()}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, user: dict = Depends(get_profiling_user)):
+    profile = request_profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profil nicht gefunden")
+    return profile
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries(user: dict = Depends(get_profiling_user), limit: int = Query(100, ge=1, le=1000)):
+    return {
+        "threshold_ms": request_profiler.SLOW_QUERY_THRESHOLD_MS,
+        "queries": request_profiler.slow_queries(limit)
+    }
+
 @app.get("/api/umap/maps")
-async def get_umap_maps(user: dict = Depends(get_current_user)):
-    try:
-        config = await get_umap_config()
-        username = user.get('username')
-        conn = psycopg2.connect(
-            host=config['db_host'],
-            port=config['db_port'],
-            database=config['db_name'],
-            user=config['db_user'],
-            password=config['db_password']
+async def get_umap_maps(
+    request: Request,
+    response: Response,
+    user: dict = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    share_status: Optional[int] = Query(None, ge=1, le=3),
+    sort: str = 'modified_desc',
+    instance: Optional[str] = None
+):
+    """
+    Karten des Benutzers aus allen uMap-Instanzen (oder nur aus instance). Die Instanzen werden
+    gleichzeitig abgefragt und nach der Sortierung zusammengeführt; nicht erreichbare Instanzen
+    erscheinen unter "instances" mit ihrem Fehler, die übrigen Karten werden trotzdem geliefert.
+    """
+    if sort not in umap_db.MAP_SORT_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"Ungültige Sortierung: {sort}")
+    sort_column, sort_direction = umap_db.MAP_SORT_OPTIONS[sort]
+
+    configs = [await get_umap_config(instance)] if instance else await get_umap_instances()
+    positions: Dict[str, Any] = {config['instance']: None for config in configs}
+    if cursor:
+        try:
+            positions = umap_db.decode_instance_cursor(cursor, sort)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Im Cursor fehlende Instanzen sind bereits vollständig ausgegeben
+        configs = [config for config in configs if config['instance'] in positions]
+    username = user.get('username')
+
+    # Filter und Keyset-Bedingung werden direkt in SQL ausgewertet
+    conditions = ["u.username = %s"]
+    params = [username]
+    if search:
+        conditions.append("m.name ILIKE %s")
+        params.append(f"%{umap_db.escape_like(search)}%")
+    if share_status:
+        conditions.append("m.share_status = %s")
+        params.append(share_status)
+
+    def instance_filter(config):
+        instance_conditions, instance_params = list(conditions), list(params)
+        position = positions.get(config['instance'])
+        if position is not None:
+            comparison = '<' if sort_direction == 'DESC' else '>'
+            instance_conditions.append(f"({sort_column}, m.id) {comparison} (%s, %s)")
+            instance_params.extend(position)
+        return ' AND '.join(instance_conditions), instance_params
+
+    def raise_if_all_failed(statuses):
+        if configs and all(status['status'] != 'ok' for status in statuses.values()):
+            if len(statuses) == 1:
+                raise HTTPException(status_code=500, detail=next(iter(statuses.values()))['error'])
+            raise HTTPException(status_code=500, detail='; '.join(f"{name}: {status['error']}" for name, status in statuses.items()))
+
+    # Änderungsstand je Instanz: (MAX(m.modified_at), Anzahl Karten, MAX(d.modified_at), Anzahl Datalayer)
+    # über alle Karten, die Filter und Cursor erfüllen - Grundlage für das ETag. Kein Last-Modified:
+    # gelöschte oder aus dem Filter gefallene Karten/Datalayer ändern nur die Anzahlen, nicht das Datum.
+    def validator(states):
+        return http_cache.make_etag(
+            username, sorted((config['instance'], config['url'], tuple(states[config['instance']])) for config in configs),
+            limit, cursor, search, share_status, sort
         )
-        cursor = conn.cursor()
 
-        # VEREINFACHTE Query - nur umap_map und auth_user
-        query = """
+    instances: Dict[str, Any] = {}
+    headers = None
+    map_configs = configs
+    conditional = http_cache.has_validators(request, last_modified=False)
+    if conditional:
+        # Nur bei bedingten Anfragen: günstige Vorabprüfung des Änderungsstands. Stimmt er mit
+        # dem Validator des Clients überein, entfällt die eigentliche Listen-Query.
+        async def fetch_state(config):
+            where, where_params = instance_filter(config)
+            pool = await umap_db.get_pool(config)
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(f"""
+                        SELECT MAX(m.modified_at), COUNT(DISTINCT m.id), MAX(d.modified_at), COUNT(d.id)
+                        FROM umap_map m
+                        INNER JOIN auth_user u ON m.owner_id = u.id
+                        LEFT JOIN umap_datalayer d ON d.map_id = m.id
+                        WHERE {where}
+                    """, where_params)
+                    return await cur.fetchone()
+
+        states = await query_umap_instances(configs, fetch_state)
+        instances = {name: status for name, (_, status) in states.items()}
+        raise_if_all_failed(instances)
+        if all(status['status'] == 'ok' for status in instances.values()):
+            etag = validator({name: state for name, (state, _) in states.items()})
+            headers = http_cache.validator_headers(etag)
+            if http_cache.is_not_modified(request, etag):
+                return http_cache.not_modified_response(headers)
+        map_configs = [c for c in configs if instances[c['instance']]['status'] == 'ok']
+
+    async def fetch_maps(config):
+        where, instance_params = instance_filter(config)
+        # Eine Zeile mehr laden, um zu erkennen, ob es eine weitere Seite gibt
+        instance_params.append(limit + 1)
+
+        # Eine Query für alle Karten inkl. Datalayer-Anzahl (statt einer COUNT-Query pro Karte);
+        # die Fensterfunktionen liefern den Änderungsstand vor dem LIMIT (wie fetch_state)
+        query = f"""
         SELECT 
             m.id,
             m.name,
             m.slug,
             m.share_status,
             m.created_at,
-            m.modified_at
+            m.modified_at,
+            COUNT(d.id) AS datalayer_count,
+            COALESCE(array_agg(d.id ORDER BY d.id) FILTER (WHERE d.id IS NOT NULL), '{{}}') AS datalayer_ids,
+            COALESCE(array_agg(d.modified_at ORDER BY d.id) FILTER (WHERE d.id IS NOT NULL), '{{}}') AS datalayer_modified,
+            COALESCE(array_agg(d.geojson ORDER BY d.id) FILTER (WHERE d.id IS NOT NULL), '{{}}') AS datalayer_files,
+            MAX(m.modified_at) OVER () AS state_map_modified,
+            COUNT(*) OVER () AS state_map_count,
+            MAX(MAX(d.modified_at)) OVER () AS state_datalayer_modified,
+            (SUM(COUNT(d.id)) OVER ())::bigint AS state_datalayer_count
         FROM umap_map m
         INNER JOIN auth_user u ON m.owner_id = u.id
-        WHERE u.username = %s
-        ORDER BY m.modified_at DESC
+        LEFT JOIN umap_datalayer d ON d.map_id = m.id
+        WHERE {where}
+        GROUP BY m.id
+        ORDER BY {sort_column} {sort_direction}, m.id {sort_direction}
+        LIMIT %s
         """
+        pool = await umap_db.get_pool(config)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, instance_params)
+                return await cur.fetchall()
+
+    results = await query_umap_instances(map_configs, fetch_maps)
+    for name, (_, status) in results.items():
+        if name in instances:
+            status['latency_ms'] = round(instances[name]['latency_ms'] + status['latency_ms'], 1)
+        instances[name] = status
+    if not conditional:
+        raise_if_all_failed(instances)
+    complete = all(status['status'] == 'ok' for status in instances.values())
+    if complete and headers is None:
+        # Ungeprüfte Anfrage: Validatoren aus der Listen-Query, ohne zusätzlichen Scan
+        etag = validator({
+            name: tuple(rows[0][10:14]) if rows else (None, 0, None, 0) for name, (rows, _) in results.items()
+        })
+        headers = http_cache.validator_headers(etag)
 
-        cursor.execute(query, (username,))
-        rows = cursor.fetchall()
+    def sort_value(row):
+        return {'m.modified_at': row[5], 'm.created_at': row[4], 'm.name': row[1]}[sort_column]
 
-        share_status_map = {1: 'Öffentlich', 2: 'Mit Link', 3: 'Privat'}
-        maps = []
+    # Zusammenführen: jeweils die nächste Karte der Instanz, deren erste offene Karte in der
+    # Sortierung vorn liegt. So wird jede Instanz lückenlos in ihrer eigenen Reihenfolge ausgegeben.
+    rows_by_instance = {name: rows for name, (rows, status) in results.items() if status['status'] == 'ok'}
+    consumed = dict.fromkeys(rows_by_instance, 0)
+    merged = []
+    pick = max if sort_direction == 'DESC' else min
+    while len(merged) < limit:
+        heads = [(name, rows[consumed[name]]) for name, rows in rows_by_instance.items() if consumed[name] < len(rows)]
+        if not heads:
+            break
+        name, row = pick(heads, key=lambda head: (
+            head[1][1].casefold() if sort_column == 'm.name' else sort_value(head[1]), head[0], head[1][0]
+        ))
+        consumed[name] += 1
+        merged.append((name, row))
 
-        for row in rows:
-            map_id = row[0]
+    # Nächste Seite: pro Instanz die zuletzt ausgegebene Karte; fehlgeschlagene Instanzen behalten
+    # ihre Position und werden erneut abgefragt, vollständig ausgegebene entfallen
+    next_positions = {}
+    for config in configs:
+        name = config['instance']
+        rows = rows_by_instance.get(name)
+        if rows is not None and consumed[name] == len(rows):
+            continue
+        if rows is None or consumed[name] == 0:
+            position = positions.get(name)
+            next_positions[name] = umap_db.encode_cursor(sort, *position) if position else None
+        else:
+            last = rows[consumed[name] - 1]
+            next_positions[name] = umap_db.encode_cursor(sort, sort_value(last), last[0])
+    next_cursor = umap_db.encode_instance_cursor(next_positions) if next_positions else None
 
-            # Feature-Count separat ermitteln (robuster)
-            feature_count = 0
-            try:
-                cursor.execute("""
-                    SELECT COUNT(*) 
-                    FROM umap_datalayer 
-                    WHERE map_id = %s
-                """, (map_id,))
-                result = cursor.fetchone()
-                if result:
-                    feature_count = result[0]
-            except:
-                # Wenn Tabelle nicht existiert oder anders heißt, ignorieren
-                pass
+    # Features stehen in den GeoJSON-Dateien der Datalayer (UMAP_MEDIA_ROOT der Standard-Instanz) -
+    # Kennzahlen kommen aus dem Cache
+    map_stats = await umap_cache.lookup({
+        row[0]: list(zip(row[7], row[8], row[9])) for name, row in merged if name == umap_db.DEFAULT_INSTANCE
+    })
+
+    share_status_map = {1: 'Öffentlich', 2: 'Mit Link', 3: 'Privat'}
+    urls = {config['instance']: config['url'] for config in configs}
+    maps = []
+
+    for name, row in merged:
+        map_id = row[0]
+        stats = map_stats.get(map_id) if name == umap_db.DEFAULT_INSTANCE else None
+        maps.append({
+            'id': map_id,
+            'instance': name,
+            'name': row[1],
+            'slug': row[2],
+            'description': '',
+            'share_status': share_status_map.get(row[3], 'Unbekannt'),
+            'created_at': row[4].isoformat() if row[4] else None,
+            'modified_at': row[5].isoformat() if row[5] else None,
+            'datalayer_count': row[6],
+            'feature_count': stats['feature_count'] if stats else None,
+            'geometry_types': stats['geometry_types'] if stats else None,
+            'bbox': stats['bbox'] if stats else None,
+            'edit_url': f"{urls[name]}/de/map/{row[2]}_{map_id}",
+            'view_url': f"{urls[name]}/de/map/{row[2]}_{map_id}"
+        })
+
+    # Validatoren nur, wenn alle Instanzen geantwortet haben und alle Kennzahlen vorliegen -
+    # sonst würde ein unvollständiger Stand gecacht
+    if complete and all(m['feature_count'] is not None for m in maps if m['instance'] == umap_db.DEFAULT_INSTANCE):
+        response.headers.update(headers)
+    return {
+        "maps": maps,
+        "count": len(maps),
+        "next_cursor": next_cursor,
+        "partial": not complete,
+        "instances": instances
+    }
 
-            maps.append({
+@app.get("/api/umap/maps/bbox")
+async def get_maps_in_bbox(
+    bbox: str,
+    user: dict = Depends(get_current_user),
+    include_datalayers: bool = False
+):
+    """Karten (optional mit Datalayern) des Benutzers, deren Ausdehnung bbox=minx,miny,maxx,maxy schneidet."""
+    try:
+        box = tuple(float(v) for v in bbox.split(','))
+    except ValueError:
+        box = ()
+    if len(box) != 4 or box[0] > box[2] or box[1] > box[3]:
+        raise HTTPException(status_code=400, detail="bbox muss minx,miny,maxx,maxy sein")
+
+    await spatial_index.index.ensure_fresh()
+    hits = spatial_index.index.query(box)
+    if not hits:
+        return {"maps": [], "count": 0}
+
+    layer_boxes: Dict[int, Dict[int, Any]] = {}
+    for (map_id, datalayer_id), layer_bbox in hits:
+        layer_boxes.setdefault(map_id, {})[datalayer_id] = layer_bbox
+
+    try:
+        config = await get_umap_config()
+        pool = await umap_db.get_pool(config)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Eigentümer-Filter auf den wenigen Treffern aus dem Index
+                await cur.execute("""
+                    SELECT m.id, m.name, m.slug, m.share_status, d.id, d.name
+                    FROM umap_map m
+                    INNER JOIN auth_user u ON m.owner_id = u.id
+                    LEFT JOIN umap_datalayer d ON d.map_id = m.id AND d.id = ANY(%s)
+                    WHERE m.id = ANY(%s) AND u.username = %s
+                    ORDER BY m.name, m.id, d.id
+                """, [[dl for layers in layer_boxes.values() for dl in layers], list(layer_boxes), user.get('username')])
+                rows = await cur.fetchall()
+    except psycopg.Error as e:
+        raise HTTPException(status_code=500, detail=f"Datenbankfehler: {str(e)}")
+
+    share_status_map = {1: 'Öffentlich', 2: 'Mit Link', 3: 'Privat'}
+    maps: Dict[int, Dict[str, Any]] = {}
+    for map_id, name, slug, share_status, datalayer_id, datalayer_name in rows:
+        entry = maps.get(map_id)
+        if entry is None:
+            boxes = list(layer_boxes[map_id].values())
+            entry = maps[map_id] = {
                 'id': map_id,
-                'name': row[1],
-                'slug': row[2],
-                'description': '',
-                'share_status': share_status_map.get(row[3], 'Unbekannt'),
-                'created_at': row[4].isoformat() if row[4] else None,
-                'modified_at': row[5].isoformat() if row[5] else None,
-                'feature_count': feature_count,
-                'edit_url': f"{config['url']}/de/map/{row[2]}_{map_id}",
-                'view_url': f"{config['url']}/de/map/{row[2]}_{map_id}"
+                'name': name,
+                'slug': slug,
+                'share_status': share_status_map.get(share_status, 'Unbekannt'),
+                # Ausdehnung der im Ausschnitt liegenden Datalayer
+                'bbox': [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)],
+                'view_url': f"{config['url']}/de/map/{slug}_{map_id}"
+            }
+            if include_datalayers:
+                entry['datalayers'] = []
+        if include_datalayers and datalayer_id is not None:
+            entry['datalayers'].append({
+                'id': datalayer_id,
+                'name': datalayer_name,
+                'bbox': list(layer_boxes[map_id][datalayer_id])
             })
 
-        cursor.close()
-        conn.close()
+    return {"maps": list(maps.values()), "count": len(maps)}
 
-        return {"maps": maps, "count": len(maps)}
+@app.get("/api/umap/maps/{map_id}/geojson")
+async def get_map_geojson(
+    map_id: int,
+    request: Request,
+    user: dict = Depends(get_current_user),
+    bbox: Optional[str] = None,
+    properties: Optional[str] = None
+):
+    """
+    Alle Datalayer einer Karte als eine FeatureCollection, gestreamt (chunked) und bei
+    Accept-Encoding: gzip komprimiert. bbox=minx,miny,maxx,maxy filtert Features,
+    properties=a,b beschränkt die übertragenen Properties.
+    """
+    box = None
+    if bbox:
+        try:
+            box = [float(v) for v in bbox.split(',')]
+        except ValueError:
+            box = []
+        if len(box) != 4 or box[0] > box[2] or box[1] > box[3]:
+            raise HTTPException(status_code=400, detail="bbox muss minx,miny,maxx,maxy sein")
+    selected = [p.strip() for p in properties.split(',') if p.strip()] if properties else None
+    if not umap_files.UMAP_MEDIA_ROOT:
+        raise HTTPException(status_code=500, detail="UMAP_MEDIA_ROOT nicht konfiguriert")
 
-    except psycopg2.Error as e:
+    try:
+        pool = await umap_db.get_pool(await get_umap_config())
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT m.modified_at, d.id, d.geojson, d.modified_at
+                    FROM umap_map m
+                    INNER JOIN auth_user u ON m.owner_id = u.id
+                    LEFT JOIN umap_datalayer d ON d.map_id = m.id
+                    WHERE m.id = %s AND u.username = %s
+                    ORDER BY d.id
+                """, [map_id, user.get('username')])
+                rows = await cur.fetchall()
+    except psycopg.Error as e:
         raise HTTPException(status_code=500, detail=f"Datenbankfehler: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Fehler beim Laden der Karten: {str(e)}")
+    if not rows:
+        raise HTTPException(status_code=404, detail="Karte nicht gefunden")
+
+    layers = [{'id': row[1], 'geojson': row[2]} for row in rows if row[1] is not None]
+    for layer in layers:
+        path = umap_files.datalayer_path(layer['geojson'])
+        if path is None or not path.is_file():
+            raise HTTPException(status_code=500, detail=f"Datalayer-Datei nicht erreichbar: {layer['geojson']}")
+
+    # ETag aus den Änderungszeitpunkten von Karte und Datalayern sowie den Filterparametern
+    gzip = compression.accepts_gzip(request.headers.get('accept-encoding'))
+    version = repr((rows[0][0], [(row[1], row[3]) for row in rows], box, selected))
+    etag = f'"{hashlib.sha256(version.encode()).hexdigest()[:32]}{"-gzip" if gzip else ""}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Accept-Encoding',
+        'Content-Disposition': f'inline; filename="map_{map_id}.geojson"'
+    }
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified_response(headers)
+
+    chunks = umap_files.iter_feature_collection(layers, box, selected)
+    if gzip:
+        chunks = compression.gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(chunks, media_type="application/geo+json", headers=headers)
+
+async def fetch_map_layers(map_ids: List[int], username: str) -> Dict[int, List[Dict[str, Any]]]:
+    """Datalayer (id, name, geojson) der Karten des Benutzers; fremde/unbekannte Karten fehlen im Ergebnis."""
+    pool = await umap_db.get_pool(await get_umap_config())
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                SELECT m.id, d.id, d.name, d.geojson
+                FROM umap_map m
+                INNER JOIN auth_user u ON m.owner_id = u.id
+                LEFT JOIN umap_datalayer d ON d.map_id = m.id
+                WHERE m.id = ANY(%s) AND u.username = %s
+                ORDER BY m.id, d.id
+            """, [map_ids, username])
+            rows = await cur.fetchall()
+    maps: Dict[int, List[Dict[str, Any]]] = {}
+    for map_id, datalayer_id, name, geojson in rows:
+        layers = maps.setdefault(map_id, [])
+        if datalayer_id is not None:
+            layers.append({'id': datalayer_id, 'name': name, 'geojson': geojson})
+    return maps
 
 @app.post("/api/umap/maps/{map_id}/save-to-geoserver")
 async def save_to_geoserver(map_id: int, user: dict = Depends(get_current_user)):
-    return {"message": "Funktion wird implementiert", "map_id": map_id, "status": "pending"}
+    geoserver_config = await get_geoserver_config()
+    if not umap_files.UMAP_MEDIA_ROOT:
+        raise HTTPException(status_code=500, detail="UMAP_MEDIA_ROOT nicht konfiguriert")
+
+    try:
+        maps = await fetch_map_layers([map_id], user.get('username'))
+    except psycopg.Error as e:
+        raise HTTPException(status_code=500, detail=f"Datenbankfehler: {str(e)}")
+    if map_id not in maps:
+        raise HTTPException(status_code=404, detail="Karte nicht gefunden")
+    layers = maps[map_id]
+
+    # Erst bei Bedarf laden (Startzeit der Worker)
+    import geoserver_export
+    try:
+        # Export läuft als Hintergrund-Job; Fortschritt über GET /api/jobs/{id}
+        job = await job_runner.runner.submit(
+            'geoserver_export', user.get('username'),
+            geoserver_export.export_and_publish, geoserver_config, map_id, layers,
+            params={'map_id': map_id, 'schema': geoserver_config['workspace'], 'layer_count': len(layers)}
+        )
+    except job_runner.JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return JSONResponse(status_code=202, content={
+        "map_id": map_id,
+        "status": job['status'],
+        "job_id": job['id'],
+        "job": job
+    })
+
+@app.post("/api/umap/maps/bulk-save-to-geoserver")
+async def bulk_save_to_geoserver(request: BulkExportRequest, user: dict = Depends(get_current_user)):
+    map_ids = list(dict.fromkeys(request.map_ids))
+    if not map_ids:
+        raise HTTPException(status_code=400, detail="Keine Karten angegeben")
+    if len(map_ids) > 500:
+        raise HTTPException(status_code=400, detail="Maximal 500 Karten pro Bulk-Export")
+    geoserver_config = await get_geoserver_config()
+    if not umap_files.UMAP_MEDIA_ROOT:
+        raise HTTPException(status_code=500, detail="UMAP_MEDIA_ROOT nicht konfiguriert")
+
+    try:
+        found = await fetch_map_layers(map_ids, user.get('username'))
+    except psycopg.Error as e:
+        raise HTTPException(status_code=500, detail=f"Datenbankfehler: {str(e)}")
+    # Nicht gefundene Karten werden im Ergebnis als fehlgeschlagen gemeldet
+    maps = {map_id: found.get(map_id) for map_id in map_ids}
+    import geoserver_export
+    parallelism = request.parallelism or geoserver_export.EXPORT_PARALLELISM
+
+    try:
+        job = await job_runner.runner.submit(
+            'geoserver_bulk_export', user.get('username'),
+            geoserver_export.export_maps_bulk, geoserver_config, maps, parallelism,
+            params={'map_ids': map_ids, 'schema': geoserver_config['workspace'], 'parallelism': parallelism}
+        )
+    except job_runner.JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return JSONResponse(status_code=202, content={"status": job['status'], "job_id": job['id'], "job": job})
+
+@app.get("/api/jobs")
+async def list_jobs(user: dict = Depends(get_current_user), limit: int = Query(20, ge=1, le=100)):
+    return {"jobs": await job_runner.runner.list_jobs(user.get('username'), limit)}
+
+@app.get("/api/jobs/stats", dependencies=[Depends(require_monitoring_access)])
+async def job_stats():
+    return job_runner.runner.stats()
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(get_current_user)):
+    job = await job_runner.runner.get(job_id, user.get('username'))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return job
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, user: dict = Depends(get_current_user)):
+    if not await job_runner.runner.cancel(job_id, user.get('username')):
+        raise HTTPException(status_code=409, detail="Job ist nicht aktiv")
+    return await job_runner.runner.get(job_id, user.get('username'))
+
+@app.get("/api/traccar/sync/status")
+async def traccar_sync_status(user: dict = Depends(get_current_user)):
+    return traccar_sync.status
+
+@app.post("/api/traccar/sync")
+async def traccar_sync_run(user: dict = Depends(get_current_user)):
+    # Konfiguration vorab prüfen, damit Fehler direkt gemeldet werden statt erst im Job
+    await get_traccar_config()
+    await get_geoserver_config()
+    try:
+        # Synchronisation läuft als Hintergrund-Job; Ergebnis über GET /api/jobs/{id}
+        job = await job_runner.runner.submit(
+            'traccar_sync', user.get('username'),
+            traccar_sync.run_job, asyncio.get_running_loop(), get_traccar_config, get_geoserver_config
+        )
+    except job_runner.JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return JSONResponse(status_code=202, content={"status": job['status'], "job_id": job['id'], "job": job})
+
+@app.get("/api/traccar/live/stats", dependencies=[Depends(require_monitoring_access)])
+async def traccar_live_stats():
+    return traccar_live.hub.stats()
+
+@app.websocket("/api/traccar/live")
+async def traccar_live_positions(websocket: WebSocket, devices: Optional[str] = None, bbox: Optional[str] = None):
+    """
+    Live-Positionen als {"positions": [...]}. Filter per Query (devices=1,2&bbox=minx,miny,maxx,maxy)
+    oder zur Laufzeit als Nachricht {"devices": [...], "bbox": [...]}.
+    """
+    try:
+        user = await get_current_user(websocket)
+        device_ids, box = traccar_live.parse_filter(devices, bbox)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+    await websocket.accept()
+
+    subscriber = traccar_live.Subscriber(user.get('username'), device_ids, box)
+    session_id = websocket.cookies.get("session_id")
+
+    async def receive_filters():
+        while True:
+            message = await websocket.receive_json()
+            subscriber.set_filter(*traccar_live.parse_filter(message.get('devices'), message.get('bbox')))
+
+    async def send_positions():
+        while True:
+            batch = await subscriber.next_batch()
+            # Hängt ein Client länger, wird er getrennt statt Puffer im Server aufzubauen
+            await asyncio.wait_for(websocket.send_json({'positions': batch}), traccar_live.TRACCAR_LIVE_SEND_TIMEOUT)
 
-@sync_to_async
-def get_settings_sync():
-    settings = Settings.objects.filter(is_active=True).exclude(service_name='keycloak')
-    result = {}
-    for setting in settings:
-        result[setting.service_name] = setting.to_dict()
-    return result
+    async def watch_session():
+        # Logout oder Ablauf der Session beendet auch die Live-Verbindung
+        while True:
+            await asyncio.sleep(60)
+            session = await sessions.get(session_id)
+            if not session or session.is_expired():
+                return
+
+    traccar_live.hub.subscribe(subscriber)
+    tasks = [asyncio.create_task(coro) for coro in (receive_filters(), send_positions(), watch_session())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        traccar_live.hub.unsubscribe(subscriber)
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        disconnected = any(isinstance(r, WebSocketDisconnect) for r in results)
+        if not disconnected:
+            invalid = any(isinstance(r, (ValueError, TypeError, AttributeError)) for r in results)
+            try:
+                await websocket.close(code=1003 if invalid else 1000)
+            except RuntimeError:
+                pass
+
+@app.get("/api/tiles/stats", dependencies=[Depends(require_monitoring_access)])
+async def tile_stats():
+    return tile_cache.cache.stats()
+
+async def user_owns_map(map_id: int, username: str) -> bool:
+    try:
+        pool = await umap_db.get_pool(await get_umap_config())
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT 1 FROM umap_map m
+                    INNER JOIN auth_user u ON m.owner_id = u.id
+                    WHERE m.id = %s AND u.username = %s
+                """, [map_id, username])
+                return await cur.fetchone() is not None
+    except psycopg.Error as e:
+        raise HTTPException(status_code=500, detail=f"Datenbankfehler: {str(e)}")
+
+@app.get("/api/tiles/{layer}/{z}/{x}/{y}.mvt")
+async def vector_tile(layer: str, z: int, x: int, y: int, request: Request, user: dict = Depends(get_current_user)):
+    if not vector_tiles.LAYER_NAME_PATTERN.match(layer):
+        raise HTTPException(status_code=400, detail="Ungültiger Layer-Name")
+    if not vector_tiles.valid_tile(z, x, y):
+        raise HTTPException(status_code=400, detail="Ungültige Kachelkoordinaten")
+    config = await get_geoserver_config()
+    if vector_tiles.is_umap_table(layer):
+        # Exportierte uMap-Layer nur für den Eigentümer der Karte (wie alle uMap-Endpunkte)
+        map_id = vector_tiles.umap_map_id(layer)
+        if map_id is None or not await user_owns_map(map_id, user.get('username')):
+            raise HTTPException(status_code=404, detail="Layer nicht gefunden")
+
+    try:
+        pool = await geoserver_db.get_pool(config)
+        info = await vector_tiles.layer_info(pool, config['workspace'], layer)
+        if info is None:
+            raise HTTPException(status_code=404, detail="Layer nicht gefunden")
+
+        headers = {'Cache-Control': 'no-cache'}
+        if info['version']:
+            etag = f'"{info["version"]}"'
+            headers = {'Cache-Control': 'private, max-age=60', 'ETag': etag}
+            if http_cache.is_not_modified(request, etag):
+                return http_cache.not_modified_response(headers)
+        data, cached = await vector_tiles.get_tile(pool, config['workspace'], layer, info, z, x, y)
+    except HTTPException:
+        raise
+    except psycopg.Error as e:
+        raise HTTPException(status_code=500, detail=f"Datenbankfehler: {str(e)}")
+
+    headers['X-Tile-Cache'] = 'HIT' if cached else 'MISS'
+    return Response(content=data, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+def service_settings(instances: List[Settings]) -> Dict[str, Any]:
+    """Standard-Instanz wie bisher auf oberster Ebene, alle Instanzen zusätzlich unter "instances"."""
+    return {**instances[0].to_dict(), 'instances': [setting.to_dict() for setting in instances]}
 
 @app.get("/api/settings")
-async def get_settings(user: dict = Depends(get_current_user)):
+async def get_settings(request: Request, response: Response, user: dict = Depends(get_current_user)):
     try:
-        return await get_settings_sync()
+        settings = await settings_cache.get_all()
+        visible = {name: instances for name, instances in settings.items() if name != 'keycloak'}
+        # Validatoren direkt aus dem Cache-Snapshot, ohne Datenbankzugriff
+        etag = http_cache.make_etag(sorted(
+            (name, s.instance_name, s.id, s.updated_at) for name, instances in visible.items() for s in instances
+        ))
+        last_modified = max((s.updated_at for instances in visible.values() for s in instances if s.updated_at),
+                            default=None)
+        headers = http_cache.validator_headers(etag, last_modified)
+        if http_cache.is_not_modified(request, etag, last_modified):
+            return http_cache.not_modified_response(headers)
+        response.headers.update(headers)
+        return {name: service_settings(instances) for name, instances in visible.items()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@sync_to_async
-def get_service_sync(service: str):
-    return Settings.objects.get(service_name=service, is_active=True).to_dict()
-
 @app.get("/api/settings/{service}")
-async def get_service(service: str, user: dict = Depends(get_current_user)):
-    try:
-        return await get_service_sync(service)
-    except Settings.DoesNotExist:
-        raise HTTPException(status_code=404, detail="Service not found")
+async def get_service(service: str, request: Request, response: Response, user: dict = Depends(get_current_user),
+                      instance: Optional[str] = None):
+    if instance:
+        try:
+            instances = [await settings_cache.get_setting(service, instance)]
+        except Settings.DoesNotExist:
+            raise HTTPException(status_code=404, detail="Service not found")
+    else:
+        instances = await settings_cache.get_instances(service)
+        if not instances:
+            raise HTTPException(status_code=404, detail="Service not found")
+    etag = http_cache.make_etag(sorted((s.service_name, s.instance_name, s.id, s.updated_at) for s in instances))
+    last_modified = max((s.updated_at for s in instances if s.updated_at), default=None)
+    headers = http_cache.validator_headers(etag, last_modified)
+    if http_cache.is_not_modified(request, etag, last_modified):
+        return http_cache.not_modified_response(headers)
+    response.headers.update(headers)
+    return instances[0].to_dict() if instance else service_settings(instances)
 
-@sync_to_async
-def update_service_sync(service: str, data: ServiceUpdate, username: str):
-    setting = Settings.objects.get(service_name=service, is_active=True)
+@orm_executor.orm
+def update_service_sync(service: str, data: ServiceUpdate, username: str, instance: str = Settings.DEFAULT_INSTANCE):
+    setting = Settings.objects.get(service_name=service, instance_name=instance, is_active=True)
     
     # Website URL
     if data.website and 'url' in data.website:
@@ -286,13 +1124,24 @@ def update_service_sync(service: str, data: ServiceUpdate, username: str):
         if not exists:
             raise ValueError(f"workspace:{error_message}")
     
+    # post_save invalidiert den Settings-Cache in diesem und (per NOTIFY) allen anderen Prozessen
     setting.save()
     return setting.to_dict()
 
 @app.put("/api/settings/{service}")
-async def update_service(service: str, data: ServiceUpdate, user: dict = Depends(get_current_user)):
+async def update_service(service: str, data: ServiceUpdate, user: dict = Depends(get_current_user),
+                         instance: Optional[str] = None):
     try:
-        result = await update_service_sync(service, data, user.get('username'))
+        if instance is None:
+            # Gleiche Auflösung wie beim Lesen: Standard-Instanz bzw. die erste konfigurierte
+            instance = (await settings_cache.get_setting(service)).instance_name
+        result = await update_service_sync(service, data, user.get('username'), instance)
+        if service == 'umap':
+            # Pool bei geänderten Zugangsdaten neu aufbauen
+            try:
+                await umap_db.get_pool(await get_umap_config(instance))
+            except Exception:
+                pass
         return {"message": "Updated successfully", "data": result}
     except Settings.DoesNotExist:
         raise HTTPException(status_code=404, detail="Service not found")
@@ -320,89 +1169,16 @@ async def validate_geoserver_workspace(
     Validiert ob ein Workspace (Schema) in der Geoserver PostGIS-Datenbank existiert.
     Wird vom Frontend für Live-Validierung genutzt.
     """
-    connection = None
-    cursor = None
-    
-    try:
-        # Verbinde zur Geoserver PostGIS-Datenbank
-        connection = psycopg2.connect(
-            host=data.db_host,
-            port=data.db_port,
-            database=data.db_name,
-            user=data.db_user,
-            password=data.db_password,
-            connect_timeout=5
-        )
-        
-        cursor = connection.cursor()
-        
-        # Prüfe ob Schema existiert
-        cursor.execute("""
-            SELECT EXISTS(
-                SELECT 1 
-                FROM information_schema.schemata 
-                WHERE schema_name = %s
-            );
-        """, (data.workspace,))
-        
-        exists = cursor.fetchone()[0]
-        
-        if not exists:
-            # Liste verfügbare Schemas
-            cursor.execute("""
-                SELECT schema_name 
-                FROM information_schema.schemata 
-                WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
-                ORDER BY schema_name
-                LIMIT 10;
-            """)
-            available_schemas = [row[0] for row in cursor.fetchall()]
-            
-            message = (
-                f"Das Schema '{data.workspace}' existiert nicht in der Geoserver PostGIS-Datenbank "
-                f"'{data.db_name}' auf Host '{data.db_host}'. "
-            )
-            
-            if available_schemas:
-                message += f"Verfügbare Schemas: {', '.join(available_schemas)}"
-            
-            return WorkspaceValidationResponse(
-                exists=False,
-                message=message,
-                workspace=data.workspace
-            )
-        
-        return WorkspaceValidationResponse(
-            exists=True,
-            message=f"Schema '{data.workspace}' existiert in der Geoserver-Datenbank",
-            workspace=data.workspace
-        )
-        
-    except psycopg2.OperationalError as e:
-        error_detail = str(e).strip()
-        return WorkspaceValidationResponse(
-            exists=False,
-            message=(
-                f"Verbindungsfehler zur Geoserver PostGIS-Datenbank: "
-                f"Host={data.db_host}, Port={data.db_port}, Database={data.db_name}. "
-                f"Details: {error_detail}"
-            ),
-            workspace=data.workspace
-        )
-    except psycopg2.Error as e:
-        return WorkspaceValidationResponse(
-            exists=False,
-            message=f"Datenbankfehler: {str(e)}",
-            workspace=data.workspace
-        )
-    except Exception as e:
-        return WorkspaceValidationResponse(
-            exists=False,
-            message=f"Fehler bei der Validierung: {str(e)}",
-            workspace=data.workspace
-        )
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+    exists, message = await schema_catalog.check_workspace_async(
+        data.workspace,
+        data.db_host,
+        data.db_port,
+        data.db_name,
+        data.db_user,
+        data.db_password
+    )
+    return WorkspaceValidationResponse(
+        exists=exists,
+        message=message,
+        workspace=data.workspace
+    )
@@ -0,0 +1,234 @@
+"""
+Prometheus-Metriken für den FastAPI-Worker.
+
+- Antwortzeit und Fehler pro Route (Routen-Template, nicht der konkrete Pfad)
+- Dauer und Fehler der Upstream-Aufrufe: KeyCloak, PostGIS-Queries über die
+  Async-Pools (uMap, Geoserver) sowie Export und Traccar-Sync (execute, executemany
+  und COPY über timed_cursor) und ORM-Aufrufe im ORM-Thread-Pool
+- Gauges für Verbindungspools, Session-Speicher und interne Komponenten; jeder Worker
+  aktualisiert seine Werte periodisch (METRICS_GAUGE_INTERVAL), damit im Multiprozess-Modus
+  keine eingefrorenen Werte anderer Worker in die Summe eingehen
+
+Mit mehreren Worker-Prozessen muss PROMETHEUS_MULTIPROC_DIR gesetzt sein
+(Multiprozess-Modus von prometheus_client), sonst liefert jeder Abruf nur die Werte
+des zufällig getroffenen Workers.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Dict, Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from psycopg import AsyncCursor, Cursor
+from starlette.routing import Match
+
+import request_profiler
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Keycloak-Gruppe, deren Mitglieder Metriken, Health-Details und Statistiken per Session abrufen;
+# ohne Gruppe nur mit METRICS_TOKEN
+MONITORING_GROUP = os.getenv('MONITORING_GROUP', '')
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+METRICS_GAUGE_INTERVAL = float(os.getenv('METRICS_GAUGE_INTERVAL', '15'))
+
+def is_monitoring_user(user: Dict[str, Any]) -> bool:
+    return bool(MONITORING_GROUP) and MONITORING_GROUP in user.get('groups', [])
+
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    'gis_http_request_duration_seconds', 'Antwortzeit pro Route',
+    ['method', 'route', 'status'], buckets=_LATENCY_BUCKETS
+)
+REQUEST_ERRORS = Counter(
+    'gis_http_request_errors_total', 'Anfragen mit Status 5xx oder unbehandelter Ausnahme',
+    ['method', 'route', 'status']
+)
+UPSTREAM_LATENCY = Histogram(
+    'gis_upstream_duration_seconds', 'Dauer der Aufrufe an KeyCloak, PostGIS und das ORM',
+    ['upstream', 'operation'], buckets=_LATENCY_BUCKETS
+)
+UPSTREAM_ERRORS = Counter(
+    'gis_upstream_errors_total', 'Fehlgeschlagene Upstream-Aufrufe', ['upstream', 'operation']
+)
+ORM_QUEUE_WAIT = Histogram(
+    'gis_orm_queue_wait_seconds', 'Wartezeit von ORM-Aufrufen auf einen freien Thread', buckets=_LATENCY_BUCKETS
+)
+POOL_STATS = Gauge('gis_db_pool', 'Kennzahlen der PostGIS-Verbindungspools', ['pool', 'stat'], multiprocess_mode='livesum')
+SESSION_STATS = Gauge('gis_sessions', 'Kennzahlen des Session-Speichers', ['stat'], multiprocess_mode='livemax')
+COMPONENT_STATS = Gauge(
+    'gis_component', 'Kennzahlen von ORM-Executor, Job-Runner, Tile-Cache und Live-Hub',
+    ['component', 'stat'], multiprocess_mode='livesum'
+)
+
+
+@contextmanager
+def track(upstream: str, operation: str, detail=None):
+    """
+    Misst die Dauer eines Upstream-Aufrufs; Ausnahmen werden als Fehler gezählt und weitergereicht.
+    detail (z.B. SQL-Text, auch als Callable) wird nur für Profiling und Slow-Query-Log ausgewertet.
+    """
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        UPSTREAM_ERRORS.labels(upstream, operation).inc()
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        UPSTREAM_LATENCY.labels(upstream, operation).observe(duration)
+        request_profiler.observe(upstream, operation, started, duration, failed, detail)
+
+
+_cursor_classes: Dict[tuple, type] = {}
+
+
+def _query_text(query, context) -> str:
+    if isinstance(query, (str, bytes)):
+        return query
+    try:
+        return query.as_string(context)
+    except Exception:
+        return repr(query)
+
+
+def timed_cursor(upstream: str, sync: bool = False) -> type:
+    """
+    Cursor-Klasse (cursor_factory) für Pools und Verbindungen, die execute, executemany und
+    COPY misst; sync=True für synchrone Verbindungen (psycopg.connect).
+    """
+    cls = _cursor_classes.get((upstream, sync))
+    if cls is not None:
+        return cls
+    if sync:
+        class TimedSyncCursor(Cursor):
+            def execute(self, query, params=None, **kwargs):
+                with track(upstream, 'query', lambda: _query_text(query, self)):
+                    return super().execute(query, params, **kwargs)
+
+            def executemany(self, query, params_seq, **kwargs):
+                with track(upstream, 'executemany', lambda: _query_text(query, self)):
+                    return super().executemany(query, params_seq, **kwargs)
+
+            @contextmanager
+            def copy(self, statement, params=None, **kwargs):
+                with track(upstream, 'copy', lambda: _query_text(statement, self)):
+                    with super().copy(statement, params, **kwargs) as copy:
+                        yield copy
+
+        cls = TimedSyncCursor
+    else:
+        class TimedCursor(AsyncCursor):
+            async def execute(self, query, params=None, **kwargs):
+                with track(upstream, 'query', lambda: _query_text(query, self)):
+                    return await super().execute(query, params, **kwargs)
+
+            async def executemany(self, query, params_seq, **kwargs):
+                with track(upstream, 'executemany', lambda: _query_text(query, self)):
+                    return await super().executemany(query, params_seq, **kwargs)
+
+            @asynccontextmanager
+            async def copy(self, statement, params=None, **kwargs):
+                with track(upstream, 'copy', lambda: _query_text(statement, self)):
+                    async with super().copy(statement, params, **kwargs) as copy:
+                        yield copy
+
+        cls = TimedCursor
+    _cursor_classes[(upstream, sync)] = cls
+    return cls
+
+
+def set_stats(gauge: Gauge, labels: tuple, stats: Optional[Dict[str, Any]]):
+    """Übernimmt alle numerischen Werte eines stats()-Dicts in die Gauge."""
+    for name, value in (stats or {}).items():
+        if isinstance(value, (int, float)):
+            gauge.labels(*labels, name).set(value)
+
+
+_gauge_task: Optional[asyncio.Task] = None
+
+
+async def _refresh_gauges_periodically(refresh, interval: float):
+    while True:
+        try:
+            await refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Einzelne Komponente (z.B. Redis) nicht erreichbar - nächster Durchlauf
+            pass
+        await asyncio.sleep(interval)
+
+
+def start_gauge_refresher(refresh, interval: float = METRICS_GAUGE_INTERVAL):
+    """Aktualisiert die Gauges dieses Workers periodisch über die async-Funktion refresh()."""
+    global _gauge_task
+    if _gauge_task is None or _gauge_task.done():
+        _gauge_task = asyncio.create_task(_refresh_gauges_periodically(refresh, interval))
+
+
+async def stop_gauge_refresher():
+    global _gauge_task
+    task, _gauge_task = _gauge_task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def route_template(scope) -> str:
+    """Routen-Template (z.B. /api/jobs/{job_id}) statt des konkreten Pfads, um die Label-Anzahl zu begrenzen."""
+    app = scope.get('app')
+    for route in getattr(app, 'routes', ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return 'unmatched'
+
+
+class MetricsMiddleware:
+    """Erfasst Antwortzeit (inkl. gestreamtem Body) und Fehler jeder HTTP-Anfrage."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            status = 500
+            raise
+        finally:
+            labels = (scope['method'], route_template(scope), str(status))
+            REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+            if status >= 500:
+                REQUEST_ERRORS.labels(*labels).inc()
+
+
+def exposition() -> bytes:
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
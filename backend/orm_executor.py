@@ -0,0 +1,107 @@
+"""
+Ausführungsschicht für Django-ORM-Aufrufe aus FastAPI.
+
+sync_to_async (thread_sensitive=True) führt alle ORM-Aufrufe nacheinander auf einem
+einzigen Thread aus. Stattdessen laufen sie hier in einem eigenen Thread-Pool; jeder
+Thread hält seine eigene Datenbankverbindung (Django-Verbindungen sind thread-lokal,
+Wiederverwendung über CONN_MAX_AGE).
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+from django.db import close_old_connections, connection
+
+import metrics
+
+ORM_MAX_WORKERS = int(os.getenv('ORM_MAX_WORKERS', '8'))
+
+
+def _timed_execute(execute, sql, params, many, context):
+    """Django execute_wrapper: misst jedes SQL-Statement eines ORM-Aufrufs."""
+    with metrics.track('django_db', 'query', sql):
+        return execute(sql, params, many, context)
+
+
+class OrmExecutor:
+
+    def __init__(self, max_workers: int = ORM_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='orm')
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def _call(self, submitted: float, func, args, kwargs):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self._wait_seconds += started - submitted
+        metrics.ORM_QUEUE_WAIT.observe(started - submitted)
+        failed = False
+        # Abgelaufene oder defekte Verbindungen dieses Threads vor und nach dem Aufruf aufräumen
+        close_old_connections()
+        try:
+            with metrics.track('orm', getattr(func, '__name__', 'call')), connection.execute_wrapper(_timed_execute):
+                return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            close_old_connections()
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.failed += failed
+                self._run_seconds += time.perf_counter() - started
+
+    async def run(self, func, *args, **kwargs):
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        # Kontext (laufende Anfrage für Profiling/Slow-Query-Log) in den ORM-Thread übernehmen
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, context.run, self._call, time.perf_counter(), func, args, kwargs
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self.completed or 1
+            return {
+                'max_workers': self.max_workers,
+                'queued': self.queued,
+                'active': self.active,
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_wait_ms': round(self._wait_seconds / completed * 1000, 3),
+                'avg_run_ms': round(self._run_seconds / completed * 1000, 3)
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+executor = OrmExecutor()
+
+
+async def run_orm(func, *args, **kwargs):
+    return await executor.run(func, *args, **kwargs)
+
+
+def orm(func):
+    """Decorator analog zu sync_to_async, aber über den ORM-Thread-Pool."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await executor.run(func, *args, **kwargs)
+    return wrapper
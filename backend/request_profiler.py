@@ -0,0 +1,206 @@
+"""
+Optionales Profiling einzelner Anfragen und Slow-Query-Log.
+
+Profiliert wird eine Anfrage, wenn ein berechtigter Benutzer den Header X-Profile: 1
+mitschickt oder sie in die Stichprobe (PROFILE_SAMPLE_RATE) fällt. Aufgezeichnet werden
+eine Zeitleiste aller über metrics.track gemessenen Aufrufe (PostGIS-Queries, ORM-Aufrufe
+samt ihrer SQL-Statements, KeyCloak) und ein cProfile-Aufrufprofil des Event-Loop-Threads.
+cProfile kann pro Thread nur einmal aktiv sein; parallel profilierte Anfragen erhalten
+daher nur die Zeitleiste, und das Aufrufprofil enthält auch andere Tasks, die währenddessen
+auf dem Event-Loop laufen.
+
+Profile und Slow-Query-Log liegen im Speicher des jeweiligen Worker-Prozesses.
+"""
+import contextvars
+import logging
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+PROFILE_HEADER = b'x-profile'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MAX_RECORDS = int(os.getenv('PROFILE_MAX_RECORDS', '50'))
+PROFILE_TOP_FUNCTIONS = int(os.getenv('PROFILE_TOP_FUNCTIONS', '40'))
+# Gruppe, die Profiling per Header auslösen und Profile/Slow-Query-Log abrufen darf; leer = niemand
+PROFILE_GROUP = os.getenv('PROFILE_GROUP', '')
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '500'))
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', '200'))
+# Upstreams, deren Aufrufe im Slow-Query-Log landen; ORM-Aufrufe erscheinen über ihre django_db-Statements
+_SLOW_QUERY_UPSTREAMS = ('umap_db', 'geoserver_db', 'django_db')
+_MAX_QUERY_LENGTH = 2000
+
+logger = logging.getLogger('gis.slow_query')
+
+_current_request: contextvars.ContextVar[Optional['RequestContext']] = contextvars.ContextVar(
+    'gis_request_context', default=None
+)
+_profiles: 'deque[Dict[str, Any]]' = deque(maxlen=PROFILE_MAX_RECORDS)
+_slow_queries: 'deque[Dict[str, Any]]' = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_cprofile_lock = threading.Lock()
+
+
+class RequestContext:
+    """Laufende Anfrage; events ist nur bei profilierten Anfragen gesetzt."""
+
+    __slots__ = ('method', 'path', 'started', 'events')
+
+    def __init__(self, method: str, path: str, profiled: bool):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.events: Optional[List[Dict[str, Any]]] = [] if profiled else None
+
+
+def is_authorized(user: Dict[str, Any]) -> bool:
+    return bool(PROFILE_GROUP) and PROFILE_GROUP in user.get('groups', [])
+
+
+def _query_text(detail) -> Optional[str]:
+    if callable(detail):
+        detail = detail()
+    if detail is None:
+        return None
+    if isinstance(detail, bytes):
+        detail = detail.decode(errors='replace')
+    text = re.sub(r'\s+', ' ', str(detail)).strip()
+    return text if len(text) <= _MAX_QUERY_LENGTH else text[:_MAX_QUERY_LENGTH] + '…'
+
+
+def observe(upstream: str, operation: str, started: float, duration: float, failed: bool, detail=None):
+    """Von metrics.track aufgerufen: Ereignis in die Zeitleiste, langsame Queries ins Log."""
+    context = _current_request.get()
+    profiled = context is not None and context.events is not None
+    slow = upstream in _SLOW_QUERY_UPSTREAMS and duration * 1000 >= SLOW_QUERY_THRESHOLD_MS
+    if not (profiled or slow):
+        return
+    query = _query_text(detail)
+    duration_ms = round(duration * 1000, 3)
+    if profiled:
+        context.events.append({
+            'upstream': upstream,
+            'operation': operation,
+            'start_ms': round((started - context.started) * 1000, 3),
+            'duration_ms': duration_ms,
+            'failed': failed,
+            'query': query,
+            'thread': threading.current_thread().name
+        })
+    if slow:
+        entry = {
+            'at': datetime.now().isoformat(),
+            'upstream': upstream,
+            'operation': operation,
+            'duration_ms': duration_ms,
+            'failed': failed,
+            'query': query,
+            'request': f"{context.method} {context.path}" if context is not None else None
+        }
+        _slow_queries.append(entry)
+        logger.warning("Langsame Query (%.1f ms, %s/%s): %s", duration_ms, upstream, operation, query)
+
+
+def _top_functions(profiler) -> List[Dict[str, Any]]:
+    import pstats
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+    return [
+        {
+            'function': name,
+            'location': f"{filename}:{line}",
+            'calls': calls,
+            'total_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3)
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _callers) in rows
+    ]
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    return [
+        {k: profile[k] for k in ('id', 'at', 'method', 'path', 'status', 'duration_ms', 'trigger')}
+        for profile in reversed(_profiles)
+    ]
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    return next((profile for profile in _profiles if profile['id'] == profile_id), None)
+
+
+def slow_queries(limit: int = 100) -> List[Dict[str, Any]]:
+    return list(reversed(_slow_queries))[:limit]
+
+
+class ProfilingMiddleware:
+    """
+    Setzt den Anfragekontext für Slow-Query-Log und Zeitleiste und profiliert ausgewählte Anfragen.
+
+    authorize(request) entscheidet, ob der Absender des X-Profile-Headers profilieren darf.
+    Das Ergebnis ist über die im Header X-Profile-Id zurückgegebene ID abrufbar.
+    """
+
+    def __init__(self, app, authorize):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        trigger = None
+        if any(name == PROFILE_HEADER and value == b'1' for name, value in scope.get('headers', [])):
+            from starlette.requests import Request
+            if await self.authorize(Request(scope)):
+                trigger = 'header'
+        elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            trigger = 'sample'
+
+        context = RequestContext(scope['method'], scope['path'], trigger is not None)
+        token = _current_request.set(context)
+        if trigger is None:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _current_request.reset(token)
+            return
+
+        profile_id = secrets.token_hex(8)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message = {**message, 'headers': [*message.get('headers', []), (b'x-profile-id', profile_id.encode())]}
+            await send(message)
+
+        profiler = None
+        if _cprofile_lock.acquire(blocking=False):
+            import cProfile
+            profiler = cProfile.Profile()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+            _current_request.reset(token)
+            _profiles.append({
+                'id': profile_id,
+                'at': datetime.now().isoformat(),
+                'method': context.method,
+                'path': context.path,
+                'status': status,
+                'trigger': trigger,
+                'duration_ms': round((time.perf_counter() - context.started) * 1000, 3),
+                'timeline': sorted(context.events, key=lambda event: event['start_ms']),
+                'functions': _top_functions(profiler) if profiler is not None else None
+            })
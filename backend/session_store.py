@@ -0,0 +1,326 @@
+"""
+Session-Speicher für die FastAPI-Worker.
+
+Die Sessions liegen in einem austauschbaren Backend (In-Memory oder Redis),
+davor sitzt pro Worker ein kleiner LRU-Cache für häufig genutzte Sessions.
+Mit dem Redis-Backend teilen sich alle uvicorn-Worker dieselben Sessions.
+"""
+import abc
+import asyncio
+import heapq
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+SESSION_REDIS_URL = os.getenv('SESSION_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+SESSION_REDIS_PREFIX = os.getenv('SESSION_REDIS_PREFIX', 'gis:session:')
+SESSION_LRU_SIZE = int(os.getenv('SESSION_LRU_SIZE', '1024'))
+# Wie lange ein Worker eine Session aus dem LRU bedient, bevor er das Backend erneut fragt
+# (begrenzt, wie lange ein Logout auf anderen Workern unbemerkt bleibt)
+SESSION_LRU_TTL = float(os.getenv('SESSION_LRU_TTL', '30'))
+SESSION_MAX_COUNT = int(os.getenv('SESSION_MAX_COUNT', '10000'))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))
+
+
+class Session:
+    """Kompakter Session-Datensatz (ohne Instanz-__dict__)."""
+
+    __slots__ = ('user', 'access_token', 'refresh_token', 'expires', 'token_expires', 'refresh_retry_after')
+
+    def __init__(self, user: Dict[str, Any], access_token: str, refresh_token: Optional[str], expires: datetime,
+                 token_expires: Optional[datetime] = None, refresh_retry_after: Optional[datetime] = None):
+        self.user = user
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires = expires
+        # Ablauf des Access-Tokens (für den Refresh), unabhängig vom Ablauf der Session
+        self.token_expires = token_expires
+        # Nach einem fehlgeschlagenen Refresh (IdP nicht erreichbar) erst ab diesem Zeitpunkt erneut versuchen
+        self.refresh_retry_after = refresh_retry_after
+
+    @property
+    def groups(self) -> List[str]:
+        return self.user.get('groups', [])
+
+    def is_expired(self, now: Optional[datetime] = None) -> bool:
+        return self.expires < (now or datetime.now())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'user': self.user,
+            'access_token': self.access_token,
+            'refresh_token': self.refresh_token,
+            'expires': self.expires.isoformat(),
+            'token_expires': self.token_expires.isoformat() if self.token_expires else None,
+            'refresh_retry_after': self.refresh_retry_after.isoformat() if self.refresh_retry_after else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Session':
+        token_expires = data.get('token_expires')
+        retry_after = data.get('refresh_retry_after')
+        return cls(
+            data['user'], data['access_token'], data.get('refresh_token'), datetime.fromisoformat(data['expires']),
+            datetime.fromisoformat(token_expires) if token_expires else None,
+            datetime.fromisoformat(retry_after) if retry_after else None
+        )
+
+    def memory_size(self) -> int:
+        """Ungefährer Speicherbedarf in Bytes inkl. Tokens und Benutzerdaten."""
+        size = sys.getsizeof(self) + 3 * sys.getsizeof(self.expires) + sys.getsizeof(self.user)
+        size += sys.getsizeof(self.access_token or '') + sys.getsizeof(self.refresh_token or '')
+        for key, value in self.user.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+            if isinstance(value, list):
+                size += sum(sys.getsizeof(item) for item in value)
+        return size
+
+
+def _ttl_seconds(session: Session) -> int:
+    return max(1, int((session.expires - datetime.now()).total_seconds()))
+
+
+class SessionBackend(abc.ABC):
+    """Schnittstelle für Session-Backends."""
+
+    name = 'base'
+
+    @abc.abstractmethod
+    async def get(self, session_id: str) -> Optional[Session]:
+        ...
+
+    @abc.abstractmethod
+    async def set(self, session_id: str, session: Session):
+        ...
+
+    @abc.abstractmethod
+    async def replace(self, session_id: str, session: Session) -> bool:
+        """Schreibt die Session nur, wenn sie noch existiert (nicht gelöscht oder abgelaufen)."""
+
+    @abc.abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    async def sweep(self) -> int:
+        """Entfernt abgelaufene Sessions und gibt deren Anzahl zurück."""
+        return 0
+
+    @abc.abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        ...
+
+    async def close(self):
+        pass
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Sessions im Prozessspeicher - nur für einen einzelnen Worker geeignet.
+    Ein Heap nach Ablaufzeit erlaubt das Aufräumen ohne vollständigen Scan;
+    bei Erreichen von max_sessions wird die am frühesten ablaufende Session verdrängt.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_sessions: int = SESSION_MAX_COUNT):
+        self._sessions: Dict[str, Session] = {}
+        # (Ablaufzeit, Session-ID); Einträge gelöschter oder ersetzter Sessions werden beim Pop übersprungen
+        self._expiry_heap: list = []
+        self._max_sessions = max_sessions
+        self.evicted = 0
+
+    def _is_current(self, expires: datetime, session_id: str) -> bool:
+        session = self._sessions.get(session_id)
+        return session is not None and session.expires == expires
+
+    def _compact_heap(self):
+        if len(self._expiry_heap) > 2 * len(self._sessions) + 64:
+            self._expiry_heap = [(s.expires, sid) for sid, s in self._sessions.items()]
+            heapq.heapify(self._expiry_heap)
+
+    async def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    async def set(self, session_id, session):
+        self._sessions[session_id] = session
+        heapq.heappush(self._expiry_heap, (session.expires, session_id))
+        while len(self._sessions) > self._max_sessions and self._expiry_heap:
+            expires, victim = heapq.heappop(self._expiry_heap)
+            if self._is_current(expires, victim):
+                del self._sessions[victim]
+                self.evicted += 1
+        self._compact_heap()
+
+    async def replace(self, session_id, session):
+        if session_id not in self._sessions:
+            return False
+        await self.set(session_id, session)
+        return True
+
+    async def delete(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._compact_heap()
+
+    async def sweep(self):
+        now = datetime.now()
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] < now:
+            expires, session_id = heapq.heappop(self._expiry_heap)
+            if self._is_current(expires, session_id):
+                del self._sessions[session_id]
+                removed += 1
+        return removed
+
+    async def stats(self):
+        return {
+            'live_sessions': len(self._sessions),
+            'memory_bytes': sum(s.memory_size() for s in self._sessions.values()),
+            'max_sessions': self._max_sessions,
+            'evicted': self.evicted
+        }
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Sessions in Redis (oder einem Server mit Redis-Protokoll).
+    Der Client kann übergeben werden, z.B. ein lokaler Fake für Tests.
+    Abgelaufene Sessions entfernt Redis selbst über die TTL der Keys; ein Sorted Set
+    (Session-ID -> Ablaufzeit) hält die Anzahl ohne SCAN über alle Keys abrufbar.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client=None, url: str = SESSION_REDIS_URL, prefix: str = SESSION_REDIS_PREFIX):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self._client = client
+        self._prefix = prefix
+        self._index = f"{prefix}__index__"
+
+    def _key(self, session_id):
+        return f"{self._prefix}{session_id}"
+
+    async def get(self, session_id):
+        raw = await self._client.get(self._key(session_id))
+        if raw is None:
+            return None
+        return Session.from_dict(json.loads(raw))
+
+    async def set(self, session_id, session):
+        await self._client.set(self._key(session_id), json.dumps(session.to_dict()), ex=_ttl_seconds(session))
+        await self._client.zadd(self._index, {session_id: session.expires.timestamp()})
+
+    async def replace(self, session_id, session):
+        # SET XX: ein zwischenzeitlich gelöschter Key wird nicht wieder angelegt
+        if not await self._client.set(self._key(session_id), json.dumps(session.to_dict()), ex=_ttl_seconds(session),
+                                      xx=True):
+            return False
+        await self._client.zadd(self._index, {session_id: session.expires.timestamp()})
+        return True
+
+    async def delete(self, session_id):
+        await self._client.delete(self._key(session_id))
+        await self._client.zrem(self._index, session_id)
+
+    async def sweep(self):
+        # Die Session-Keys selbst sind per TTL bereits verschwunden, nur der Index wird bereinigt
+        return await self._client.zremrangebyscore(self._index, '-inf', time.time())
+
+    async def stats(self):
+        count = await self._client.zcount(self._index, time.time(), '+inf')
+        return {'live_sessions': count, 'memory_bytes': None}
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class SessionStore:
+    """Backend mit vorgeschaltetem LRU-Cache pro Worker und periodischem Aufräumen."""
+
+    def __init__(self, backend: SessionBackend, lru_size: int = SESSION_LRU_SIZE, lru_ttl: float = SESSION_LRU_TTL):
+        self.backend = backend
+        self._lru: OrderedDict = OrderedDict()
+        self._lru_size = lru_size
+        self._lru_ttl = lru_ttl
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    def _remember(self, session_id, session):
+        self._lru[session_id] = (session, time.monotonic() + self._lru_ttl)
+        self._lru.move_to_end(session_id)
+        while len(self._lru) > self._lru_size:
+            self._lru.popitem(last=False)
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        cached = self._lru.get(session_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._lru.move_to_end(session_id)
+            return cached[0]
+        session = await self.backend.get(session_id)
+        if session is None:
+            self._lru.pop(session_id, None)
+        else:
+            self._remember(session_id, session)
+        return session
+
+    async def set(self, session_id: str, session: Session):
+        await self.backend.set(session_id, session)
+        self._remember(session_id, session)
+
+    async def replace(self, session_id: str, session: Session) -> bool:
+        if await self.backend.replace(session_id, session):
+            self._remember(session_id, session)
+            return True
+        self._lru.pop(session_id, None)
+        return False
+
+    async def delete(self, session_id: str):
+        self._lru.pop(session_id, None)
+        await self.backend.delete(session_id)
+
+    async def sweep(self) -> int:
+        now = datetime.now()
+        for session_id in [sid for sid, (s, _) in self._lru.items() if s.is_expired(now)]:
+            del self._lru[session_id]
+        return await self.backend.sweep()
+
+    async def _run_sweeper(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Backend vorübergehend nicht erreichbar - nächster Durchlauf
+                pass
+
+    def start_sweeper(self, interval: float = SESSION_SWEEP_INTERVAL):
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._run_sweeper(interval))
+
+    async def stats(self) -> Dict[str, Any]:
+        result = {'backend': self.backend.name, 'lru_size': len(self._lru)}
+        result.update(await self.backend.stats())
+        return result
+
+    async def close(self):
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            await asyncio.gather(self._sweeper_task, return_exceptions=True)
+            self._sweeper_task = None
+        await self.backend.close()
+
+
+def create_store() -> SessionStore:
+    if SESSION_BACKEND == 'redis':
+        return SessionStore(RedisSessionBackend())
+    if SESSION_BACKEND == 'memory':
+        # Das Backend liegt bereits im Prozess - ein zusätzlicher LRU brächte nichts
+        return SessionStore(MemorySessionBackend(), lru_size=0)
+    raise ValueError(f"Unbekanntes SESSION_BACKEND: {SESSION_BACKEND}")
@@ -1,8 +1,19 @@
 from django.contrib import admin
-from .models import Settings
+from .models import Settings, DatalayerCache, Job
 
 @admin.register(Settings)
 class SettingsAdmin(admin.ModelAdmin):
-    list_display = ['service_name', 'website_url', 'is_active', 'updated_at']
+    list_display = ['service_name', 'instance_name', 'website_url', 'is_active', 'updated_at']
     list_filter = ['service_name', 'is_active']
-    search_fields = ['service_name', 'website_url']
+    search_fields = ['service_name', 'instance_name', 'website_url']
+
+@admin.register(DatalayerCache)
+class DatalayerCacheAdmin(admin.ModelAdmin):
+    list_display = ['map_id', 'datalayer_id', 'feature_count', 'unreadable', 'source_modified_at', 'computed_at']
+    search_fields = ['map_id', 'datalayer_id']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'username', 'status', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['id', 'username']
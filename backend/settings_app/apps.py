@@ -4,3 +4,6 @@ class SettingsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'settings_app'
     verbose_name = 'Settings Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,174 @@
+"""
+Read-Through-Cache für die entschlüsselten Settings.
+
+Alle aktiven Settings werden mit einer Query geladen und im Prozess gehalten, pro Service
+als Liste seiner Instanzen (Standard-Instanz zuerst, dann nach Name).
+Änderungen (API oder Django-Admin) invalidieren den Cache über post_save/post_delete
+und werden per PostgreSQL NOTIFY an alle anderen Prozesse verteilt.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Optional, Dict, List, Callable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings as django_settings
+from django.db import connection
+
+from .models import Settings
+
+SETTINGS_CACHE_TTL = float(os.getenv('SETTINGS_CACHE_TTL', '300'))
+SETTINGS_NOTIFY_CHANNEL = 'gis_settings_changed'
+
+_snapshot: Optional[Dict[str, List[Settings]]] = None
+_snapshot_loaded_at = 0.0
+_version = 0
+_load_lock = threading.Lock()
+_listener_task: Optional[asyncio.Task] = None
+_invalidation_callbacks: List[Callable[[], None]] = []
+
+
+async def _default_run_orm(func, *args, **kwargs):
+    return await sync_to_async(func)(*args, **kwargs)
+
+
+# Ausführung der ORM-Ladevorgänge; der FastAPI-Worker setzt seinen ORM-Thread-Pool per use_orm_runner()
+_run_orm = _default_run_orm
+
+
+def use_orm_runner(run_orm):
+    """Setzt die async-Funktion run_orm(func, *args, **kwargs), über die der Cache das ORM aufruft."""
+    global _run_orm
+    _run_orm = run_orm
+
+
+def on_invalidate(callback: Callable[[], None]):
+    """
+    Registriert einen Callback für jede Invalidierung (auch per NOTIFY aus anderen Prozessen).
+    Er kann aus einem ORM-Thread aufgerufen werden und darf nicht blockieren.
+    """
+    _invalidation_callbacks.append(callback)
+
+
+def invalidate():
+    global _snapshot, _version
+    _version += 1
+    _snapshot = None
+    for callback in _invalidation_callbacks:
+        callback()
+
+
+def _fresh_snapshot() -> Optional[Dict[str, List[Settings]]]:
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _snapshot_loaded_at < SETTINGS_CACHE_TTL:
+        return snapshot
+    return None
+
+
+def _load() -> Dict[str, List[Settings]]:
+    loaded: Dict[str, List[Settings]] = {}
+    for setting in Settings.objects.filter(is_active=True).order_by('service_name', 'instance_name'):
+        loaded.setdefault(setting.service_name, []).append(setting)
+    for instances in loaded.values():
+        instances.sort(key=lambda s: (s.instance_name != Settings.DEFAULT_INSTANCE, s.instance_name))
+    return loaded
+
+
+def get_all_sync() -> Dict[str, List[Settings]]:
+    """
+    Liefert alle aktiven Settings (service_name -> Instanzen, Standard-Instanz zuerst).
+    Die Objekte werden geteilt und dürfen nicht verändert werden.
+    """
+    global _snapshot, _snapshot_loaded_at
+    snapshot = _fresh_snapshot()
+    if snapshot is not None:
+        return snapshot
+    with _load_lock:
+        snapshot = _fresh_snapshot()
+        if snapshot is not None:
+            return snapshot
+        version = _version
+        loaded = _load()
+        # Während des Ladens invalidiert - Ergebnis nicht übernehmen, aber zurückgeben
+        if version == _version:
+            _snapshot, _snapshot_loaded_at = loaded, time.monotonic()
+        return loaded
+
+
+async def get_all() -> Dict[str, List[Settings]]:
+    snapshot = _fresh_snapshot()
+    if snapshot is not None:
+        return snapshot
+    return await _run_orm(get_all_sync)
+
+
+async def get_instances(service: str) -> List[Settings]:
+    """Alle aktiven Instanzen des Service (Standard-Instanz zuerst); leer, wenn keine konfiguriert ist."""
+    return (await get_all()).get(service, [])
+
+
+async def get_setting(service: str, instance: Optional[str] = None) -> Settings:
+    """
+    Die angegebene Instanz, ohne instance die Standard-Instanz (bzw. die erste, falls keine
+    'default' heißt). Wirft Settings.DoesNotExist, wenn sie nicht (aktiv) konfiguriert ist.
+    """
+    instances = await get_instances(service)
+    for setting in instances:
+        if instance is None or setting.instance_name == instance:
+            return setting
+    name = service if instance is None else f"{service}:{instance}"
+    raise Settings.DoesNotExist(f"Service '{name}' nicht konfiguriert")
+
+
+def notify_change(service_name: str):
+    """Informiert alle Prozesse per NOTIFY über geänderte Settings (nur PostgreSQL)."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [SETTINGS_NOTIFY_CHANNEL, service_name])
+
+
+async def listen_for_changes(retry_delay: float = 5.0):
+    """
+    Hält eine LISTEN-Verbindung zur Django-Datenbank und invalidiert den Cache bei jeder Benachrichtigung.
+    Nach einem Verbindungsabbruch wird neu verbunden und vorsichtshalber invalidiert.
+    """
+    import psycopg
+
+    db = django_settings.DATABASES['default']
+    while True:
+        try:
+            conn = await psycopg.AsyncConnection.connect(
+                host=db.get('HOST') or None,
+                port=db.get('PORT') or None,
+                dbname=db.get('NAME'),
+                user=db.get('USER'),
+                password=db.get('PASSWORD'),
+                autocommit=True
+            )
+            async with conn:
+                await conn.execute(f"LISTEN {SETTINGS_NOTIFY_CHANNEL}")
+                # Änderungen während der Verbindungslücke nicht verpassen
+                invalidate()
+                async for _ in conn.notifies():
+                    invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            invalidate()
+            await asyncio.sleep(retry_delay)
+
+
+def start_listener():
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(listen_for_changes())
+
+
+async def stop_listener():
+    global _listener_task
+    task, _listener_task = _listener_task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
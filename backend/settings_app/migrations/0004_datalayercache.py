@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings_app', '0003_settings_traccar_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatalayerCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('map_id', models.IntegerField(db_index=True)),
+                ('datalayer_id', models.IntegerField()),
+                ('source_modified_at', models.DateTimeField(blank=True, null=True)),
+                ('feature_count', models.IntegerField(default=0)),
+                ('geometry_types', models.JSONField(blank=True, default=list)),
+                ('min_x', models.FloatField(blank=True, null=True)),
+                ('min_y', models.FloatField(blank=True, null=True)),
+                ('max_x', models.FloatField(blank=True, null=True)),
+                ('max_y', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'uMap Datalayer-Cache',
+                'verbose_name_plural': 'uMap Datalayer-Cache',
+                'db_table': 'umap_datalayer_cache',
+                'unique_together': {('map_id', 'datalayer_id')},
+            },
+        ),
+    ]
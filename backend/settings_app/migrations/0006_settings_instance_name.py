@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-16 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings_app', '0005_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settings',
+            name='instance_name',
+            field=models.SlugField(default='default', help_text="Name der Instanz, z.B. 'nord'. Die Instanz 'default' wird für Exporte und Dateizugriffe genutzt.", verbose_name='Instanz'),
+        ),
+        migrations.AlterField(
+            model_name='settings',
+            name='service_name',
+            field=models.CharField(choices=[('geoserver', 'Geoserver'), ('umap', 'uMap'), ('traccar', 'Traccar'), ('keycloak', 'KeyCloak')], max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='settings',
+            unique_together={('service_name', 'instance_name')},
+        ),
+    ]
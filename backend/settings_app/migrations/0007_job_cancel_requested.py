@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings_app', '0006_settings_instance_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings_app', '0007_job_cancel_requested'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datalayercache',
+            name='unreadable',
+            field=models.BooleanField(default=False),
+        ),
+    ]
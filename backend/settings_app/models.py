@@ -3,7 +3,8 @@ from django.db import models
 from encrypted_model_fields.fields import EncryptedCharField
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-import psycopg2
+
+from . import schema_catalog
 
 
 class Settings(models.Model):
@@ -14,7 +15,17 @@ class Settings(models.Model):
         ('keycloak', 'KeyCloak'),
     ]
 
-    service_name = models.CharField(max_length=50, choices=SERVICE_CHOICES, unique=True)
+    DEFAULT_INSTANCE = 'default'
+
+    service_name = models.CharField(max_length=50, choices=SERVICE_CHOICES)
+    # Mehrere Instanzen pro Service (z.B. regionale uMap-/Geoserver-Server); Einzelzugriffe
+    # (Export, Traccar-Sync, Dateizugriffe) nutzen die Standard-Instanz
+    instance_name = models.SlugField(
+        max_length=50,
+        default=DEFAULT_INSTANCE,
+        verbose_name="Instanz",
+        help_text="Name der Instanz, z.B. 'nord'. Die Instanz 'default' wird für Exporte und Dateizugriffe genutzt."
+    )
     website_url = models.URLField(max_length=200)
 
     db_host = models.CharField(max_length=100, blank=True, null=True)
@@ -59,10 +70,20 @@ class Settings(models.Model):
         db_table = 'settings'
         verbose_name = 'Einstellung'
         verbose_name_plural = 'Einstellungen'
+        unique_together = [('service_name', 'instance_name')]
 
     def __str__(self):
+        if self.instance_name != self.DEFAULT_INSTANCE:
+            return f"{self.get_service_name_display()} Settings ({self.instance_name})"
         return f"{self.get_service_name_display()} Settings"
 
+    @property
+    def instance_key(self) -> str:
+        """Eindeutiger Name für Ausgaben: 'umap' für die Standard-Instanz, sonst 'umap:nord'."""
+        if self.instance_name == self.DEFAULT_INSTANCE:
+            return self.service_name
+        return f"{self.service_name}:{self.instance_name}"
+
     def check_geoserver_workspace_exists(self):
         """
         Überprüft, ob das Schema (Workspace) in der Geoserver PostGIS-Datenbank existiert.
@@ -83,72 +104,15 @@ class Settings(models.Model):
         if not all([self.db_host, self.db_port, self.db_name, self.db_user, self.db_password]):
             return False, "Datenbankverbindungsparameter fehlen für Workspace-Validierung"
         
-        connection = None
-        cursor = None
-        
-        try:
-            # WICHTIG: Verbindung zur GEOSERVER PostGIS-Datenbank
-            connection = psycopg2.connect(
-                host=self.db_host,
-                port=self.db_port,
-                database=self.db_name,
-                user=self.db_user,
-                password=self.db_password,
-                connect_timeout=5
-            )
-            
-            cursor = connection.cursor()
-            
-            # Überprüfe ob Schema in der Geoserver-Datenbank existiert
-            cursor.execute("""
-                SELECT EXISTS(
-                    SELECT 1 
-                    FROM information_schema.schemata 
-                    WHERE schema_name = %s
-                );
-            """, (self.geoserver_workspace,))
-            
-            exists = cursor.fetchone()[0]
-            
-            if not exists:
-                # Liste verfügbare Schemas zur Hilfe
-                cursor.execute("""
-                    SELECT schema_name 
-                    FROM information_schema.schemata 
-                    WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
-                    ORDER BY schema_name
-                    LIMIT 10;
-                """)
-                available_schemas = [row[0] for row in cursor.fetchall()]
-                
-                error_msg = (
-                    f"Das Schema '{self.geoserver_workspace}' existiert nicht in der Geoserver PostGIS-Datenbank "
-                    f"'{self.db_name}' auf Host '{self.db_host}'. "
-                )
-                
-                if available_schemas:
-                    error_msg += f"Verfügbare Schemas: {', '.join(available_schemas)}"
-                
-                return False, error_msg
-            
-            return True, f"Schema '{self.geoserver_workspace}' existiert in der Geoserver-Datenbank"
-            
-        except psycopg2.OperationalError as e:
-            error_detail = str(e).strip()
-            return False, (
-                f"Verbindungsfehler zur Geoserver PostGIS-Datenbank: "
-                f"Host={self.db_host}, Port={self.db_port}, Database={self.db_name}. "
-                f"Details: {error_detail}"
-            )
-        except psycopg2.Error as e:
-            return False, f"Datenbankfehler bei der Geoserver-Datenbank: {str(e)}"
-        except Exception as e:
-            return False, f"Fehler bei der Schema-Überprüfung in der Geoserver-Datenbank: {str(e)}"
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
+        # Schema-Liste kommt aus dem gemeinsamen, kurzzeitig gecachten Schema-Katalog
+        return schema_catalog.check_workspace(
+            self.geoserver_workspace,
+            self.db_host,
+            self.db_port,
+            self.db_name,
+            self.db_user,
+            self.db_password
+        )
 
     def clean(self):
         """Validierung vor dem Speichern"""
@@ -164,7 +128,7 @@ class Settings(models.Model):
                 })
 
     def to_dict(self):
-        result = {"website": {"url": self.website_url}}
+        result = {"instance": self.instance_name, "website": {"url": self.website_url}}
         
         # Datenbank-Konfiguration
         if self.db_host:
@@ -203,3 +167,79 @@ class Settings(models.Model):
             }
         
         return result
+
+
+class DatalayerCache(models.Model):
+    """
+    Zwischengespeicherte Kennzahlen eines uMap-Datalayers (Feature-Anzahl, Geometrietypen, Ausdehnung).
+    Wird nur neu berechnet, wenn sich umap_datalayer.modified_at ändert.
+    """
+    map_id = models.IntegerField(db_index=True)
+    datalayer_id = models.IntegerField()
+    source_modified_at = models.DateTimeField(blank=True, null=True)
+
+    feature_count = models.IntegerField(default=0)
+    geometry_types = models.JSONField(default=list, blank=True)
+    min_x = models.FloatField(blank=True, null=True)
+    min_y = models.FloatField(blank=True, null=True)
+    max_x = models.FloatField(blank=True, null=True)
+    max_y = models.FloatField(blank=True, null=True)
+    # Datei fehlte oder war nicht lesbar: zählt als leer, bis sich modified_at ändert oder der Refresher erneut prüft
+    unreadable = models.BooleanField(default=False)
+
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'umap_datalayer_cache'
+        verbose_name = 'uMap Datalayer-Cache'
+        verbose_name_plural = 'uMap Datalayer-Cache'
+        unique_together = [('map_id', 'datalayer_id')]
+
+    def __str__(self):
+        return f"Karte {self.map_id} / Datalayer {self.datalayer_id}"
+
+    @property
+    def bbox(self):
+        if self.min_x is None:
+            return None
+        return [self.min_x, self.min_y, self.max_x, self.max_y]
+
+
+class Job(models.Model):
+    """
+    Zustand eines Hintergrund-Jobs (z.B. Geoserver-Export). Laufende Jobs werden im
+    Prozess gehalten; die Tabelle dient der Abfrage nach Abschluss und nach Neustarts.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Wartend'),
+        ('running', 'Läuft'),
+        ('done', 'Abgeschlossen'),
+        ('failed', 'Fehlgeschlagen'),
+        ('cancelled', 'Abgebrochen'),
+    ]
+
+    id = models.CharField(max_length=32, primary_key=True)
+    kind = models.CharField(max_length=50)
+    username = models.CharField(max_length=150, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    params = models.JSONField(default=dict, blank=True)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    # Abbruch angefordert; der ausführende Worker-Prozess liest das Flag und bricht ab
+    cancel_requested = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Wird bei jeder Zustands- oder Fortschrittsänderung und per Heartbeat gesetzt; erkennt verwaiste Jobs nach Neustarts
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'gis_jobs'
+        verbose_name = 'Hintergrund-Job'
+        verbose_name_plural = 'Hintergrund-Jobs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind} ({self.id}) - {self.status}"
@@ -0,0 +1,147 @@
+"""
+Schema-Katalog der Geoserver PostGIS-Datenbank.
+
+Die Schema-Liste wird pro Verbindung (Host, Port, Datenbank, Benutzer, Passwort-Hash)
+für kurze Zeit zwischengespeichert. Gleichzeitige Abfragen für dieselbe Verbindung
+werden zu einer einzigen Datenbankabfrage zusammengefasst. Genutzt von der
+Live-Validierung im Frontend und von Settings.clean().
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Tuple, Optional
+
+import psycopg
+
+SCHEMA_CATALOG_TTL = float(os.getenv('SCHEMA_CATALOG_TTL', '30'))
+SYSTEM_SCHEMAS = ('pg_catalog', 'information_schema', 'pg_toast')
+
+_cache: Dict[tuple, Tuple[float, List[str]]] = {}
+_locks: Dict[tuple, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_inflight: Dict[tuple, asyncio.Future] = {}
+
+
+def _key(host, port, dbname, user, password) -> tuple:
+    # Passwort nur als Hash im Schlüssel, damit falsche Zugangsdaten keinen Cache-Treffer erzeugen
+    return (host, int(port or 5432), dbname, user, hashlib.sha256((password or '').encode()).hexdigest())
+
+
+def _cached(key) -> Optional[List[str]]:
+    entry = _cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _purge_expired():
+    # Während der Eingabe entstehen viele Schlüssel (z.B. pro getipptem Passwort) - alte Einträge entfernen
+    now = time.monotonic()
+    with _locks_guard:
+        for key in [k for k, (expires, _) in _cache.items() if expires <= now]:
+            _cache.pop(key, None)
+            lock = _locks.get(key)
+            if lock is not None and not lock.locked():
+                _locks.pop(key, None)
+
+
+def _load_schemas(host, port, dbname, user, password) -> List[str]:
+    with psycopg.connect(host=host, port=port, dbname=dbname, user=user, password=password, connect_timeout=5) as conn:
+        rows = conn.execute("SELECT schema_name FROM information_schema.schemata ORDER BY schema_name").fetchall()
+    return [row[0] for row in rows]
+
+
+def get_schemas(host, port, dbname, user, password) -> List[str]:
+    """Alle sichtbaren Schemas der Datenbank; wirft psycopg.Error bei Verbindungsproblemen."""
+    key = _key(host, port, dbname, user, password)
+    schemas = _cached(key)
+    if schemas is not None:
+        return schemas
+    with _locks_guard:
+        lock = _locks.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            schemas = _cached(key)
+            if schemas is None:
+                schemas = _load_schemas(host, port, dbname, user, password)
+                _cache[key] = (time.monotonic() + SCHEMA_CATALOG_TTL, schemas)
+                _purge_expired()
+    finally:
+        # Fehlgeschlagene Abfragen landen nicht im Cache - Lock nicht dauerhaft aufbewahren
+        if key not in _cache:
+            with _locks_guard:
+                if _locks.get(key) is lock and not lock.locked():
+                    _locks.pop(key, None)
+    return schemas
+
+
+async def get_schemas_async(host, port, dbname, user, password) -> List[str]:
+    key = _key(host, port, dbname, user, password)
+    schemas = _cached(key)
+    if schemas is not None:
+        return schemas
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(asyncio.to_thread(get_schemas, host, port, dbname, user, password))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: Abbruch eines wartenden Requests darf die gemeinsame Abfrage nicht abbrechen
+    return await asyncio.shield(future)
+
+
+def invalidate():
+    """Verwirft alle Schema-Listen, z.B. nach dem Speichern der Geoserver-Settings."""
+    with _locks_guard:
+        _cache.clear()
+
+
+def _workspace_result(workspace, host, port, dbname, schemas) -> Tuple[bool, str]:
+    if workspace in schemas:
+        return True, f"Schema '{workspace}' existiert in der Geoserver-Datenbank"
+
+    available_schemas = [s for s in schemas if s not in SYSTEM_SCHEMAS][:10]
+    message = (
+        f"Das Schema '{workspace}' existiert nicht in der Geoserver PostGIS-Datenbank "
+        f"'{dbname}' auf Host '{host}'. "
+    )
+    if available_schemas:
+        message += f"Verfügbare Schemas: {', '.join(available_schemas)}"
+    return False, message
+
+
+def _error_result(error: Exception, host, port, dbname, db_error: str, other_error: str) -> Tuple[bool, str]:
+    if isinstance(error, psycopg.OperationalError):
+        return False, (
+            f"Verbindungsfehler zur Geoserver PostGIS-Datenbank: "
+            f"Host={host}, Port={port}, Database={dbname}. "
+            f"Details: {str(error).strip()}"
+        )
+    if isinstance(error, psycopg.Error):
+        return False, f"{db_error}: {str(error)}"
+    return False, f"{other_error}: {str(error)}"
+
+
+def check_workspace(workspace, host, port, dbname, user, password) -> Tuple[bool, str]:
+    """
+    Überprüft, ob das Schema (Workspace) existiert.
+
+    Returns:
+        tuple: (bool, str) - (Existiert, Fehlermeldung/Info)
+    """
+    try:
+        schemas = get_schemas(host, port, dbname, user, password)
+    except Exception as e:
+        return _error_result(e, host, port, dbname, "Datenbankfehler bei der Geoserver-Datenbank",
+                             "Fehler bei der Schema-Überprüfung in der Geoserver-Datenbank")
+    return _workspace_result(workspace, host, port, dbname, schemas)
+
+
+async def check_workspace_async(workspace, host, port, dbname, user, password) -> Tuple[bool, str]:
+    """Wie check_workspace, für die Live-Validierung (eigene Meldungstexte des Endpunkts)."""
+    try:
+        schemas = await get_schemas_async(host, port, dbname, user, password)
+    except Exception as e:
+        return _error_result(e, host, port, dbname, "Datenbankfehler", "Fehler bei der Validierung")
+    return _workspace_result(workspace, host, port, dbname, schemas)
@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Settings
+from . import cache, schema_catalog
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def settings_changed(sender, instance, **kwargs):
+    cache.invalidate()
+    if instance.service_name == 'geoserver':
+        # Geänderte Zugangsdaten/Workspace neu prüfen statt eine zwischengespeicherte Schema-Liste zu nutzen
+        schema_catalog.invalidate()
+    # Andere Prozesse (FastAPI-Worker, Admin) erst nach dem Commit benachrichtigen
+    transaction.on_commit(lambda: cache.notify_change(instance.service_name))
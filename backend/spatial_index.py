@@ -0,0 +1,210 @@
+"""
+Räumlicher Index über die Ausdehnungen aller uMap-Datalayer.
+
+Grundlage sind die Bounding Boxes im DatalayerCache. Sie werden in einen STR-gepackten
+R-Baum geladen (Sort-Tile-Recursive, statisch gepackt). Änderungen aus diesem Prozess
+(umap_cache) fließen sofort als Delta ein. Änderungen anderer Prozesse werden über
+computed_at nachgeladen, auch Einträge ohne Ausdehnung (entfernen den Schlüssel).
+Gelöschte Einträge erkennt ein Abgleich der Zeilenanzahl; nur wenn sie abweicht, werden
+alle Schlüssel geladen. Wird das Delta zu groß, wird der Baum neu gepackt.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from settings_app.models import DatalayerCache
+from orm_executor import run_orm
+
+SPATIAL_INDEX_NODE_SIZE = int(os.getenv('SPATIAL_INDEX_NODE_SIZE', '16'))
+# Höchstalter des Index, bevor eine Abfrage ihn mit der Datenbank abgleicht
+SPATIAL_INDEX_MAX_AGE = float(os.getenv('SPATIAL_INDEX_MAX_AGE', '30'))
+
+Key = Tuple[int, int]  # (map_id, datalayer_id)
+BBox = Tuple[float, float, float, float]
+
+
+def _intersects(a, b) -> bool:
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+def _envelope(items) -> BBox:
+    return (
+        min(item[0] for item in items), min(item[1] for item in items),
+        max(item[2] for item in items), max(item[3] for item in items)
+    )
+
+
+def _pack_level(items: list, node_size: int) -> list:
+    """Eine STR-Ebene: nach x in Scheiben, innerhalb der Scheiben nach y in Knoten gruppieren."""
+    node_count = math.ceil(len(items) / node_size)
+    slice_count = math.ceil(math.sqrt(node_count))
+    slice_size = slice_count * node_size
+    items = sorted(items, key=lambda item: item[0] + item[2])
+    nodes = []
+    for i in range(0, len(items), slice_size):
+        vertical = sorted(items[i:i + slice_size], key=lambda item: item[1] + item[3])
+        for j in range(0, len(vertical), node_size):
+            children = vertical[j:j + node_size]
+            nodes.append((*_envelope(children), children))
+    return nodes
+
+
+def pack(entries: Dict[Key, BBox], node_size: int = SPATIAL_INDEX_NODE_SIZE):
+    """Baut den Baum; Blätter sind (min_x, min_y, max_x, max_y, key), innere Knoten (…, children)."""
+    if not entries:
+        return None
+    level = [(*bbox, key) for key, bbox in entries.items()]
+    level = _pack_level(level, node_size)
+    while len(level) > 1:
+        level = _pack_level(level, node_size)
+    return level[0]
+
+
+def search(root, bbox: BBox) -> List[Key]:
+    if root is None:
+        return []
+    result = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if not _intersects(node, bbox):
+            continue
+        payload = node[4]
+        if isinstance(payload, list):
+            stack.extend(payload)
+        else:
+            result.append(payload)
+    return result
+
+
+class SpatialIndex:
+
+    def __init__(self, node_size: int = SPATIAL_INDEX_NODE_SIZE):
+        self.node_size = node_size
+        self._lock = threading.Lock()
+        self._entries: Dict[Key, BBox] = {}
+        # Alle Schlüssel im DatalayerCache, auch ohne Ausdehnung (für die Erkennung von Löschungen)
+        self._known: set = set()
+        self._root = None
+        # Seit dem letzten Packen geänderte/gelöschte Schlüssel (Baumtreffer ungültig) und neue Boxen
+        self._dirty: set = set()
+        self._delta: Dict[Key, BBox] = {}
+        self._watermark = None
+        self._synced_at = 0.0
+        self._sync_lock = asyncio.Lock()
+        self.rebuilds = 0
+
+    def _repack_if_needed(self):
+        if len(self._dirty) + len(self._delta) > max(256, len(self._entries) // 10):
+            self._root = pack(self._entries, self.node_size)
+            self._dirty.clear()
+            self._delta.clear()
+            self.rebuilds += 1
+
+    def upsert(self, map_id: int, datalayer_id: int, bbox: Optional[List[float]]):
+        key = (map_id, datalayer_id)
+        with self._lock:
+            self._known.add(key)
+            if key in self._entries:
+                self._dirty.add(key)
+            if bbox is None or bbox[0] is None:
+                self._entries.pop(key, None)
+                self._delta.pop(key, None)
+            else:
+                self._entries[key] = self._delta[key] = tuple(bbox)
+            self._repack_if_needed()
+
+    def remove_datalayers(self, datalayer_ids):
+        ids = set(datalayer_ids)
+        with self._lock:
+            self._known = {k for k in self._known if k[1] not in ids}
+            for key in [k for k in self._entries if k[1] in ids]:
+                self._entries.pop(key)
+                self._delta.pop(key, None)
+                self._dirty.add(key)
+            self._repack_if_needed()
+
+    def query(self, bbox: BBox) -> List[Tuple[Key, BBox]]:
+        with self._lock:
+            hits = [key for key in search(self._root, bbox) if key not in self._dirty]
+            hits += [key for key, box in self._delta.items() if _intersects(box, bbox)]
+            return [(key, self._entries[key]) for key in hits if key in self._entries]
+
+    def _load_sync(self, full: bool):
+        queryset = DatalayerCache.objects.all()
+        count = None
+        if not full and self._watermark is not None:
+            # Anzahl vor den Zeilen lesen: ein zwischenzeitlich neuer Eintrag führt höchstens
+            # zu einem unnötigen Schlüsselabgleich, nicht zu einer übersehenen Löschung
+            count = queryset.count()
+            queryset = queryset.filter(computed_at__gte=self._watermark)
+        rows = list(queryset.values_list('map_id', 'datalayer_id', 'min_x', 'min_y', 'max_x', 'max_y', 'computed_at'))
+        return rows, count
+
+    @staticmethod
+    def _load_keys_sync():
+        return set(DatalayerCache.objects.values_list('map_id', 'datalayer_id'))
+
+    def _drop(self, key: Key):
+        if self._entries.pop(key, None) is not None:
+            self._delta.pop(key, None)
+            self._dirty.add(key)
+
+    async def sync(self, full: bool = False):
+        """Gleicht den Index mit DatalayerCache ab (inkrementell über computed_at)."""
+        async with self._sync_lock:
+            started = time.monotonic()
+            full = full or self._watermark is None
+            rows, count = await run_orm(self._load_sync, full)
+            with self._lock:
+                if full:
+                    self._known = {(r[0], r[1]) for r in rows}
+                    self._entries = {(r[0], r[1]): (r[2], r[3], r[4], r[5]) for r in rows if r[2] is not None}
+                    self._root = pack(self._entries, self.node_size)
+                    self._dirty.clear()
+                    self._delta.clear()
+                    self.rebuilds += 1
+                else:
+                    for r in rows:
+                        key = (r[0], r[1])
+                        self._known.add(key)
+                        if r[2] is None:
+                            # Neu berechnet ohne Ausdehnung (z.B. alle Features entfernt)
+                            self._drop(key)
+                        elif self._entries.get(key) != (r[2], r[3], r[4], r[5]):
+                            if key in self._entries:
+                                self._dirty.add(key)
+                            self._entries[key] = self._delta[key] = (r[2], r[3], r[4], r[5])
+                if rows:
+                    self._watermark = max(r[6] for r in rows)
+                deleted = count is not None and count != len(self._known)
+            if deleted:
+                # Einträge wurden in einem anderen Prozess gelöscht
+                keys = await run_orm(self._load_keys_sync)
+                with self._lock:
+                    for key in self._known - keys:
+                        self._drop(key)
+                    self._known = keys
+            with self._lock:
+                self._repack_if_needed()
+            self._synced_at = started
+
+    async def ensure_fresh(self):
+        if time.monotonic() - self._synced_at > SPATIAL_INDEX_MAX_AGE:
+            await self.sync()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'delta': len(self._delta),
+                'dirty': len(self._dirty),
+                'rebuilds': self.rebuilds,
+                'age_s': round(time.monotonic() - self._synced_at, 1) if self._synced_at else None
+            }
+
+
+index = SpatialIndex()
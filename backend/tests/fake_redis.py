@@ -0,0 +1,74 @@
+"""
+Lokaler Fake für den Teil von redis.asyncio, den session_store nutzt.
+
+Die Zeit für Key-TTLs ist über advance() steuerbar, damit Tests Abläufe ohne
+Warten prüfen können.
+"""
+from typing import Dict, Optional, Tuple
+
+
+class FakeRedis:
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._zsets: Dict[str, Dict[str, float]] = {}
+        self._now = 0.0
+        self.closed = False
+
+    def advance(self, seconds: float):
+        self._now += seconds
+
+    def ttl(self, key: str) -> Optional[float]:
+        entry = self._values.get(key)
+        return None if entry is None or entry[1] is None else entry[1] - self._now
+
+    def _live(self, key):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self._now:
+            del self._values[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(key)
+        return None if entry is None else entry[0]
+
+    async def set(self, key, value, ex=None, xx=False):
+        if xx and self._live(key) is None:
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        self._values[key] = (value, self._now + ex if ex is not None else None)
+        return True
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self._values.pop(key, None) is not None)
+
+    async def zadd(self, key, mapping):
+        zset = self._zsets.setdefault(key, {})
+        added = sum(1 for member in mapping if member not in zset)
+        zset.update(mapping)
+        return added
+
+    async def zrem(self, key, *members):
+        zset = self._zsets.get(key, {})
+        return sum(1 for member in members if zset.pop(member, None) is not None)
+
+    @staticmethod
+    def _score(value):
+        return {'-inf': float('-inf'), '+inf': float('inf')}.get(value, value)
+
+    async def zremrangebyscore(self, key, low, high):
+        low, high = self._score(low), self._score(high)
+        zset = self._zsets.get(key, {})
+        removed = [member for member, score in zset.items() if low <= score <= high]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    async def zcount(self, key, low, high):
+        low, high = self._score(low), self._score(high)
+        return sum(1 for score in self._zsets.get(key, {}).values() if low <= score <= high)
+
+    async def aclose(self):
+        self.closed = True
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from starlette.requests import Request
+
+import http_cache
+
+ETAG = http_cache.make_etag('alice', 1, None)
+MODIFIED = datetime(2026, 10, 16, 12, 30, 15, 987654, tzinfo=timezone.utc)
+
+
+def make_request(**headers) -> Request:
+    return Request({
+        'type': 'http',
+        'method': 'GET',
+        'path': '/',
+        'headers': [(name.replace('_', '-').lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_make_etag_is_quoted_and_stable():
+    assert ETAG == http_cache.make_etag('alice', 1, None)
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert ETAG != http_cache.make_etag('alice', 2, None)
+
+
+@pytest.mark.parametrize('if_none_match', [
+    ETAG,
+    f"W/{ETAG}",
+    f'"andere", {ETAG}',
+    f'"andere",W/{ETAG}',
+    '*',
+])
+def test_if_none_match_hit(if_none_match):
+    assert http_cache.is_not_modified(make_request(if_none_match=if_none_match), ETAG)
+
+
+@pytest.mark.parametrize('if_none_match', ['"andere"', ETAG.strip('"'), '', f'{ETAG}x'])
+def test_if_none_match_miss(if_none_match):
+    assert not http_cache.is_not_modified(make_request(if_none_match=if_none_match), ETAG)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    request = make_request(if_none_match='"andere"', if_modified_since=http_cache.http_date(MODIFIED))
+
+    assert not http_cache.is_not_modified(request, ETAG, MODIFIED)
+
+
+@pytest.mark.parametrize('since, expected', [
+    (MODIFIED, True),
+    (MODIFIED + timedelta(hours=1), True),
+    (MODIFIED - timedelta(seconds=1), False),
+])
+def test_if_modified_since_compares_whole_seconds(since, expected):
+    request = make_request(if_modified_since=http_cache.http_date(since))
+
+    assert http_cache.is_not_modified(request, ETAG, MODIFIED) is expected
+
+
+def test_if_modified_since_with_naive_datetime_and_invalid_header():
+    naive = MODIFIED.replace(tzinfo=None)
+
+    assert http_cache.is_not_modified(make_request(if_modified_since=http_cache.http_date(naive)), ETAG, naive)
+    assert not http_cache.is_not_modified(make_request(if_modified_since='kein Datum'), ETAG, MODIFIED)
+    # Ohne Last-Modified des Endpunkts wird If-Modified-Since ignoriert
+    assert not http_cache.is_not_modified(make_request(if_modified_since=http_cache.http_date(MODIFIED)), ETAG)
+
+
+def test_unconditional_request():
+    request = make_request()
+
+    assert not http_cache.has_validators(request)
+    assert not http_cache.is_not_modified(request, ETAG, MODIFIED)
+
+
+def test_has_validators_without_last_modified():
+    request = make_request(if_modified_since=http_cache.http_date(MODIFIED))
+
+    assert http_cache.has_validators(request)
+    assert not http_cache.has_validators(request, last_modified=False)
+    assert http_cache.has_validators(make_request(if_none_match=ETAG), last_modified=False)
+
+
+def test_validator_headers():
+    assert http_cache.validator_headers(ETAG) == {'ETag': ETAG, 'Cache-Control': 'private, no-cache'}
+    assert http_cache.validator_headers(ETAG, MODIFIED)['Last-Modified'] == 'Fri, 16 Oct 2026 12:30:15 GMT'
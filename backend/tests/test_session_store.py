@@ -0,0 +1,181 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import session_store
+from fake_redis import FakeRedis
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_session(minutes: float = 60, username: str = 'alice') -> session_store.Session:
+    return session_store.Session(
+        user={'username': username, 'groups': ['gis']},
+        access_token='access',
+        refresh_token='refresh',
+        expires=datetime.now() + timedelta(minutes=minutes)
+    )
+
+
+def test_incomplete_backend_fails_on_creation():
+    class Incomplete(session_store.SessionBackend):
+        async def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_memory_sweep_removes_only_expired_sessions():
+    backend = session_store.MemorySessionBackend()
+
+    async def scenario():
+        await backend.set('old', make_session(minutes=-1))
+        await backend.set('new', make_session(minutes=60))
+        removed = await backend.sweep()
+        return removed, await backend.get('old'), await backend.get('new')
+
+    removed, old, new = run(scenario())
+    assert removed == 1
+    assert old is None
+    assert new is not None
+
+
+def test_memory_sweep_skips_stale_heap_entries():
+    backend = session_store.MemorySessionBackend()
+
+    async def scenario():
+        # Verlängerte Session: der alte Heap-Eintrag darf sie nicht entfernen
+        await backend.set('s', make_session(minutes=-1))
+        await backend.set('s', make_session(minutes=60))
+        return await backend.sweep(), await backend.get('s')
+
+    removed, session = run(scenario())
+    assert removed == 0
+    assert session is not None
+
+
+def test_memory_evicts_soonest_expiring_session_at_limit():
+    backend = session_store.MemorySessionBackend(max_sessions=2)
+
+    async def scenario():
+        await backend.set('soon', make_session(minutes=5))
+        await backend.set('late', make_session(minutes=60))
+        await backend.set('later', make_session(minutes=120))
+        return [await backend.get(sid) is not None for sid in ('soon', 'late', 'later')], await backend.stats()
+
+    present, stats = run(scenario())
+    assert present == [False, True, True]
+    assert stats['evicted'] == 1
+    assert stats['live_sessions'] == 2
+
+
+def test_redis_keys_expire_with_session():
+    client = FakeRedis()
+    backend = session_store.RedisSessionBackend(client=client, prefix='t:')
+
+    async def scenario():
+        await backend.set('s', make_session(minutes=10))
+        ttl = client.ttl('t:s')
+        client.advance(ttl + 1)
+        return ttl, await backend.get('s')
+
+    ttl, session = run(scenario())
+    assert 590 <= ttl <= 600
+    assert session is None
+
+
+def test_redis_round_trip_and_counter():
+    client = FakeRedis()
+    backend = session_store.RedisSessionBackend(client=client, prefix='t:')
+
+    async def scenario():
+        await backend.set('a', make_session(username='a'))
+        await backend.set('b', make_session(username='b'))
+        await backend.set('gone', make_session(minutes=-1))
+        loaded = await backend.get('a')
+        before = await backend.stats()
+        await backend.delete('b')
+        swept = await backend.sweep()
+        return loaded, before, swept, await backend.stats()
+
+    loaded, before, swept, after = run(scenario())
+    assert loaded.user['username'] == 'a'
+    assert before['live_sessions'] == 2
+    assert swept == 1
+    assert after['live_sessions'] == 1
+
+
+def test_lru_serves_cached_session_until_ttl():
+    client = FakeRedis()
+    store = session_store.SessionStore(session_store.RedisSessionBackend(client=client, prefix='t:'), lru_ttl=60)
+
+    async def scenario():
+        await store.set('s', make_session())
+        # Direkt im Backend gelöscht (z.B. Logout auf einem anderen Worker): LRU liefert weiter
+        await client.delete('t:s')
+        return await store.get('s')
+
+    assert run(scenario()) is not None
+
+
+def test_lru_rereads_backend_after_ttl():
+    client = FakeRedis()
+    store = session_store.SessionStore(session_store.RedisSessionBackend(client=client, prefix='t:'), lru_ttl=0)
+
+    async def scenario():
+        await store.set('s', make_session())
+        await client.delete('t:s')
+        return await store.get('s'), await store.stats()
+
+    session, stats = run(scenario())
+    assert session is None
+    assert stats['lru_size'] == 0
+
+
+def test_lru_is_bounded():
+    client = FakeRedis()
+    store = session_store.SessionStore(session_store.RedisSessionBackend(client=client, prefix='t:'), lru_size=2)
+
+    async def scenario():
+        for sid in ('a', 'b', 'c'):
+            await store.set(sid, make_session(username=sid))
+        stats = await store.stats()
+        # Verdrängte Session kommt weiterhin aus dem Backend
+        return stats, await store.get('a')
+
+    stats, session = run(scenario())
+    assert stats['lru_size'] == 2
+    assert stats['live_sessions'] == 3
+    assert session.user['username'] == 'a'
+
+
+@pytest.mark.parametrize('make_backend', [
+    session_store.MemorySessionBackend,
+    lambda: session_store.RedisSessionBackend(client=FakeRedis(), prefix='t:')
+])
+def test_replace_does_not_recreate_deleted_session(make_backend):
+    store = session_store.SessionStore(make_backend())
+
+    async def scenario():
+        session = make_session()
+        await store.set('s', session)
+        updated = await store.replace('s', session)
+        await store.delete('s')
+        recreated = await store.replace('s', session)
+        return updated, recreated, await store.get('s')
+
+    updated, recreated, session = run(scenario())
+    assert updated is True
+    assert recreated is False
+    assert session is None
+
+
+def test_refresh_retry_after_survives_serialization():
+    session = make_session()
+    session.refresh_retry_after = datetime.now() + timedelta(seconds=30)
+    restored = session_store.Session.from_dict(session.to_dict())
+    assert restored.refresh_retry_after == session.refresh_retry_after
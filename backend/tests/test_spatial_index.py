@@ -0,0 +1,133 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import spatial_index
+
+
+def random_boxes(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    boxes = {}
+    for i in range(count):
+        x, y = rng.uniform(-180, 170), rng.uniform(-90, 80)
+        boxes[(i // 3, i)] = (x, y, x + rng.uniform(0, 10), y + rng.uniform(0, 10))
+    return boxes
+
+
+def brute_force(boxes, bbox):
+    return sorted(key for key, box in boxes.items() if spatial_index._intersects(box, bbox))
+
+
+QUERIES = [(-180, -90, 180, 90), (0, 0, 10, 10), (-50.5, 20, -40, 25), (100, -80, 100, -80), (200, 200, 210, 210)]
+
+
+@pytest.mark.parametrize('count', [1, 2, 15, 16, 17, 255, 1000])
+@pytest.mark.parametrize('node_size', [2, 4, 16])
+def test_pack_and_search_match_brute_force(count, node_size):
+    boxes = random_boxes(count, seed=count)
+    root = spatial_index.pack(boxes, node_size)
+
+    for query in QUERIES:
+        assert sorted(spatial_index.search(root, query)) == brute_force(boxes, query)
+
+
+def test_pack_nodes_respect_node_size_and_envelopes():
+    boxes = random_boxes(500)
+
+    def check(node):
+        children = node[4]
+        if not isinstance(children, list):
+            return 1
+        assert 1 <= len(children) <= 4
+        assert tuple(node[:4]) == spatial_index._envelope(children)
+        return sum(check(child) for child in children)
+
+    assert check(spatial_index.pack(boxes, 4)) == 500
+
+
+def test_search_touching_edges_and_empty_tree():
+    root = spatial_index.pack({(1, 1): (0, 0, 1, 1)}, 4)
+
+    assert spatial_index.search(root, (1, 1, 2, 2)) == [(1, 1)]
+    assert spatial_index.search(root, (1.0001, 0, 2, 1)) == []
+    assert spatial_index.pack({}) is None
+    assert spatial_index.search(None, (0, 0, 1, 1)) == []
+
+
+def test_upsert_and_remove_before_and_after_repack():
+    index = spatial_index.SpatialIndex(node_size=4)
+    boxes = random_boxes(300)
+    for (map_id, datalayer_id), box in boxes.items():
+        index.upsert(map_id, datalayer_id, list(box))
+    assert index.rebuilds >= 1
+
+    # Verschieben, Ausdehnung verlieren, Löschen - teils im Baum, teils im Delta
+    moved = {key: (box[0] + 500, box[1], box[2] + 500, box[3]) for key, box in list(boxes.items())[::7]}
+    for (map_id, datalayer_id), box in moved.items():
+        index.upsert(map_id, datalayer_id, list(box))
+    emptied = list(boxes)[1::11]
+    for map_id, datalayer_id in emptied:
+        index.upsert(map_id, datalayer_id, [None, None, None, None])
+    removed = {key[1] for key in list(boxes)[2::13]}
+    index.remove_datalayers(removed)
+
+    expected = {**boxes, **moved}
+    for key in emptied:
+        expected.pop(key, None)
+    expected = {key: box for key, box in expected.items() if key[1] not in removed}
+    for query in QUERIES + [(320, -90, 690, 90)]:
+        assert sorted(key for key, _ in index.query(query)) == brute_force(expected, query)
+
+
+class FakeCache:
+    """Stellt DatalayerCache-Zeilen für SpatialIndex.sync bereit (ohne Datenbank)."""
+
+    def __init__(self):
+        self.rows = {}
+        self.now = datetime(2026, 1, 1)
+
+    def put(self, map_id, datalayer_id, bbox):
+        self.now += timedelta(seconds=1)
+        self.rows[(map_id, datalayer_id)] = (map_id, datalayer_id, *(bbox or (None,) * 4), self.now)
+
+    def load(self, index, full):
+        rows = list(self.rows.values())
+        if not full and index._watermark is not None:
+            return [row for row in rows if row[6] >= index._watermark], len(rows)
+        return rows, None
+
+    def keys(self):
+        return set(self.rows)
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    cache = FakeCache()
+
+    async def run_orm(func, *args):
+        return func(*args)
+
+    monkeypatch.setattr(spatial_index, 'run_orm', run_orm)
+    monkeypatch.setattr(spatial_index.SpatialIndex, '_load_sync', lambda self, full: cache.load(self, full))
+    monkeypatch.setattr(spatial_index.SpatialIndex, '_load_keys_sync', staticmethod(cache.keys))
+    return cache
+
+
+def test_incremental_sync_applies_changes_and_deletions(fake_cache):
+    index = spatial_index.SpatialIndex(node_size=4)
+    fake_cache.put(1, 10, (0, 0, 1, 1))
+    fake_cache.put(1, 11, (5, 5, 6, 6))
+    fake_cache.put(2, 20, None)
+    asyncio.run(index.sync())
+    assert sorted(key for key, _ in index.query((-10, -10, 10, 10))) == [(1, 10), (1, 11)]
+
+    # Anderer Prozess: Ausdehnung entfernt, Eintrag gelöscht, neuer Eintrag
+    fake_cache.put(1, 10, None)
+    del fake_cache.rows[(1, 11)]
+    fake_cache.put(2, 21, (2, 2, 3, 3))
+    asyncio.run(index.sync())
+
+    assert [key for key, _ in index.query((-10, -10, 10, 10))] == [(2, 21)]
+    assert index._known == {(1, 10), (2, 20), (2, 21)}
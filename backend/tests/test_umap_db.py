@@ -0,0 +1,82 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import umap_db
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('sort, value', [
+    ('modified_desc', datetime(2026, 10, 16, 12, 30, 15, 123456, tzinfo=timezone.utc)),
+    ('created_asc', datetime(2024, 1, 1)),
+    ('name_asc', 'Karte "Nord" / Ä,ö'),
+    ('name_desc', ''),
+])
+def test_cursor_round_trip(sort, value):
+    cursor = umap_db.encode_cursor(sort, value, 42)
+
+    assert '=' not in cursor
+    assert umap_db.decode_cursor(cursor, sort) == (value, 42)
+
+
+def test_cursor_with_other_sort_is_rejected():
+    cursor = umap_db.encode_cursor('modified_desc', datetime(2026, 1, 1), 1)
+
+    with pytest.raises(ValueError):
+        umap_db.decode_cursor(cursor, 'modified_asc')
+
+
+@pytest.mark.parametrize('cursor', [
+    'kein base64 ä',
+    raw_cursor('kein Array')[:-2],
+    raw_cursor(['modified_desc', '2026-01-01T00:00:00']),
+    raw_cursor(['modified_desc', 'kein Datum', 1]),
+    raw_cursor(['modified_desc', 12345, 1]),
+    raw_cursor(['modified_desc', '2026-01-01T00:00:00', '1']),
+    raw_cursor({'sort': 'modified_desc'}),
+    base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        umap_db.decode_cursor(cursor, 'modified_desc')
+
+
+def test_instance_cursor_round_trip():
+    nord = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    cursor = umap_db.encode_instance_cursor({
+        'default': umap_db.encode_cursor('modified_desc', datetime(2026, 5, 1, tzinfo=timezone.utc), 7),
+        'nord': umap_db.encode_cursor('modified_desc', nord, 3),
+        'sued': None,
+    })
+
+    assert umap_db.decode_instance_cursor(cursor, 'modified_desc') == {
+        'default': (datetime(2026, 5, 1, tzinfo=timezone.utc), 7),
+        'nord': (nord, 3),
+        'sued': None,
+    }
+
+
+def test_single_instance_cursor_applies_to_default_instance():
+    cursor = umap_db.encode_cursor('name_asc', 'Alpha', 5)
+
+    assert umap_db.decode_instance_cursor(cursor, 'name_asc') == {umap_db.DEFAULT_INSTANCE: ('Alpha', 5)}
+
+
+@pytest.mark.parametrize('cursor', [
+    '%%%',
+    raw_cursor('text'),
+    raw_cursor({'nord': 5}),
+    raw_cursor({'nord': raw_cursor(['name_asc', 'A', 1])}),
+])
+def test_invalid_instance_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        umap_db.decode_instance_cursor(cursor, 'modified_desc')
+
+
+def test_escape_like():
+    assert umap_db.escape_like('50%_a\\b') == '50\\%\\_a\\\\b'
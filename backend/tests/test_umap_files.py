@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+import umap_files
+
+# Kleine Blockgrößen legen Blockgrenzen in Strings, Escapes, Zahlen und zwischen Tokens
+CHUNK_SIZES = [1, 2, 3, 5, 7, 64 * 1024]
+
+
+@pytest.fixture
+def media_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(umap_files, 'UMAP_MEDIA_ROOT', str(tmp_path))
+    return tmp_path
+
+
+def write(root, text: str, name: str = 'layer.geojson', encoding: str = 'utf-8') -> str:
+    (root / name).write_text(text, encoding=encoding)
+    return name
+
+
+def point(x, y, **properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [x, y]}, 'properties': properties}
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_iter_features_across_chunk_boundaries(media_root, chunk_size):
+    features = [
+        point(1.5, -2.25, name='Zitat "innen", Komma, {Klammer} [eckig]'),
+        point(10, 20, name='Backslash \\ und \\"', tab='a\tb'),
+        point(-0.000001, 1e-7, name='Umlaute äöü ß und Emoji 🗺️', escaped='ä'),
+        point(123456789.125, 987654321, nested={'list': [1, [2, [3]]], 'empty': {}}),
+    ]
+    text = json.dumps({'type': 'FeatureCollection', 'features': features, '_umap_options': {'name': 'x'}},
+                      ensure_ascii=False)
+    path = write(media_root, text)
+
+    assert list(umap_files.iter_features(path, chunk_size=chunk_size)) == features
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_iter_features_with_ascii_escapes_and_whitespace(media_root, chunk_size):
+    features = [point(1, 2, name='äöü "x"'), point(3, 4)]
+    text = '\n\t{ "_umap_options" : { "features": [] } ,\r\n "features" :\n [ ' + \
+        ' ,\n '.join(json.dumps(f, ensure_ascii=True, indent=2) for f in features) + ' \n] \n}\n'
+    path = write(media_root, text)
+
+    # Schlüssel "features" in einem anderen Objekt wird nicht als Feature-Liste gelesen
+    assert list(umap_files.iter_features(path, chunk_size=chunk_size)) == features
+
+
+def test_iter_features_accepts_byte_order_mark(media_root):
+    path = write(media_root, json.dumps({'type': 'FeatureCollection', 'features': [point(1, 2)]}),
+                 encoding='utf-8-sig')
+
+    assert list(umap_files.iter_features(path, chunk_size=3)) == [point(1, 2)]
+
+
+def test_iter_features_without_features_key(media_root):
+    path = write(media_root, '{"type": "FeatureCollection"}')
+
+    assert list(umap_files.iter_features(path, chunk_size=2)) == []
+
+
+@pytest.mark.parametrize('text', [
+    '{"type": "FeatureCollection", "features": [{"type": "Feature"',
+    '{"type": "FeatureCollection", "features": [{"type": "Feature"}',
+    '{"type": "FeatureCollection", "features": [{"type": "Feature", "name": "abgeschnitt',
+    '{"type": "FeatureCollection", "features": [1.',
+    '',
+    '[]',
+])
+@pytest.mark.parametrize('chunk_size', [1, 4, 64 * 1024])
+def test_iter_features_rejects_truncated_or_invalid_files(media_root, text, chunk_size):
+    path = write(media_root, text)
+
+    with pytest.raises(ValueError):
+        list(umap_files.iter_features(path, chunk_size=chunk_size))
+
+
+def test_iter_features_rejects_paths_outside_media_root(media_root):
+    with pytest.raises(FileNotFoundError):
+        list(umap_files.iter_features('../outside.geojson'))
+
+
+def test_analyze_skips_non_object_features_and_invalid_positions(media_root):
+    features = [
+        point(1, 2),
+        'kein Objekt',
+        None,
+        [1, 2],
+        {'type': 'Feature', 'geometry': None, 'properties': None},
+        {'type': 'Feature', 'geometry': 'Point'},
+        {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': [[3, 4], ['x', 5], [True, 1], [6]]}},
+        {'type': 'Feature', 'geometry': {'type': 'GeometryCollection', 'geometries': [
+            {'type': 'Point', 'coordinates': [-5, 10]}, 'kaputt', {'type': 'Polygon', 'coordinates': 'x'}
+        ]}},
+    ]
+    path = write(media_root, json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    assert umap_files.analyze_datalayer_sync(path) == {
+        'feature_count': 5,
+        'geometry_types': ['LineString', 'Point', 'Polygon'],
+        'bbox': [-5, 2, 3, 10]
+    }
+
+
+def test_analyze_returns_none_for_missing_or_truncated_file(media_root):
+    assert umap_files.analyze_datalayer_sync('fehlt.geojson') is None
+    path = write(media_root, '{"features": [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [1, 2')
+    assert umap_files.analyze_datalayer_sync(path) is None
+
+
+def test_iter_feature_collection_filters_by_bbox_and_properties(media_root):
+    first = write(media_root, json.dumps({'features': [point(0, 0, name='a', secret=1), point(50, 50, name='b')]}),
+                  name='a.geojson')
+    second = write(media_root, json.dumps({'features': [point(1, 1, name='c'), 'kein Objekt',
+                                                        {'type': 'Feature', 'geometry': None}]}),
+                   name='b.geojson')
+
+    chunks = list(umap_files.iter_feature_collection(
+        [{'id': 1, 'geojson': first}, {'id': 2, 'geojson': second}],
+        bbox=[-1, -1, 2, 2], properties=['name'], chunk_size=10
+    ))
+    collection = json.loads(b''.join(chunks))
+
+    assert len(chunks) > 1
+    assert collection['type'] == 'FeatureCollection'
+    assert [(f['datalayer'], f['properties']) for f in collection['features']] == [
+        (1, {'name': 'a'}), (2, {'name': 'c'})
+    ]
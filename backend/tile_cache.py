@@ -0,0 +1,151 @@
+"""
+Größenbegrenzter LRU-Cache für Vektorkacheln auf der Festplatte.
+
+Ablage unter TILE_CACHE_DIR/<layer>/<version>/<z>/<x>/<y>.mvt. Die Version stammt vom
+letzten Export der Tabelle, dadurch sind Kacheln eines früheren Exports nach einem
+Re-Export in allen Worker-Prozessen sofort ungültig; der exportierende Prozess löscht
+sie zusätzlich direkt.
+
+Die Größengrenze gilt für das Verzeichnis, nicht pro Prozess: Hat ein Prozess seit der
+letzten Prüfung TILE_CACHE_SCAN_FRACTION der Grenze geschrieben, durchsucht er unter einer
+Dateisperre das gesamte Verzeichnis und löscht die am längsten unbenutzten Kacheln
+(Treffer aktualisieren die Änderungszeit). Bei N Workern wird die Grenze damit höchstens
+um N * TILE_CACHE_SCAN_FRACTION überschritten.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+try:
+    import fcntl
+except ImportError:  # Windows: ohne prozessübergreifende Sperre
+    fcntl = None
+
+TILE_CACHE_DIR = os.getenv('TILE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'gis-tile-cache'))
+TILE_CACHE_MAX_MB = float(os.getenv('TILE_CACHE_MAX_MB', '512'))
+# Anteil der Grenze, den ein Prozess schreiben darf, bevor er das Verzeichnis prüft
+TILE_CACHE_SCAN_FRACTION = float(os.getenv('TILE_CACHE_SCAN_FRACTION', '0.05'))
+# Mindestgröße pro Datei (Dateisystem-Overhead), damit leere Kacheln mitgezählt werden
+_MIN_ENTRY_SIZE = 512
+_LOCK_FILE = '.evict.lock'
+
+
+class TileCache:
+
+    def __init__(self, root: str = TILE_CACHE_DIR, max_bytes: int = int(TILE_CACHE_MAX_MB * 1024 * 1024),
+                 scan_fraction: float = TILE_CACHE_SCAN_FRACTION):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.scan_bytes = max(int(max_bytes * scan_fraction), 1)
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        # Seit der letzten Prüfung von diesem Prozess geschrieben
+        self._written = 0
+        self._scanned = False
+        # Stand der letzten Prüfung (alle Prozesse)
+        self._entries = 0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, layer: str, version: str, z: int, x: int, y: int) -> Path:
+        return self.root / layer / version / str(z) / str(x) / f"{y}.mvt"
+
+    def get(self, layer: str, version: str, z: int, x: int, y: int) -> Optional[bytes]:
+        path = self.path(layer, version, z, x, y)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, layer: str, version: str, z: int, x: int, y: int, data: bytes):
+        path = self.path(layer, version, z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Atomar schreiben, damit parallele Leser nie eine halbe Kachel sehen
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._written += max(len(data), _MIN_ENTRY_SIZE)
+            # Erste Kachel des Prozesses: Bestand früherer Läufe erfassen
+            due = not self._scanned or self._written >= self.scan_bytes
+            if due:
+                self._written, self._scanned = 0, True
+        if due:
+            self.enforce_limit()
+
+    def enforce_limit(self):
+        """Durchsucht das Verzeichnis und löscht die ältesten Kacheln, bis die Grenze eingehalten ist."""
+        with self._scan_lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / _LOCK_FILE, 'a') as lock_file:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # Ein anderer Prozess prüft gerade - dessen Lauf erfasst auch unsere Kacheln
+                        return
+                try:
+                    self._evict()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _evict(self):
+        entries = []
+        for path in self.root.rglob('*.mvt'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, max(stat.st_size, _MIN_ENTRY_SIZE), path))
+        size = sum(entry[1] for entry in entries)
+        evicted = 0
+        if size > self.max_bytes:
+            entries.sort(key=lambda entry: entry[0])
+            # Die neueste Kachel bleibt immer erhalten
+            for _, entry_size, path in entries[:-1]:
+                if size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+                evicted += 1
+        with self._lock:
+            self._entries = len(entries) - evicted
+            self._size = size
+            self.evictions += evicted
+
+    def invalidate_layer(self, layer: str):
+        """Entfernt alle Kacheln einer Tabelle (alle Versionen), z.B. nach einem Re-Export."""
+        shutil.rmtree(self.root / layer, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'dir': str(self.root),
+                # Stand der letzten Verzeichnisprüfung über alle Worker-Prozesse
+                'entries': self._entries,
+                'size_mb': round(self._size / 1024 / 1024, 2),
+                'max_mb': round(self.max_bytes / 1024 / 1024, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+cache = TileCache()
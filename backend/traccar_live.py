@@ -0,0 +1,200 @@
+"""
+Live-Positionen aus Traccar für beliebig viele Browser-Clients.
+
+Pro Worker-Prozess besteht höchstens eine WebSocket-Verbindung zu Traccar (/api/socket,
+Anmeldung über das gespeicherte traccar_token). Sie wird beim ersten Abonnenten aufgebaut
+und nach TRACCAR_LIVE_IDLE_TIMEOUT ohne Abonnenten wieder geschlossen.
+
+Jeder Client hat einen eigenen Puffer mit der jeweils neuesten Position pro Gerät: ein
+langsamer Client erhält zusammengefasste Updates statt eines wachsenden Rückstaus und
+bremst weder den Upstream noch andere Clients. Bleibt ein Senden länger als
+TRACCAR_LIVE_SEND_TIMEOUT hängen, wird der Client getrennt.
+"""
+import asyncio
+import json
+import os
+import random
+from typing import Optional, Dict, Any, List, Set
+
+import httpx
+
+TRACCAR_LIVE_IDLE_TIMEOUT = float(os.getenv('TRACCAR_LIVE_IDLE_TIMEOUT', '30'))
+TRACCAR_LIVE_SEND_TIMEOUT = float(os.getenv('TRACCAR_LIVE_SEND_TIMEOUT', '10'))
+TRACCAR_LIVE_MAX_BACKOFF = float(os.getenv('TRACCAR_LIVE_MAX_BACKOFF', '60'))
+# Höchstzahl gepufferter Geräte pro Client (bei ungefiltertem Abo sehr vieler Geräte)
+TRACCAR_LIVE_MAX_PENDING = int(os.getenv('TRACCAR_LIVE_MAX_PENDING', '5000'))
+
+
+class Subscriber:
+    __slots__ = ('username', 'device_ids', 'bbox', 'pending', 'wakeup', 'sent', 'coalesced', 'dropped')
+
+    def __init__(self, username: str, device_ids: Optional[Set[int]] = None, bbox: Optional[List[float]] = None):
+        self.username = username
+        self.device_ids = device_ids
+        self.bbox = bbox
+        self.pending: Dict[int, Dict[str, Any]] = {}
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def set_filter(self, device_ids: Optional[Set[int]], bbox: Optional[List[float]]):
+        self.device_ids = device_ids
+        self.bbox = bbox
+        self.pending = {k: v for k, v in self.pending.items() if self.matches(v)}
+
+    def matches(self, position: Dict[str, Any]) -> bool:
+        if self.device_ids is not None and position.get('deviceId') not in self.device_ids:
+            return False
+        if self.bbox is not None:
+            x, y = position.get('longitude'), position.get('latitude')
+            if x is None or y is None:
+                return False
+            if not (self.bbox[0] <= x <= self.bbox[2] and self.bbox[1] <= y <= self.bbox[3]):
+                return False
+        return True
+
+    def push(self, position: Dict[str, Any]):
+        device_id = position.get('deviceId')
+        if device_id in self.pending:
+            self.coalesced += 1
+        elif len(self.pending) >= TRACCAR_LIVE_MAX_PENDING:
+            self.dropped += 1
+            return
+        self.pending[device_id] = position
+        self.wakeup.set()
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        """Wartet auf neue Positionen und liefert alle seit dem letzten Aufruf (neueste pro Gerät)."""
+        await self.wakeup.wait()
+        self.wakeup.clear()
+        batch, self.pending = list(self.pending.values()), {}
+        self.sent += len(batch)
+        return batch
+
+
+def parse_filter(devices: Optional[Any], bbox: Optional[Any]):
+    """Filter aus Query-Parametern ("1,2,3" / "minx,miny,maxx,maxy") oder JSON-Listen; wirft ValueError."""
+    device_ids = None
+    if devices not in (None, '', []):
+        items = devices.split(',') if isinstance(devices, str) else devices
+        device_ids = {int(item) for item in items}
+    box = None
+    if bbox not in (None, '', []):
+        items = bbox.split(',') if isinstance(bbox, str) else bbox
+        box = [float(item) for item in items]
+        if len(box) != 4 or box[0] > box[2] or box[1] > box[3]:
+            raise ValueError("bbox muss minx,miny,maxx,maxy sein")
+    return device_ids, box
+
+
+class LiveHub:
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.last_positions: Dict[int, Dict[str, Any]] = {}
+        self.connected = False
+        self.upstream_messages = 0
+        self.upstream_reconnects = 0
+        self.last_error: Optional[str] = None
+        self._get_config = None
+        self._task: Optional[asyncio.Task] = None
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+
+    def configure(self, get_config):
+        """get_config: async Callable, liefert {'url', 'token'} der Traccar-Settings."""
+        self._get_config = get_config
+
+    def subscribe(self, subscriber: Subscriber):
+        self.subscribers.add(subscriber)
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_upstream())
+        # Neue Clients erhalten sofort den letzten bekannten Stand
+        for position in self.last_positions.values():
+            if subscriber.matches(position):
+                subscriber.push(position)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self._task is not None and self._idle_handle is None:
+            self._idle_handle = asyncio.get_running_loop().call_later(TRACCAR_LIVE_IDLE_TIMEOUT, self._stop_if_idle)
+
+    def _stop_if_idle(self):
+        self._idle_handle = None
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, positions: List[Dict[str, Any]]):
+        for position in positions:
+            device_id = position.get('deviceId')
+            if device_id is None:
+                continue
+            self.last_positions[device_id] = position
+            for subscriber in self.subscribers:
+                if subscriber.matches(position):
+                    subscriber.push(position)
+
+    async def _open_session(self, config: Dict[str, Any]) -> str:
+        """Traccar-Session per Token; liefert den Cookie-Header für /api/socket."""
+        async with httpx.AsyncClient(base_url=config['url'].rstrip('/'), timeout=10) as http:
+            response = await http.get('/api/session', params={'token': config['token']})
+            response.raise_for_status()
+            return '; '.join(f"{name}={value}" for name, value in http.cookies.items())
+
+    async def _run_upstream(self):
+        from websockets.asyncio.client import connect
+
+        failures = 0
+        while True:
+            try:
+                config = await self._get_config()
+                cookie = await self._open_session(config)
+                url = config['url'].rstrip('/').replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+                async with connect(f"{url}/api/socket", additional_headers={'Cookie': cookie},
+                                   ping_interval=30, max_size=2 ** 22) as socket:
+                    self.connected = True
+                    self.last_error = None
+                    failures = 0
+                    async for message in socket:
+                        self.upstream_messages += 1
+                        data = json.loads(message)
+                        if data.get('positions'):
+                            self.publish(data['positions'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = getattr(e, 'detail', None) or str(e) or type(e).__name__
+                failures += 1
+            finally:
+                self.connected = False
+            self.upstream_reconnects += 1
+            await asyncio.sleep(min(TRACCAR_LIVE_MAX_BACKOFF, 2 ** failures) * random.uniform(0.8, 1.2))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'upstream_connected': self.connected,
+            'upstream_messages': self.upstream_messages,
+            'upstream_reconnects': self.upstream_reconnects,
+            'last_error': self.last_error,
+            'subscribers': len(self.subscribers),
+            'known_devices': len(self.last_positions),
+            'pending_positions': sum(len(s.pending) for s in self.subscribers),
+            'coalesced': sum(s.coalesced for s in self.subscribers),
+            'dropped': sum(s.dropped for s in self.subscribers)
+        }
+
+    async def close(self):
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+hub = LiveHub()
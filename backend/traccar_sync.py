@@ -0,0 +1,386 @@
+"""
+Inkrementelle Synchronisation der Traccar-Positionen in die PostGIS-Datenbank.
+
+Pro Gerät werden der zuletzt übernommene Stand (fixTime, Positions-ID) und der Zeitpunkt,
+bis zu dem bereits abgefragt wurde (synced_until), in der Tabelle traccar_sync_state
+gespeichert. Abgefragt wird der Zeitraum ab synced_until - TRACCAR_SYNC_OVERLAP bis
+jetzt - TRACCAR_SYNC_LAG, in Fenstern von TRACCAR_SYNC_WINDOW_HOURS: Positionen, die erst
+nach Abfrage ihres fixTime-Fensters bei Traccar eintreffen (Netzverzögerung, offline
+puffernde Tracker), werden so im nächsten Lauf noch erfasst; bereits vorhandene verwirft
+ON CONFLICT (id) DO NOTHING. synced_until rückt auch bei leeren Fenstern vor, sodass ein
+inaktives Gerät pro Lauf nur wenige Abfragen kostet. Jedes Fenster wird per COPY in eine
+Staging-Tabelle geladen und zusammen mit dem neuen Stand in einer Transaktion übernommen,
+sodass ein Abbruch weder Lücken noch Duplikate erzeugt. Ein Advisory-Lock verhindert, dass mehrere
+Worker-Prozesse gleichzeitig synchronisieren.
+
+Ziel ist die Geoserver-Datenbank (Schema TRACCAR_SYNC_SCHEMA bzw. der Geoserver-Workspace).
+Der periodische Lauf ist standardmäßig aus und wird mit TRACCAR_SYNC_ENABLED=true aktiviert.
+Die Traccar-URL kommt aus den Settings, daher lässt sich die Synchronisation gegen einen
+lokalen Traccar-Ersatz (scripts/traccar_standin.py) testen.
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+import httpx
+import psycopg
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+import metrics
+
+TRACCAR_SYNC_ENABLED = os.getenv('TRACCAR_SYNC_ENABLED', 'false').lower() == 'true'
+TRACCAR_SYNC_INTERVAL = float(os.getenv('TRACCAR_SYNC_INTERVAL', '60'))
+TRACCAR_SYNC_MAX_BACKOFF = float(os.getenv('TRACCAR_SYNC_MAX_BACKOFF', '900'))
+# Startzeitpunkt für Geräte ohne bisherigen Stand
+TRACCAR_SYNC_INITIAL_DAYS = float(os.getenv('TRACCAR_SYNC_INITIAL_DAYS', '7'))
+TRACCAR_SYNC_WINDOW_HOURS = float(os.getenv('TRACCAR_SYNC_WINDOW_HOURS', '24'))
+# Abstand zu "jetzt", bis zu dem abgefragt wird (Sekunden), damit gerade eintreffende Positionen nicht fehlen
+TRACCAR_SYNC_LAG = float(os.getenv('TRACCAR_SYNC_LAG', '120'))
+# Um so viel (Minuten) wird vor synced_until erneut abgefragt, für verspätet übertragene Positionen
+TRACCAR_SYNC_OVERLAP_MINUTES = float(os.getenv('TRACCAR_SYNC_OVERLAP_MINUTES', '60'))
+TRACCAR_SYNC_SCHEMA = os.getenv('TRACCAR_SYNC_SCHEMA')
+TRACCAR_HTTP_TIMEOUT = float(os.getenv('TRACCAR_HTTP_TIMEOUT', '30'))
+
+POSITIONS_TABLE = 'traccar_positions'
+STATE_TABLE = 'traccar_sync_state'
+# Beliebige, aber feste Kennung für pg_try_advisory_lock
+_ADVISORY_LOCK_ID = 7_402_113
+
+_POSITION_COLUMNS = ['id', 'device_id', 'fix_time', 'device_time', 'server_time', 'valid',
+                     'latitude', 'longitude', 'altitude', 'speed', 'course', 'accuracy',
+                     'address', 'attributes', 'geom']
+
+_scheduler_task: Optional[asyncio.Task] = None
+# Ziele (Host, Port, Datenbank, Schema), deren Tabellen in diesem Prozess bereits angelegt/migriert sind
+_prepared: Set[Tuple[Any, ...]] = set()
+_run_lock = asyncio.Lock()
+
+status: Dict[str, Any] = {
+    'enabled': TRACCAR_SYNC_ENABLED,
+    'running': False,
+    'last_run': None,
+    'last_success': None,
+    'last_error': None,
+    'last_result': None,
+    'consecutive_failures': 0,
+    'next_run_in_s': None,
+    'positions_total': 0,
+}
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _format_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _schema(db_config: Dict[str, Any]) -> str:
+    return TRACCAR_SYNC_SCHEMA or db_config['workspace']
+
+
+async def ensure_tables(conn: psycopg.AsyncConnection, schema: str):
+    """Legt Positions- und Statustabelle an bzw. migriert die Statustabelle früherer Versionen."""
+    positions = sql.Identifier(schema, POSITIONS_TABLE)
+    await conn.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {} (
+            id bigint PRIMARY KEY,
+            device_id integer NOT NULL,
+            fix_time timestamptz NOT NULL,
+            device_time timestamptz,
+            server_time timestamptz,
+            valid boolean,
+            latitude double precision,
+            longitude double precision,
+            altitude double precision,
+            speed double precision,
+            course double precision,
+            accuracy double precision,
+            address text,
+            attributes jsonb,
+            geom geometry(Point, 4326)
+        )
+    """).format(positions))
+    await conn.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (device_id, fix_time)").format(
+        sql.Identifier(f"{POSITIONS_TABLE}_device_fix_idx"), positions))
+    await conn.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING GIST (geom)").format(
+        sql.Identifier(f"{POSITIONS_TABLE}_geom_idx"), positions))
+    state = sql.Identifier(schema, STATE_TABLE)
+    await conn.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {} (
+            device_id integer PRIMARY KEY,
+            last_fix_time timestamptz,
+            last_position_id bigint,
+            synced_until timestamptz,
+            synced_at timestamptz NOT NULL DEFAULT now()
+        )
+    """).format(state))
+    # Bestehende Tabellen früherer Versionen: Geräte ohne Position haben nur synced_until.
+    # ALTER TABLE sperrt die Tabelle exklusiv, daher nur ausführen, wenn der Katalog es verlangt.
+    cur = await conn.execute("""
+        SELECT count(*) FILTER (WHERE column_name = 'synced_until'),
+               count(*) FILTER (WHERE column_name IN ('last_fix_time', 'last_position_id') AND is_nullable = 'NO')
+        FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+    """, [schema, STATE_TABLE])
+    has_synced_until, not_null = await cur.fetchone()
+    if not has_synced_until or not_null:
+        await conn.execute(sql.SQL("""
+            ALTER TABLE {}
+                ADD COLUMN IF NOT EXISTS synced_until timestamptz,
+                ALTER COLUMN last_fix_time DROP NOT NULL,
+                ALTER COLUMN last_position_id DROP NOT NULL
+        """).format(state))
+
+
+async def create_stage_table(conn: psycopg.AsyncConnection, schema: str):
+    """Staging-Tabelle pro Verbindung; Inhalt wird bei jedem Commit verworfen."""
+    await conn.execute(sql.SQL(
+        "CREATE TEMP TABLE IF NOT EXISTS traccar_positions_stage (LIKE {}) ON COMMIT DELETE ROWS"
+    ).format(sql.Identifier(schema, POSITIONS_TABLE)))
+
+
+async def load_state(conn: psycopg.AsyncConnection, schema: str
+                     ) -> Dict[int, Tuple[Optional[Tuple[datetime, int]], Optional[datetime]]]:
+    """Gerät -> ((letzter fixTime, Positions-ID) oder None, synced_until oder None)."""
+    cur = await conn.execute(sql.SQL(
+        "SELECT device_id, last_fix_time, last_position_id, synced_until FROM {}"
+    ).format(sql.Identifier(schema, STATE_TABLE)))
+    return {
+        row[0]: ((row[1], row[2]) if row[1] is not None else None, row[3])
+        for row in await cur.fetchall()
+    }
+
+
+def _position_row(position: Dict[str, Any]) -> List[Any]:
+    latitude, longitude = position.get('latitude'), position.get('longitude')
+    geom = f"SRID=4326;POINT({float(longitude)!r} {float(latitude)!r})" if latitude is not None and longitude is not None else None
+    return [
+        position['id'],
+        position['deviceId'],
+        _parse_time(position.get('fixTime')),
+        _parse_time(position.get('deviceTime')),
+        _parse_time(position.get('serverTime')),
+        position.get('valid'),
+        latitude,
+        longitude,
+        position.get('altitude'),
+        position.get('speed'),  # Knoten (Traccar-Einheit)
+        position.get('course'),
+        position.get('accuracy'),
+        position.get('address'),
+        Jsonb(position.get('attributes') or {}),
+        geom
+    ]
+
+
+async def store_positions(conn: psycopg.AsyncConnection, schema: str, device_id: int,
+                          positions: List[Dict[str, Any]], last: Tuple[datetime, int],
+                          synced_until: datetime) -> int:
+    """
+    Übernimmt die Positionen eines Fensters und den neuen Gerätestand (letzte Position last,
+    abgefragt bis synced_until) in einer Transaktion. Gibt die Anzahl neu eingefügter Positionen zurück.
+    """
+    async with conn.transaction():
+        async with conn.cursor() as cur:
+            async with cur.copy(sql.SQL("COPY traccar_positions_stage ({}) FROM STDIN").format(
+                sql.SQL(', ').join(map(sql.Identifier, _POSITION_COLUMNS)))) as copy:
+                for position in positions:
+                    await copy.write_row(_position_row(position))
+            # Überlappende Fenster (ab synced_until - Overlap) dürfen keine Duplikate erzeugen
+            await cur.execute(sql.SQL(
+                "INSERT INTO {} SELECT * FROM traccar_positions_stage ON CONFLICT (id) DO NOTHING"
+            ).format(sql.Identifier(schema, POSITIONS_TABLE)))
+            inserted = cur.rowcount
+            await cur.execute(sql.SQL("""
+                INSERT INTO {} (device_id, last_fix_time, last_position_id, synced_until, synced_at)
+                VALUES (%s, %s, %s, %s, now())
+                ON CONFLICT (device_id) DO UPDATE SET
+                    last_fix_time = EXCLUDED.last_fix_time,
+                    last_position_id = EXCLUDED.last_position_id,
+                    synced_until = EXCLUDED.synced_until,
+                    synced_at = EXCLUDED.synced_at
+            """).format(sql.Identifier(schema, STATE_TABLE)),
+                [device_id, last[0], last[1], synced_until])
+    return inserted
+
+
+async def store_watermark(conn: psycopg.AsyncConnection, schema: str, device_id: int, synced_until: datetime):
+    """Rückt synced_until vor, wenn die letzten Fenster eines Geräts leer waren."""
+    await conn.execute(sql.SQL("""
+        INSERT INTO {} (device_id, synced_until, synced_at)
+        VALUES (%s, %s, now())
+        ON CONFLICT (device_id) DO UPDATE SET
+            synced_until = EXCLUDED.synced_until,
+            synced_at = EXCLUDED.synced_at
+    """).format(sql.Identifier(schema, STATE_TABLE)), [device_id, synced_until])
+
+
+async def fetch_devices(http: httpx.AsyncClient) -> List[Dict[str, Any]]:
+    response = await http.get('/api/devices')
+    response.raise_for_status()
+    return response.json()
+
+
+async def fetch_positions(http: httpx.AsyncClient, device_id: int, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    response = await http.get('/api/positions', params={
+        'deviceId': device_id, 'from': _format_time(start), 'to': _format_time(end)
+    })
+    response.raise_for_status()
+    return response.json()
+
+
+def create_http_client(traccar_config: Dict[str, Any]) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=traccar_config['url'].rstrip('/'),
+        headers={'Authorization': f"Bearer {traccar_config['token']}", 'Accept': 'application/json'},
+        timeout=TRACCAR_HTTP_TIMEOUT
+    )
+
+
+async def sync_once(traccar_config: Dict[str, Any], db_config: Dict[str, Any],
+                    http: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """
+    Ein Synchronisationslauf über alle Geräte. traccar_config: url, token;
+    db_config: db_host, db_port, db_name, db_user, db_password, workspace.
+    """
+    started = time.perf_counter()
+    schema = _schema(db_config)
+    now = datetime.now(timezone.utc)
+    until = now - timedelta(seconds=TRACCAR_SYNC_LAG)
+    window = timedelta(hours=TRACCAR_SYNC_WINDOW_HOURS)
+    overlap = timedelta(minutes=TRACCAR_SYNC_OVERLAP_MINUTES)
+    target = (db_config['db_host'], db_config['db_port'], db_config['db_name'], schema)
+    result = {'devices': 0, 'fetched': 0, 'inserted': 0, 'skipped': False}
+
+    own_http = http is None
+    if own_http:
+        http = create_http_client(traccar_config)
+    try:
+        conn = await psycopg.AsyncConnection.connect(
+            host=db_config['db_host'],
+            port=db_config['db_port'],
+            dbname=db_config['db_name'],
+            user=db_config['db_user'],
+            password=db_config['db_password'],
+            autocommit=True,
+            connect_timeout=5,
+            cursor_factory=metrics.timed_cursor('geoserver_db')
+        )
+        async with conn:
+            cur = await conn.execute("SELECT pg_try_advisory_lock(%s)", [_ADVISORY_LOCK_ID])
+            if not (await cur.fetchone())[0]:
+                # Ein anderer Worker-Prozess synchronisiert gerade
+                result['skipped'] = True
+                return result
+            try:
+                if target not in _prepared:
+                    await ensure_tables(conn, schema)
+                    _prepared.add(target)
+                await create_stage_table(conn, schema)
+                state = await load_state(conn, schema)
+                devices = await fetch_devices(http)
+                result['devices'] = len(devices)
+                for device in devices:
+                    device_id = device['id']
+                    device_state, synced_until = state.get(device_id, (None, None))
+                    known_until = synced_until or (device_state[0] if device_state else None)
+                    start = known_until - overlap if known_until else now - timedelta(days=TRACCAR_SYNC_INITIAL_DAYS)
+                    stored_until = known_until or start
+                    watermark = stored_until
+                    while start < until:
+                        end = min(start + window, until)
+                        # Das erste Fenster kann vor synced_until enden (Overlap > Fenster) - nie zurücksetzen
+                        watermark = max(watermark, end)
+                        positions = await fetch_positions(http, device_id, start, end)
+                        result['fetched'] += len(positions)
+                        if positions:
+                            last = max((_parse_time(p['fixTime']), p['id']) for p in positions)
+                            if device_state is not None:
+                                last = max(last, device_state)
+                            result['inserted'] += await store_positions(conn, schema, device_id, positions, last, watermark)
+                            device_state = last
+                            stored_until = watermark
+                        start = end
+                    if watermark > stored_until:
+                        await store_watermark(conn, schema, device_id, watermark)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(%s)", [_ADVISORY_LOCK_ID])
+    finally:
+        if own_http:
+            await http.aclose()
+
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def run_now(get_traccar_config, get_db_config) -> Dict[str, Any]:
+    """Führt einen Lauf aus (geplant oder manuell) und aktualisiert den Status."""
+    async with _run_lock:
+        status['running'] = True
+        status['last_run'] = datetime.now(timezone.utc).isoformat()
+        try:
+            result = await sync_once(await get_traccar_config(), await get_db_config())
+        except Exception as e:
+            status['consecutive_failures'] += 1
+            status['last_error'] = getattr(e, 'detail', None) or str(e) or type(e).__name__
+            raise
+        finally:
+            status['running'] = False
+        status['consecutive_failures'] = 0
+        status['last_error'] = None
+        status['last_success'] = status['last_run']
+        status['last_result'] = result
+        status['positions_total'] += result['inserted']
+        return result
+
+
+def run_job(loop: asyncio.AbstractEventLoop, get_traccar_config, get_db_config,
+            progress=None, cancelled=None) -> Dict[str, Any]:
+    """Job-Funktion für job_runner: führt run_now aus dem Job-Thread auf der Event-Loop des Workers aus."""
+    return asyncio.run_coroutine_threadsafe(run_now(get_traccar_config, get_db_config), loop).result()
+
+
+def next_delay(failures: int) -> float:
+    """Regulärer Abstand oder exponentieller Backoff mit Jitter nach Fehlern."""
+    if failures == 0:
+        return TRACCAR_SYNC_INTERVAL
+    backoff = min(TRACCAR_SYNC_MAX_BACKOFF, TRACCAR_SYNC_INTERVAL * 2 ** failures)
+    return backoff * random.uniform(0.8, 1.2)
+
+
+async def _run_scheduler(get_traccar_config, get_db_config):
+    while True:
+        try:
+            await run_now(get_traccar_config, get_db_config)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Traccar/PostGIS nicht erreichbar oder nicht konfiguriert - mit Backoff erneut versuchen
+            pass
+        delay = next_delay(status['consecutive_failures'])
+        status['next_run_in_s'] = round(delay, 1)
+        await asyncio.sleep(delay)
+
+
+def start_scheduler(get_traccar_config, get_db_config):
+    global _scheduler_task
+    if not TRACCAR_SYNC_ENABLED:
+        return
+    if _scheduler_task is None or _scheduler_task.done():
+        _scheduler_task = asyncio.create_task(_run_scheduler(get_traccar_config, get_db_config))
+
+
+async def stop_scheduler():
+    global _scheduler_task
+    task, _scheduler_task = _scheduler_task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,234 @@
+"""
+Persistenter Cache für Feature-Anzahl, Geometrietypen und Ausdehnung der uMap-Datalayer.
+
+Einträge gelten, solange umap_datalayer.modified_at unverändert ist. Veraltete oder
+fehlende Einträge werden im Hintergrund nachberechnet - beim Listing (Cache-Miss)
+und periodisch durch den Refresher für alle Datalayer. Nicht lesbare Dateien werden als
+leerer Eintrag mit unreadable=True gespeichert, damit sie nicht bei jedem Listing erneut
+eingeplant werden; der Refresher prüft sie nach UMAP_CACHE_RETRY_UNREADABLE erneut.
+Der Refresher läuft dank Advisory-Lock nur in einem Worker-Prozess gleichzeitig.
+"""
+import asyncio
+import os
+from datetime import timedelta
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+from django.utils import timezone
+
+from settings_app.models import DatalayerCache
+from orm_executor import orm
+import umap_db
+import umap_files
+import spatial_index
+
+UMAP_CACHE_REFRESH_INTERVAL = int(os.getenv('UMAP_CACHE_REFRESH_INTERVAL', '300'))
+# Nicht lesbare Datalayer-Dateien werden frühestens nach N Sekunden erneut analysiert
+UMAP_CACHE_RETRY_UNREADABLE = int(os.getenv('UMAP_CACHE_RETRY_UNREADABLE', '3600'))
+# Beliebige, aber feste Kennung für pg_try_advisory_lock (uMap-Datenbank)
+_ADVISORY_LOCK_ID = 7_402_114
+
+# (map_id, datalayer_id, modified_at, geojson-Pfad)
+Layer = Tuple[int, int, Any, str]
+
+_pending: set = set()
+_refresh_tasks: set = set()
+_refresher_task: Optional[asyncio.Task] = None
+
+
+@orm
+def _load_entries(map_ids: List[int]) -> Dict[Tuple[int, int], DatalayerCache]:
+    return {
+        (entry.map_id, entry.datalayer_id): entry
+        for entry in DatalayerCache.objects.filter(map_id__in=map_ids)
+    }
+
+
+@orm
+def _load_versions() -> Dict[int, Any]:
+    """datalayer_id -> source_modified_at; nicht lesbare Einträge nach Ablauf der Wartezeit False (veraltet)."""
+    retry_before = timezone.now() - timedelta(seconds=UMAP_CACHE_RETRY_UNREADABLE)
+    return {
+        datalayer_id: False if unreadable and computed_at < retry_before else modified_at
+        for datalayer_id, modified_at, unreadable, computed_at in DatalayerCache.objects.values_list(
+            'datalayer_id', 'source_modified_at', 'unreadable', 'computed_at'
+        )
+    }
+
+
+@orm
+def _store_entry(layer: Layer, stats: Optional[Dict[str, Any]]):
+    """Speichert die Kennzahlen; stats=None (Datei nicht lesbar) ergibt einen leeren Eintrag mit unreadable=True."""
+    map_id, datalayer_id, modified_at, _ = layer
+    unreadable = stats is None
+    if unreadable:
+        stats = {'feature_count': 0, 'geometry_types': [], 'bbox': None}
+    bbox = stats['bbox'] or [None, None, None, None]
+    DatalayerCache.objects.update_or_create(
+        map_id=map_id,
+        datalayer_id=datalayer_id,
+        defaults={
+            'source_modified_at': modified_at,
+            'feature_count': stats['feature_count'],
+            'geometry_types': stats['geometry_types'],
+            'min_x': bbox[0],
+            'min_y': bbox[1],
+            'max_x': bbox[2],
+            'max_y': bbox[3],
+            'unreadable': unreadable,
+        }
+    )
+    spatial_index.index.upsert(map_id, datalayer_id, stats['bbox'])
+
+
+@orm
+def _delete_entries(datalayer_ids: Iterable[int]):
+    datalayer_ids = list(datalayer_ids)
+    DatalayerCache.objects.filter(datalayer_id__in=datalayer_ids).delete()
+    spatial_index.index.remove_datalayers(datalayer_ids)
+
+
+def _combine(entries: List[DatalayerCache]) -> Dict[str, Any]:
+    geometry_types = set()
+    bbox = None
+    for entry in entries:
+        geometry_types.update(entry.geometry_types or [])
+        if entry.bbox is None:
+            continue
+        if bbox is None:
+            bbox = list(entry.bbox)
+        else:
+            bbox = [
+                min(bbox[0], entry.min_x), min(bbox[1], entry.min_y),
+                max(bbox[2], entry.max_x), max(bbox[3], entry.max_y)
+            ]
+    return {
+        'feature_count': sum(entry.feature_count for entry in entries),
+        'geometry_types': sorted(geometry_types),
+        'bbox': bbox
+    }
+
+
+async def lookup(layers_by_map: Dict[int, List[Tuple[int, Any, str]]]) -> Dict[int, Optional[Dict[str, Any]]]:
+    """
+    Liefert pro Karte die zusammengefassten Kennzahlen aller Datalayer.
+    Karten mit veralteten oder fehlenden Einträgen erhalten None; die betroffenen
+    Datalayer werden zur Neuberechnung eingeplant.
+    """
+    entries = await _load_entries(list(layers_by_map))
+    result = {}
+    stale = []
+    for map_id, layers in layers_by_map.items():
+        map_entries = []
+        complete = True
+        for datalayer_id, modified_at, geojson in layers:
+            if not geojson:
+                # Datalayer ohne Datei hat keine Features
+                continue
+            entry = entries.get((map_id, datalayer_id))
+            if entry is None or entry.source_modified_at != modified_at:
+                stale.append((map_id, datalayer_id, modified_at, geojson))
+                complete = False
+            else:
+                map_entries.append(entry)
+        result[map_id] = _combine(map_entries) if complete else None
+
+    schedule_refresh(stale)
+    return result
+
+
+async def refresh_layers(layers: List[Layer]):
+    for layer in layers:
+        stats = await asyncio.to_thread(umap_files.analyze_datalayer_sync, layer[3])
+        await _store_entry(layer, stats)
+
+
+async def _refresh_and_release(layers: List[Layer]):
+    try:
+        await refresh_layers(layers)
+    finally:
+        _pending.difference_update(layer[1] for layer in layers)
+
+
+def schedule_refresh(layers: List[Layer]):
+    if not umap_files.UMAP_MEDIA_ROOT:
+        return
+    layers = [layer for layer in layers if layer[1] not in _pending]
+    if not layers:
+        return
+    _pending.update(layer[1] for layer in layers)
+    task = asyncio.create_task(_refresh_and_release(layers))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def refresh_all(conn):
+    """
+    Gleicht den Cache mit allen Datalayern der uMap-Datenbank ab:
+    veraltete Einträge werden neu berechnet, gelöschte Datalayer entfernt.
+    """
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT id, map_id, modified_at, geojson FROM umap_datalayer")
+        rows = await cur.fetchall()
+
+    versions = await _load_versions()
+    stale = [
+        (map_id, datalayer_id, modified_at, geojson)
+        for datalayer_id, map_id, modified_at, geojson in rows
+        if geojson and datalayer_id not in _pending and versions.get(datalayer_id, False) != modified_at
+    ]
+    if stale and umap_files.UMAP_MEDIA_ROOT:
+        _pending.update(layer[1] for layer in stale)
+        await _refresh_and_release(stale)
+
+    removed = set(versions) - {row[0] for row in rows}
+    if removed:
+        await _delete_entries(removed)
+
+
+async def refresh_all_locked(pool) -> bool:
+    """refresh_all, sofern kein anderer Worker-Prozess gerade abgleicht; False, wenn übersprungen."""
+    async with pool.connection() as conn:
+        # Sitzungs-Lock ohne offene Transaktion halten, solange die Dateien analysiert werden
+        await conn.set_autocommit(True)
+        try:
+            cur = await conn.execute("SELECT pg_try_advisory_lock(%s)", [_ADVISORY_LOCK_ID])
+            if not (await cur.fetchone())[0]:
+                return False
+            try:
+                await refresh_all(conn)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(%s)", [_ADVISORY_LOCK_ID])
+        finally:
+            await conn.set_autocommit(False)
+    return True
+
+
+async def _run_refresher(get_config):
+    while True:
+        try:
+            pool = await umap_db.get_pool(await get_config())
+            await refresh_all_locked(pool)
+            # Der Index ist pro Prozess - der Abgleich läuft in jedem Worker.
+            # Vollständiger Abgleich fängt auch Änderungen anderer Prozesse zuverlässig auf
+            await spatial_index.index.sync(full=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # uMap nicht erreichbar - beim nächsten Durchlauf erneut versuchen
+            pass
+        await asyncio.sleep(UMAP_CACHE_REFRESH_INTERVAL)
+
+
+def start_refresher(get_config):
+    global _refresher_task
+    if _refresher_task is None or _refresher_task.done():
+        _refresher_task = asyncio.create_task(_run_refresher(get_config))
+
+
+async def stop_refresher():
+    global _refresher_task
+    tasks = [task for task in [_refresher_task, *_refresh_tasks] if task is not None]
+    _refresher_task = None
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,168 @@
+"""
+Async-Verbindungspool und Paginierung für die uMap PostGIS-Datenbank.
+
+Pro uMap-Instanz (Settings-Zeilen mit service_name='umap') gibt es einen Pool. Er wird
+automatisch neu erstellt, sobald sich Host, Port, Datenbank oder Zugangsdaten ändern, und
+geschlossen, wenn die Instanz nicht mehr konfiguriert ist (close_pools_except).
+"""
+import asyncio
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple, List, Set
+
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+import metrics
+
+UMAP_POOL_MIN_SIZE = int(os.getenv('UMAP_POOL_MIN_SIZE', '1'))
+UMAP_POOL_MAX_SIZE = int(os.getenv('UMAP_POOL_MAX_SIZE', '10'))
+UMAP_POOL_TIMEOUT = float(os.getenv('UMAP_POOL_TIMEOUT', '10'))
+UMAP_POOL_MAX_IDLE = float(os.getenv('UMAP_POOL_MAX_IDLE', '300'))
+
+DEFAULT_INSTANCE = 'default'
+
+# Instanz -> (Pool, Conninfo)
+_pools: Dict[str, Tuple[AsyncConnectionPool, str]] = {}
+_pool_lock = asyncio.Lock()
+
+
+def build_conninfo(config: Dict[str, Any]) -> str:
+    return make_conninfo(
+        host=config['db_host'],
+        port=config['db_port'],
+        dbname=config['db_name'],
+        user=config['db_user'],
+        password=config['db_password'],
+        connect_timeout=5
+    )
+
+
+async def get_pool(config: Dict[str, Any]) -> AsyncConnectionPool:
+    """
+    Liefert den Pool für die übergebene uMap-Konfiguration (Instanz aus config['instance']).
+    Bei geänderten Verbindungsparametern wird der alte Pool geschlossen und ersetzt.
+    """
+    instance = config.get('instance', DEFAULT_INSTANCE)
+    conninfo = build_conninfo(config)
+    current = _pools.get(instance)
+    if current is not None and current[1] == conninfo:
+        return current[0]
+
+    async with _pool_lock:
+        current = _pools.get(instance)
+        if current is not None and current[1] == conninfo:
+            return current[0]
+
+        pool = AsyncConnectionPool(
+            conninfo,
+            min_size=UMAP_POOL_MIN_SIZE,
+            max_size=UMAP_POOL_MAX_SIZE,
+            timeout=UMAP_POOL_TIMEOUT,
+            max_idle=UMAP_POOL_MAX_IDLE,
+            # Verbindung vor Ausgabe prüfen, damit abgebrochene Verbindungen ersetzt werden
+            check=AsyncConnectionPool.check_connection,
+            name='umap' if instance == DEFAULT_INSTANCE else f"umap-{instance}",
+            kwargs={'cursor_factory': metrics.timed_cursor('umap_db')},
+            open=False
+        )
+        await pool.open()
+        _pools[instance] = (pool, conninfo)
+
+    if current is not None:
+        await current[0].close()
+    return pool
+
+
+def instances() -> List[str]:
+    """Instanzen mit geöffnetem Pool."""
+    return list(_pools)
+
+
+def pool_stats(instance: str = DEFAULT_INSTANCE) -> Dict[str, int]:
+    current = _pools.get(instance)
+    return current[0].get_stats() if current is not None else {}
+
+
+async def close_pool(instance: Optional[str] = None):
+    """Schließt den Pool der Instanz, ohne Angabe alle Pools."""
+    async with _pool_lock:
+        names = list(_pools) if instance is None else [instance]
+        pools = [_pools.pop(name)[0] for name in names if name in _pools]
+    for pool in pools:
+        await pool.close()
+
+
+async def close_pools_except(active: Set[str]):
+    """Schließt die Pools aller Instanzen, die nicht (mehr) aktiv konfiguriert sind."""
+    async with _pool_lock:
+        pools = [_pools.pop(name)[0] for name in list(_pools) if name not in active]
+    for pool in pools:
+        await pool.close()
+
+
+# Sortierung: Name -> (Spalte, Richtung). Die Karten-ID dient als eindeutiger Tie-Breaker.
+MAP_SORT_OPTIONS = {
+    'modified_desc': ('m.modified_at', 'DESC'),
+    'modified_asc': ('m.modified_at', 'ASC'),
+    'created_desc': ('m.created_at', 'DESC'),
+    'created_asc': ('m.created_at', 'ASC'),
+    'name_asc': ('m.name', 'ASC'),
+    'name_desc': ('m.name', 'DESC'),
+}
+
+
+def encode_cursor(sort: str, value: Any, map_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, map_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """
+    Dekodiert einen Cursor zu (Sortierwert, Karten-ID).
+    Wirft ValueError bei ungültigem Cursor oder abweichender Sortierung.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, map_id = json.loads(raw)
+        if MAP_SORT_OPTIONS[sort][0] != 'm.name':
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise ValueError("Ungültiger Cursor")
+    if cursor_sort != sort or not isinstance(map_id, int):
+        raise ValueError("Cursor passt nicht zur Sortierung")
+    return value, map_id
+
+
+def encode_instance_cursor(positions: Dict[str, Optional[str]]) -> str:
+    """
+    Cursor über mehrere Instanzen: Instanz -> Cursor dieser Instanz (encode_cursor) oder None,
+    wenn von ihr noch keine Karte ausgegeben wurde. Erschöpfte Instanzen fehlen.
+    """
+    raw = json.dumps(positions, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_instance_cursor(cursor: str, sort: str) -> Dict[str, Optional[Tuple[Any, int]]]:
+    """
+    Dekodiert einen Cursor von encode_instance_cursor zu Instanz -> (Sortierwert, Karten-ID) oder None.
+    Ein Cursor von encode_cursor (nur eine Instanz) gilt für die Standard-Instanz.
+    """
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Ungültiger Cursor")
+    if isinstance(positions, list):
+        return {DEFAULT_INSTANCE: decode_cursor(cursor, sort)}
+    if not isinstance(positions, dict):
+        raise ValueError("Ungültiger Cursor")
+    return {instance: decode_cursor(position, sort) if position else None
+            for instance, position in positions.items()}
+
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
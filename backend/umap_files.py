@@ -0,0 +1,228 @@
+"""
+Zugriff auf die GeoJSON-Dateien der uMap-Datalayer.
+
+uMap speichert die Features nicht in der Datenbank, sondern als Datei unter
+MEDIA_ROOT (Spalte umap_datalayer.geojson enthält den relativen Pfad).
+"""
+import json
+import os
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator, List, Sequence
+
+UMAP_MEDIA_ROOT = os.getenv('UMAP_MEDIA_ROOT')
+
+
+def datalayer_path(relative_path: str) -> Optional[Path]:
+    if not UMAP_MEDIA_ROOT or not relative_path:
+        return None
+    root = Path(UMAP_MEDIA_ROOT).resolve()
+    path = (root / relative_path).resolve()
+    # Keine Pfade außerhalb von MEDIA_ROOT zulassen
+    if root not in path.parents:
+        return None
+    return path
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _iter_positions(coordinates):
+    # Nur verschachtelte Listen; Positionen mit weniger als zwei Zahlen werden übersprungen
+    if not isinstance(coordinates, list) or not coordinates:
+        return
+    if not isinstance(coordinates[0], list):
+        if len(coordinates) >= 2 and _is_number(coordinates[0]) and _is_number(coordinates[1]):
+            yield coordinates
+        return
+    for item in coordinates:
+        yield from _iter_positions(item)
+
+
+def _iter_geometries(geometry):
+    if not isinstance(geometry, dict):
+        return
+    if geometry.get('type') == 'GeometryCollection':
+        for child in geometry.get('geometries') or []:
+            yield from _iter_geometries(child)
+    else:
+        yield geometry
+
+
+class _StreamReader:
+    """Puffert eine Textdatei blockweise für das schrittweise Dekodieren mit raw_decode."""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, min_size: int = 0) -> bool:
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        data = self.f.read(max(self.chunk_size, min_size))
+        if not data:
+            self.eof = True
+            return False
+        self.buf += data
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unerwartetes Dateiende")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"'{char}' erwartet an Position {self.pos}")
+        self.pos += 1
+
+    def decode(self, decoder: json.JSONDecoder):
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+                # Ein Wert direkt am Pufferende kann abgeschnitten sein (z.B. eine Zahl)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Unvollständig: Fenster verdoppeln, damit große Features nicht quadratisch oft dekodiert werden
+            self._fill(len(self.buf) - self.pos)
+
+
+def iter_features(relative_path: str, chunk_size: int = 64 * 1024) -> Iterator[Dict[str, Any]]:
+    """
+    Liefert die Features einer Datalayer-Datei einzeln, ohne das Dokument vollständig zu laden.
+    Der Speicherbedarf ist durch die Blockgröße und das größte einzelne Feature begrenzt.
+    """
+    path = datalayer_path(relative_path)
+    if path is None:
+        raise FileNotFoundError(f"Datalayer-Datei nicht erreichbar: {relative_path}")
+    decoder = json.JSONDecoder()
+    # utf-8-sig: manche Editoren schreiben ein Byte Order Mark vor das Dokument
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        reader = _StreamReader(f, chunk_size)
+        reader.expect('{')
+        while True:
+            char = reader.peek()
+            if char == '}':
+                return
+            if char == ',':
+                reader.pos += 1
+                continue
+            key = reader.decode(decoder)
+            reader.expect(':')
+            if key != 'features':
+                # Andere Schlüssel (type, _umap_options, ...) überspringen
+                reader.decode(decoder)
+                continue
+            reader.expect('[')
+            while True:
+                char = reader.peek()
+                if char == ']':
+                    reader.pos += 1
+                    break
+                if char == ',':
+                    reader.pos += 1
+                    continue
+                yield reader.decode(decoder)
+
+
+def feature_bounds(feature: Dict[str, Any]) -> Optional[List[float]]:
+    """Bounding Box [min_x, min_y, max_x, max_y] eines Features oder None ohne (gültige) Geometrie."""
+    if not isinstance(feature, dict):
+        return None
+    bbox = None
+    for geometry in _iter_geometries(feature.get('geometry')):
+        for position in _iter_positions(geometry.get('coordinates')):
+            x, y = position[0], position[1]
+            if bbox is None:
+                bbox = [x, y, x, y]
+            else:
+                if x < bbox[0]: bbox[0] = x
+                if y < bbox[1]: bbox[1] = y
+                if x > bbox[2]: bbox[2] = x
+                if y > bbox[3]: bbox[3] = y
+    return bbox
+
+
+def iter_feature_collection(layers: Sequence[Dict[str, Any]], bbox: Optional[List[float]] = None,
+                            properties: Optional[List[str]] = None,
+                            chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Streamt die Features mehrerer Datalayer (Liste von {'id', 'geojson'}) als eine
+    FeatureCollection in Blöcken von etwa chunk_size Bytes. Jedes Feature erhält das
+    Fremdattribut "datalayer" mit der Datalayer-ID. Optional nur Features, deren Ausdehnung
+    bbox schneidet, und nur die angegebenen Properties.
+    """
+    buffer = ['{"type":"FeatureCollection","features":[']
+    size = 0
+    first = True
+    for layer in layers:
+        for feature in iter_features(layer['geojson']):
+            if not isinstance(feature, dict):
+                continue
+            if bbox is not None:
+                bounds = feature_bounds(feature)
+                if bounds is None or bounds[0] > bbox[2] or bounds[2] < bbox[0] or bounds[1] > bbox[3] or bounds[3] < bbox[1]:
+                    continue
+            if properties is not None:
+                source = feature.get('properties')
+                if not isinstance(source, dict):
+                    source = {}
+                feature['properties'] = {key: source[key] for key in properties if key in source}
+            feature['datalayer'] = layer['id']
+            text = json.dumps(feature, ensure_ascii=False, separators=(',', ':'))
+            buffer.append(text if first else ',' + text)
+            first = False
+            size += len(text) + 1
+            if size >= chunk_size:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [], 0
+    buffer.append(']}')
+    yield ''.join(buffer).encode('utf-8')
+
+
+def analyze_datalayer_sync(relative_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Liest die GeoJSON-Datei eines Datalayers und ermittelt Feature-Anzahl,
+    Geometrietypen und Bounding Box [min_x, min_y, max_x, max_y].
+    Gibt None zurück, wenn die Datei nicht erreichbar oder ungültig ist; einzelne
+    ungültige Features oder Positionen werden übersprungen.
+    """
+    feature_count = 0
+    geometry_types = set()
+    bbox = None
+    try:
+        for feature in iter_features(relative_path):
+            if not isinstance(feature, dict):
+                continue
+            feature_count += 1
+            for geometry in _iter_geometries(feature.get('geometry')):
+                if isinstance(geometry.get('type'), str):
+                    geometry_types.add(geometry['type'])
+            bounds = feature_bounds(feature)
+            if bounds is None:
+                continue
+            if bbox is None:
+                bbox = bounds
+            else:
+                bbox = [min(bbox[0], bounds[0]), min(bbox[1], bounds[1]), max(bbox[2], bounds[2]), max(bbox[3], bounds[3])]
+    except (OSError, ValueError):
+        return None
+
+    return {
+        'feature_count': feature_count,
+        'geometry_types': sorted(t for t in geometry_types if t),
+        'bbox': bbox
+    }
@@ -0,0 +1,157 @@
+"""
+Mapbox Vector Tiles (ST_AsMVT) aus Tabellen des Geoserver-Workspace-Schemas.
+
+Als Layer gilt jede Tabelle des Schemas mit Geometriespalte, also sowohl die von
+geoserver_export erzeugten uMap-Tabellen (umap_<map_id>_<datalayer_id>) als auch
+andere Workspace-Tabellen. uMap-Tabellen liefert die API nur an den Eigentümer der
+Karte (siehe umap_map_id). Exportierte Tabellen tragen ihre Export-Version im
+Tabellenkommentar und werden im Festplatten-Cache (tile_cache) abgelegt; Tabellen
+ohne Version (z.B. laufend synchronisierte Traccar-Positionen) werden immer neu erzeugt.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from psycopg import sql
+from psycopg_pool import AsyncConnectionPool
+
+import tile_cache
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+TILE_MAX_ZOOM = int(os.getenv('TILE_MAX_ZOOM', '22'))
+# Wie lange Layer-Metadaten (Geometriespalte, Spalten, Version) gültig bleiben
+TILE_LAYER_CACHE_TTL = float(os.getenv('TILE_LAYER_CACHE_TTL', '10'))
+# Höchstzahl gecachter Layer-Metadaten (inkl. nicht gefundener Namen), älteste werden verdrängt
+TILE_LAYER_CACHE_SIZE = int(os.getenv('TILE_LAYER_CACHE_SIZE', '1024'))
+
+LAYER_NAME_PATTERN = re.compile(r'^[a-z0-9_]{1,63}$')
+# Nur skalare Attribute in die Kacheln übernehmen
+_SKIPPED_TYPES = ('geometry', 'geography', 'json', 'jsonb', 'bytea')
+
+_UMAP_TABLE_PATTERN = re.compile(r'^umap_(\d+)_(\d+)$')
+
+_layers: 'OrderedDict[Tuple[str, str], Tuple[float, Optional[Dict[str, Any]]]]' = OrderedDict()
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= TILE_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def is_umap_table(table: str) -> bool:
+    return table.startswith('umap_')
+
+
+def umap_map_id(table: str) -> Optional[int]:
+    """Karten-ID einer exportierten uMap-Tabelle umap_<map_id>_<datalayer_id>, sonst None."""
+    match = _UMAP_TABLE_PATTERN.match(table)
+    return int(match.group(1)) if match else None
+
+
+def export_comment(**info) -> str:
+    """Tabellenkommentar für exportierte Tabellen; exported_at dient als Cache-Version."""
+    return json.dumps({'source': 'gis-management', **info}, separators=(',', ':'))
+
+
+def _version(comment: Optional[str]) -> Optional[str]:
+    try:
+        exported_at = json.loads(comment)['exported_at']
+    except (TypeError, ValueError, KeyError):
+        return None
+    return re.sub(r'[^0-9A-Za-z]', '', str(exported_at)) or None
+
+
+async def layer_info(pool: AsyncConnectionPool, schema: str, table: str) -> Optional[Dict[str, Any]]:
+    """Geometriespalte, SRID, Attributspalten und Export-Version einer Tabelle; None, wenn kein Layer."""
+    key = (schema, table)
+    entry = _layers.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        _layers.move_to_end(key)
+        return entry[1]
+
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            "SELECT f_geometry_column, srid FROM geometry_columns "
+            "WHERE f_table_schema = %s AND f_table_name = %s ORDER BY f_geometry_column LIMIT 1",
+            [schema, table]
+        )
+        geometry = await cur.fetchone()
+        info = None
+        if geometry is not None:
+            cur = await conn.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = %s AND table_name = %s AND udt_name <> ALL(%s) ORDER BY ordinal_position",
+                [schema, table, list(_SKIPPED_TYPES)]
+            )
+            columns = [row[0] for row in await cur.fetchall()]
+            cur = await conn.execute(
+                "SELECT obj_description(c.oid, 'pg_class') FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = %s AND c.relname = %s",
+                [schema, table]
+            )
+            comment = await cur.fetchone()
+            info = {
+                'geom_column': geometry[0],
+                'srid': geometry[1] or 4326,
+                'columns': columns,
+                'version': _version(comment[0] if comment else None)
+            }
+    _layers[key] = (time.monotonic() + TILE_LAYER_CACHE_TTL, info)
+    _layers.move_to_end(key)
+    while len(_layers) > TILE_LAYER_CACHE_SIZE:
+        _layers.popitem(last=False)
+    return info
+
+
+def invalidate_layer(schema: str, table: str):
+    _layers.pop((schema, table), None)
+    tile_cache.cache.invalidate_layer(table)
+
+
+async def render_tile(pool: AsyncConnectionPool, schema: str, table: str, info: Dict[str, Any],
+                      z: int, x: int, y: int) -> bytes:
+    geom = sql.Identifier(info['geom_column'])
+    attributes = sql.SQL('').join(sql.SQL(', t.{}').format(sql.Identifier(c)) for c in info['columns'])
+    query = sql.SQL("""
+        WITH bounds AS (
+            SELECT ST_TileEnvelope(%(z)s::int, %(x)s::int, %(y)s::int) AS env
+        ),
+        tile AS (
+            SELECT ST_AsMVTGeom(ST_Transform(t.{geom}, 3857), bounds.env, %(extent)s::int, %(buffer)s::int, true) AS mvt_geom{attributes}
+            FROM {table} t, bounds
+            WHERE t.{geom} && ST_Transform(
+                ST_Expand(bounds.env, (ST_XMax(bounds.env) - ST_XMin(bounds.env)) * %(buffer)s::float8 / %(extent)s),
+                {srid}
+            )
+        )
+        SELECT ST_AsMVT(tile.*, %(layer)s::text, %(extent)s::int, 'mvt_geom') FROM tile WHERE mvt_geom IS NOT NULL
+    """).format(
+        geom=geom,
+        attributes=attributes,
+        table=sql.Identifier(schema, table),
+        srid=sql.Literal(info['srid'])
+    )
+    async with pool.connection() as conn:
+        cur = await conn.execute(query, {
+            'z': z, 'x': x, 'y': y, 'extent': TILE_EXTENT, 'buffer': TILE_BUFFER, 'layer': table
+        })
+        row = await cur.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b''
+
+
+async def get_tile(pool: AsyncConnectionPool, schema: str, table: str, info: Dict[str, Any],
+                   z: int, x: int, y: int) -> Tuple[bytes, bool]:
+    """Liefert (Kachel, aus Cache). Versionierte Layer werden im Festplatten-Cache abgelegt."""
+    version = info['version']
+    if version is None:
+        return await render_tile(pool, schema, table, info, z, x, y), False
+    data = await asyncio.to_thread(tile_cache.cache.get, table, version, z, x, y)
+    if data is not None:
+        return data, True
+    data = await render_tile(pool, schema, table, info, z, x, y)
+    await asyncio.to_thread(tile_cache.cache.put, table, version, z, x, y, data)
+    return data, False
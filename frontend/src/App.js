@@ -66,8 +66,15 @@ const apiService = {
     if (!response.ok) throw new Error('Validierung fehlgeschlagen');
     return await response.json();
   },
-  async fetchUMapMaps() {
-    const response = await fetch(`${API_BASE_URL}/umap/maps`, { credentials: 'include' });
+  async fetchUMapMaps({ cursor, search, shareStatus, sort, limit } = {}) {
+    const params = new URLSearchParams();
+    if (cursor) params.set('cursor', cursor);
+    if (search) params.set('search', search);
+    if (shareStatus) params.set('share_status', shareStatus);
+    if (sort) params.set('sort', sort);
+    if (limit) params.set('limit', limit);
+    const query = params.toString();
+    const response = await fetch(`${API_BASE_URL}/umap/maps${query ? `?${query}` : ''}`, { credentials: 'include' });
     if (!response.ok) {
       const errorText = await response.text();
       throw new Error(`Failed to load maps: ${response.status} - ${errorText}`);
@@ -81,6 +88,29 @@ const apiService = {
     });
     if (!response.ok) throw new Error('Failed');
     return await response.json();
+  },
+  async bulkSaveToGeoserver(mapIds) {
+    const response = await fetch(`${API_BASE_URL}/umap/maps/bulk-save-to-geoserver`, {
+      method: 'POST',
+      credentials: 'include',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ map_ids: mapIds })
+    });
+    if (!response.ok) throw new Error('Bulk-Export fehlgeschlagen');
+    return await response.json();
+  },
+  async fetchJob(jobId) {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, { credentials: 'include' });
+    if (!response.ok) throw new Error('Job konnte nicht geladen werden');
+    return await response.json();
+  },
+  async waitForJob(jobId, intervalMs = 1000) {
+    // Fortschritt abfragen, bis der Job nicht mehr wartet oder läuft
+    for (;;) {
+      const job = await this.fetchJob(jobId);
+      if (job.status !== 'queued' && job.status !== 'running') return job;
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
   }
 };
 
@@ -158,18 +188,26 @@ const TokenField = ({ label, value, disabled, onChange }) => {
 const UMapMapsView = () => {
   const [maps, setMaps] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [search, setSearch] = useState('');
+  const [shareStatus, setShareStatus] = useState('');
+  const [sort, setSort] = useState('modified_desc');
 
   useEffect(() => {
-    loadMaps();
-  }, []);
+    const timer = setTimeout(() => loadMaps(), 300);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [search, shareStatus, sort]);
 
   const loadMaps = async () => {
     setLoading(true);
     setError(null);
     try {
-      const data = await apiService.fetchUMapMaps();
+      const data = await apiService.fetchUMapMaps({ search, shareStatus, sort });
       setMaps(data.maps || []);
+      setNextCursor(data.next_cursor || null);
     } catch (err) {
       console.error('uMap loading error:', err);
       setError(err.message || 'Fehler beim Laden der Karten');
@@ -178,17 +216,60 @@ const UMapMapsView = () => {
     }
   };
 
+  const loadMoreMaps = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const data = await apiService.fetchUMapMaps({ cursor: nextCursor, search, shareStatus, sort });
+      setMaps((prev) => [...prev, ...(data.maps || [])]);
+      setNextCursor(data.next_cursor || null);
+    } catch (err) {
+      console.error('uMap loading error:', err);
+      setError(err.message || 'Fehler beim Laden der Karten');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSaveToGeoserver = async (mapId, mapName) => {
     // TODO: Diese Funktion wird später die uMap-Karte über Geoserver nach Traccar als Server Overlay pushen
     if (!window.confirm(`Karte "${mapName}" über Geoserver nach Traccar pushen?`)) return;
     try {
-      await apiService.saveToGeoserver(mapId);
-      alert('Funktion wird noch implementiert: Karte wird über Geoserver nach Traccar als Server Overlay übertragen');
+      const { job_id } = await apiService.saveToGeoserver(mapId);
+      const job = await apiService.waitForJob(job_id);
+      if (job.status !== 'done') {
+        alert(`Export ${job.status === 'cancelled' ? 'abgebrochen' : 'fehlgeschlagen'}${job.error ? `: ${job.error}` : ''}`);
+        return;
+      }
+      const tables = job.result.map(l => `${l.table} (${l.feature_count} Features)`).join('\n');
+      alert(`Karte in Geoserver-Schema "${job.params.schema}" exportiert:\n${tables}`);
     } catch (err) {
       alert('Fehler beim Pushen nach Traccar');
     }
   };
 
+  // Exporte lesen nur aus der Standard-Instanz; Karten anderer Instanzen haben dort eigene IDs
+  const exportableMaps = maps.filter(m => !m.instance || m.instance === 'default');
+
+  const handleBulkSaveToGeoserver = async () => {
+    const skipped = maps.length - exportableMaps.length;
+    if (!window.confirm(`${exportableMaps.length} angezeigte Karten nach Geoserver exportieren?` +
+      (skipped ? `\n${skipped} Karten anderer uMap-Instanzen werden übersprungen.` : ''))) return;
+    try {
+      const { job_id } = await apiService.bulkSaveToGeoserver(exportableMaps.map(m => m.id));
+      const job = await apiService.waitForJob(job_id, 2000);
+      if (job.status !== 'done') {
+        alert(`Bulk-Export ${job.status === 'cancelled' ? 'abgebrochen' : 'fehlgeschlagen'}${job.error ? `: ${job.error}` : ''}`);
+        return;
+      }
+      const failures = job.result.maps.filter(m => m.status === 'failed').map(m => `Karte ${m.map_id}: ${m.error}`);
+      alert(`${job.result.succeeded} Karten exportiert, ${job.result.failed} fehlgeschlagen (${Math.round(job.result.duration_ms / 1000)} s)` +
+        (failures.length ? `\n${failures.join('\n')}` : ''));
+    } catch (err) {
+      alert('Fehler beim Bulk-Export nach Geoserver');
+    }
+  };
+
   const getShareStatusIcon = (status) => {
     switch (status) {
       case 'Öffentlich': return <Globe size={18} className="text-green-600" />;
@@ -198,7 +279,10 @@ const UMapMapsView = () => {
     }
   };
 
-  if (loading) {
+  const hasFilter = search || shareStatus;
+
+  // Vollbild-Ladeanzeige nur beim ersten Laden, damit Such- und Filterfelder erhalten bleiben
+  if (loading && maps.length === 0 && !hasFilter) {
     return (
       <div className="flex items-center justify-center h-full">
         <div className="text-center">
@@ -237,7 +321,7 @@ const UMapMapsView = () => {
     );
   }
 
-  if (maps.length === 0) {
+  if (maps.length === 0 && !hasFilter) {
     return (
       <div className="flex items-center justify-center h-full">
         <div className="text-center bg-white rounded-2xl p-12 shadow-lg border border-gray-200 max-w-md">
@@ -256,15 +340,64 @@ const UMapMapsView = () => {
     <div className="max-w-7xl mx-auto">
       <div className="mb-8">
         <h2 className="text-3xl font-bold text-gray-800 mb-2">Meine uMap-Karten</h2>
-        <p className="text-gray-600">{maps.length} {maps.length === 1 ? 'Karte' : 'Karten'} gefunden</p>
+        <p className="text-gray-600">{maps.length}{nextCursor ? '+' : ''} {maps.length === 1 ? 'Karte' : 'Karten'} gefunden</p>
+      </div>
+
+      <div className="flex flex-col md:flex-row gap-3 mb-6">
+        <input
+          type="text"
+          value={search}
+          onChange={(e) => setSearch(e.target.value)}
+          placeholder="Karten durchsuchen..."
+          className="flex-1 px-4 py-2.5 border-2 border-blue-200 rounded-lg focus:outline-none focus:border-blue-400 focus:ring-2 focus:ring-blue-100"
+        />
+        <select
+          value={shareStatus}
+          onChange={(e) => setShareStatus(e.target.value)}
+          className="px-4 py-2.5 border-2 border-blue-200 rounded-lg bg-white focus:outline-none focus:border-blue-400"
+        >
+          <option value="">Alle Freigaben</option>
+          <option value="1">Öffentlich</option>
+          <option value="2">Mit Link</option>
+          <option value="3">Privat</option>
+        </select>
+        <select
+          value={sort}
+          onChange={(e) => setSort(e.target.value)}
+          className="px-4 py-2.5 border-2 border-blue-200 rounded-lg bg-white focus:outline-none focus:border-blue-400"
+        >
+          <option value="modified_desc">Zuletzt geändert</option>
+          <option value="modified_asc">Älteste Änderung</option>
+          <option value="created_desc">Neueste zuerst</option>
+          <option value="created_asc">Älteste zuerst</option>
+          <option value="name_asc">Name (A-Z)</option>
+          <option value="name_desc">Name (Z-A)</option>
+        </select>
+        <button
+          onClick={handleBulkSaveToGeoserver}
+          disabled={exportableMaps.length === 0}
+          className="px-4 py-2.5 bg-green-600 text-white rounded-lg hover:bg-green-700 transition-colors font-medium disabled:opacity-50"
+          title="Alle angezeigten Karten der Standard-Instanz nach Geoserver exportieren"
+        >
+          Alle → Geoserver
+        </button>
       </div>
 
+      {maps.length === 0 && (
+        <p className="text-center text-gray-600 py-12">Keine Karten für diese Filter gefunden.</p>
+      )}
+
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
         {maps.map((map) => (
-          <div key={map.id} className="bg-white rounded-xl shadow-lg border border-gray-200 overflow-hidden hover:shadow-xl transition-shadow">
+          <div key={`${map.instance || 'default'}-${map.id}`} className="bg-white rounded-xl shadow-lg border border-gray-200 overflow-hidden hover:shadow-xl transition-shadow">
             <div className="bg-gradient-to-r from-blue-500 to-blue-600 p-4">
               <div className="flex items-start justify-between">
-                <h3 className="text-xl font-bold text-white pr-4 line-clamp-2">{map.name}</h3>
+                <div className="pr-4">
+                  <h3 className="text-xl font-bold text-white line-clamp-2">{map.name}</h3>
+                  {map.instance && map.instance !== 'default' && (
+                    <span className="text-xs text-blue-100">Instanz: {map.instance}</span>
+                  )}
+                </div>
                 <div className="flex-shrink-0 bg-white bg-opacity-20 rounded-lg p-2">
                   <MapIcon size={24} className="text-white" />
                 </div>
@@ -284,7 +417,10 @@ const UMapMapsView = () => {
                 
                 <div className="flex items-center gap-2 text-sm text-gray-600">
                   <Server size={16} />
-                  <span>{map.feature_count} Feature{map.feature_count !== 1 ? 's' : ''}</span>
+                  <span>
+                    {map.datalayer_count} {map.datalayer_count === 1 ? 'Ebene' : 'Ebenen'}
+                    {map.feature_count !== null && map.feature_count !== undefined && ` · ${map.feature_count} Feature${map.feature_count !== 1 ? 's' : ''}`}
+                  </span>
                 </div>
 
                 {map.modified_at && (
@@ -305,18 +441,33 @@ const UMapMapsView = () => {
                   <Eye size={18} />
                   Ansehen
                 </a>
-                <button
-                  onClick={() => handleSaveToGeoserver(map.id, map.name)}
-                  className="flex-1 px-4 py-2.5 bg-green-600 text-white rounded-lg hover:bg-green-700 transition-colors font-medium"
-                  title="Über Geoserver nach Traccar pushen"
-                >
-                  → Traccar
-                </button>
+                {/* Export liest die Datalayer-Dateien der Standard-Instanz */}
+                {(!map.instance || map.instance === 'default') && (
+                  <button
+                    onClick={() => handleSaveToGeoserver(map.id, map.name)}
+                    className="flex-1 px-4 py-2.5 bg-green-600 text-white rounded-lg hover:bg-green-700 transition-colors font-medium"
+                    title="Über Geoserver nach Traccar pushen"
+                  >
+                    → Traccar
+                  </button>
+                )}
               </div>
             </div>
           </div>
         ))}
       </div>
+
+      {nextCursor && (
+        <div className="flex justify-center mt-8">
+          <button
+            onClick={loadMoreMaps}
+            disabled={loadingMore}
+            className="px-8 py-3 bg-blue-600 text-white rounded-lg hover:bg-blue-700 font-semibold disabled:opacity-50"
+          >
+            {loadingMore ? 'Lade...' : 'Weitere Karten laden'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Last- und Latenz-Benchmark für das FastAPI-Backend mit lokalen Ersatz-Upstreams.
+
+Ablauf:
+1. Legt in einer lokalen PostgreSQL-Instanz die Datenbanken <prefix>_django und
+   <prefix>_umap an (falls nötig), migriert die Django-Datenbank und befüllt die
+   uMap-Datenbank in der gewählten Größe (scripts/seed_umap_db.py).
+2. Startet den OIDC-Ersatz (scripts/oidc_standin.py) im Prozess und das Backend per
+   uvicorn als Unterprozess, konfiguriert über Umgebungsvariablen und Settings-Zeilen.
+3. Meldet über den OIDC-Ersatz Benutzer an (eine Session pro paralleler Verbindung) und
+   misst danach jedes Szenario für --duration Sekunden mit --concurrency Verbindungen.
+4. Schreibt Durchsatz und Latenzen (p50/p90/p99) nach benchmarks/<commit>-<größe>.json und
+   vergleicht optional mit einem früheren Ergebnis (--baseline). Eine Verschlechterung über
+   --tolerance hinaus beendet das Skript mit Exit-Code 1.
+
+    python3 scripts/benchmark.py --dsn postgresql://postgres@localhost/postgres --size medium \\
+        --concurrency 16 --duration 20 --baseline benchmarks/v1.4.0-medium.json
+
+Mehrere Worker (--workers > 1) brauchen einen gemeinsamen Session-Speicher (--redis-url).
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import httpx
+import psycopg
+from psycopg import sql
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+REPO_DIR = SCRIPTS_DIR.parent
+BACKEND_DIR = REPO_DIR / 'backend'
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import oidc_standin  # noqa: E402
+import seed_umap_db  # noqa: E402
+
+USERNAME = 'benchmark'
+GROUP = 'gis-benchmark'
+REALM = 'eizes'
+CLIENT_ID = 'eizes-gis'
+SCENARIOS = ('login', 'maps', 'maps_conditional', 'settings_read', 'settings_update', 'validate_workspace')
+# Kennzahlen, die beim Vergleich mit --baseline geprüft werden: (Schlüssel, größer ist besser)
+COMPARED = (('throughput_rps', True), ('p50_ms', False), ('p99_ms', False))
+
+
+def ensure_database(admin_dsn: str, name: str) -> str:
+    with psycopg.connect(admin_dsn, autocommit=True) as conn:
+        exists = conn.execute("SELECT 1 FROM pg_database WHERE datname = %s", [name]).fetchone()
+        if not exists:
+            conn.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    return make_conninfo(admin_dsn, dbname=name)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--tags', '--always', '--dirty'], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def backend_env(django_dsn: str, media_root: str, keycloak_url: str, args) -> dict:
+    db = conninfo_to_dict(django_dsn)
+    env = {
+        **os.environ,
+        'DB_NAME': db['dbname'],
+        'DB_USER': db.get('user', ''),
+        'DB_PASSWORD': db.get('password', ''),
+        'DB_HOST': db.get('host', 'localhost'),
+        'DB_PORT': str(db.get('port', '5432')),
+        'DJANGO_SECRET_KEY': 'benchmark',
+        'FIELD_ENCRYPTION_KEY': base64.urlsafe_b64encode(b'b' * 32).decode(),
+        'KEYCLOAK_URL': keycloak_url,
+        'KEYCLOAK_REALM': REALM,
+        'KEYCLOAK_CLIENT_ID': CLIENT_ID,
+        'REQUIRED_GROUP': GROUP,
+        'UMAP_MEDIA_ROOT': media_root,
+        'TRACCAR_SYNC_ENABLED': 'false',
+        'SESSION_BACKEND': 'redis' if args.redis_url else 'memory',
+    }
+    if args.redis_url:
+        env['SESSION_REDIS_URL'] = args.redis_url
+    return env
+
+
+def configure_settings(env: dict, umap_dsn: str):
+    """Migriert die Django-Datenbank und legt die Settings-Zeilen für uMap und Geoserver an."""
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'], cwd=BACKEND_DIR, env=env, check=True)
+    db = conninfo_to_dict(umap_dsn)
+    script = f"""
+import django, os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+from settings_app.models import Settings
+db = {json.dumps(db)}
+for service in ('umap', 'geoserver'):
+    Settings.objects.update_or_create(service_name=service, defaults=dict(
+        website_url='http://127.0.0.1', db_host=db.get('host', 'localhost'), db_port=int(db.get('port', 5432)),
+        db_name=db['dbname'], db_user=db.get('user', ''), db_password=db.get('password', ''),
+        geoserver_workspace='public' if service == 'geoserver' else None, is_active=True, updated_by='benchmark'
+    ))
+"""
+    subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def start_backend(env: dict, port: int, workers: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend beendet (Exit-Code {process.returncode})")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Backend nicht innerhalb von 60 s erreichbar")
+
+
+async def login(client: httpx.AsyncClient) -> str:
+    """Vollständiger Login über den OIDC-Ersatz; liefert die Session-ID."""
+    response = await client.get('/api/auth/login')
+    authorize = await client.get(response.headers['location'])
+    query = parse_qs(urlparse(authorize.headers['location']).query)
+    callback = await client.get('/api/auth/callback', params={'code': query['code'][0], 'state': query['state'][0]})
+    # Das Cookie ist als secure markiert und würde über http nicht zurückgeschickt
+    session_id = callback.cookies.get('session_id')
+    if callback.status_code not in (302, 307) or not session_id:
+        raise RuntimeError(f"Login fehlgeschlagen: {callback.status_code} {callback.text[:200]}")
+    return session_id
+
+
+def _cookie(session_id: str) -> dict:
+    return {'Cookie': f"session_id={session_id}"}
+
+
+def make_scenarios(umap_db: dict):
+    async def scenario_login(client, session_id, state):
+        await login(client)
+        return 200
+
+    async def scenario_maps(client, session_id, state):
+        response = await client.get('/api/umap/maps', params={'limit': 50}, headers=_cookie(session_id))
+        return response.status_code
+
+    async def scenario_maps_conditional(client, session_id, state):
+        headers = _cookie(session_id)
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        response = await client.get('/api/umap/maps', params={'limit': 50}, headers=headers)
+        state['etag'] = response.headers.get('etag', state.get('etag'))
+        return response.status_code
+
+    async def scenario_settings_read(client, session_id, state):
+        response = await client.get('/api/settings', headers=_cookie(session_id))
+        return response.status_code
+
+    async def scenario_settings_update(client, session_id, state):
+        response = await client.put('/api/settings/umap', json={'website': {'url': 'http://127.0.0.1'}},
+                                    headers=_cookie(session_id))
+        return response.status_code
+
+    async def scenario_validate_workspace(client, session_id, state):
+        response = await client.post('/api/settings/geoserver/validate-workspace', json={
+            'workspace': 'public',
+            'db_host': umap_db.get('host', 'localhost'),
+            'db_port': int(umap_db.get('port', 5432)),
+            'db_name': umap_db['dbname'],
+            'db_user': umap_db.get('user', ''),
+            'db_password': umap_db.get('password', '')
+        }, headers=_cookie(session_id))
+        return response.status_code
+
+    return {
+        'login': scenario_login,
+        'maps': scenario_maps,
+        'maps_conditional': scenario_maps_conditional,
+        'settings_read': scenario_settings_read,
+        'settings_update': scenario_settings_update,
+        'validate_workspace': scenario_validate_workspace,
+    }
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    # Nearest-Rank-Methode
+    index = min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def run_scenario(base_url: str, scenario, session_ids, duration: float, warmup: int) -> dict:
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=len(session_ids), max_keepalive_connections=len(session_ids))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def attempt(session_id, state) -> int:
+            try:
+                return await scenario(client, session_id, state)
+            except (httpx.HTTPError, RuntimeError, KeyError):
+                return 0
+
+        async def worker(session_id, measure_until):
+            nonlocal errors
+            state = {}
+            # Fehler beim Aufwärmen brechen den Lauf nicht ab; gezählt wird nur die Messphase
+            for _ in range(warmup):
+                await attempt(session_id, state)
+            while time.perf_counter() < measure_until:
+                started = time.perf_counter()
+                status = await attempt(session_id, state)
+                latencies.append(time.perf_counter() - started)
+                if not (200 <= status < 400):
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session_id, started + duration) for session_id in session_ids))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, current in result['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        # Fehlschläge sind oft schneller als Erfolge - mehr Fehler als in der Baseline ist immer eine Verschlechterung
+        old_errors = previous.get('errors', 0) if previous else 0
+        if current['errors'] > old_errors:
+            regressions.append(f"{name}.errors: {old_errors} -> {current['errors']}")
+        if not previous:
+            continue
+        for key, higher_is_better in COMPARED:
+            old, new = previous.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{name}.{key}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+async def run_all(base_url: str, scenarios: dict, names, concurrency: int, duration: float, warmup: int) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        session_ids = [await login(client) for _ in range(concurrency)]
+    results = {}
+    for name in names:
+        results[name] = await run_scenario(base_url, scenarios[name], session_ids, duration, warmup)
+        r = results[name]
+        print(f"{name:<20} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f} ms  "
+              f"p90 {r['p90_ms']:>8.2f} ms  p99 {r['p99_ms']:>8.2f} ms  Fehler {r['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Last- und Latenz-Benchmark für das Backend')
+    parser.add_argument('--dsn', required=True, help='Verbindung zur lokalen PostgreSQL (Datenbank zum Anlegen)')
+    parser.add_argument('--db-prefix', default='gis_bench')
+    parser.add_argument('--size', choices=sorted(seed_umap_db.SIZES), default='small')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='Messdauer pro Szenario in Sekunden')
+    parser.add_argument('--warmup', type=int, default=3, help='Aufwärmanfragen pro Verbindung')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--redis-url', help='Gemeinsamer Session-Speicher (nötig ab 2 Workern)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--keycloak-latency-ms', type=float, default=0.0)
+    parser.add_argument('--output-dir', default=str(REPO_DIR / 'benchmarks'))
+    parser.add_argument('--baseline', help='Früheres Ergebnis zum Vergleich')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Erlaubte Verschlechterung (0.15 = 15 %%)')
+    args = parser.parse_args()
+
+    names = [name for name in args.scenarios.split(',') if name]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unbekannte Szenarien: {', '.join(sorted(unknown))}")
+    if args.workers > 1 and not args.redis_url:
+        parser.error('--workers > 1 erfordert --redis-url (Sessions müssen zwischen Workern geteilt werden)')
+
+    django_dsn = ensure_database(args.dsn, f"{args.db_prefix}_django")
+    umap_dsn = ensure_database(args.dsn, f"{args.db_prefix}_umap")
+    media_root = tempfile.mkdtemp(prefix='gis-bench-media-')
+    print(f"Testdaten ({args.size}) ...")
+    dataset = seed_umap_db.seed(umap_dsn, media_root, args.size, USERNAME)
+
+    oidc = oidc_standin.make_server(realm=REALM, client_id=CLIENT_ID, username=USERNAME, groups=[GROUP],
+                                    latency=args.keycloak_latency_ms / 1000)
+    threading.Thread(target=oidc.serve_forever, daemon=True).start()
+    keycloak_url = f"http://127.0.0.1:{oidc.server_address[1]}"
+
+    env = backend_env(django_dsn, media_root, keycloak_url, args)
+    configure_settings(env, umap_dsn)
+    started = time.perf_counter()
+    backend = start_backend(env, args.port, args.workers)
+    startup_ms = round((time.perf_counter() - started) * 1000)
+    try:
+        scenarios = make_scenarios(conninfo_to_dict(umap_dsn))
+        results = asyncio.run(run_all(f"http://127.0.0.1:{args.port}", scenarios, names,
+                                      args.concurrency, args.duration, args.warmup))
+    finally:
+        backend.terminate()
+        backend.wait(timeout=30)
+        oidc.shutdown()
+
+    revision = git_revision()
+    result = {
+        'meta': {
+            'revision': revision,
+            'timestamp': datetime.now().isoformat(),
+            'size': args.size,
+            'dataset': dataset,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'workers': args.workers,
+            'startup_ms': startup_ms,
+            'session_backend': env['SESSION_BACKEND'],
+            'keycloak_latency_ms': args.keycloak_latency_ms,
+            'python': platform.python_version(),
+            'host': platform.node()
+        },
+        'scenarios': results
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output = output_dir / f"{revision}-{args.size}.json"
+    output.write_text(json.dumps(result, indent=2) + '\n')
+    print(f"Ergebnis: {output}")
+
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in regressions:
+            print(f"Verschlechterung: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
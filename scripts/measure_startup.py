@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Misst die Kaltstartzeit des FastAPI-Workers in frischen Python-Prozessen.
+
+- import: Zeit für "import main" (Django-Setup, alle Modul-Importe), Wall- und CPU-Zeit
+- ready (--serve): Zeit vom Start von uvicorn bis zur ersten erfolgreichen Antwort von /api/health
+
+Ausgewertet wird der Median über --runs Läufe. Liegt er über dem Zielwert (--target-import-ms,
+--target-ready-ms), endet das Skript mit Exit-Code 1. --imports zeigt die langsamsten
+Importe (python -X importtime) eines Laufs.
+
+    python3 scripts/measure_startup.py --runs 10 --serve
+
+Benötigt die üblichen Umgebungsvariablen des Backends; fehlende Pflichtwerte werden für die
+Messung mit Platzhaltern belegt. Für --serve muss die Django-Datenbank erreichbar sein.
+"""
+import argparse
+import base64
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+TARGET_IMPORT_MS = float(os.getenv('STARTUP_TARGET_IMPORT_MS', '1000'))
+TARGET_READY_MS = float(os.getenv('STARTUP_TARGET_READY_MS', '2000'))
+
+_IMPORT_PROBE = (
+    "import sys, time\n"
+    "wall, cpu = time.perf_counter(), time.process_time()\n"
+    "import main\n"
+    "print((time.perf_counter() - wall) * 1000, (time.process_time() - cpu) * 1000, len(sys.modules))\n"
+)
+
+
+def backend_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault('REQUIRED_GROUP', 'startup-probe')
+    env.setdefault('DJANGO_SECRET_KEY', 'startup-probe')
+    env.setdefault('FIELD_ENCRYPTION_KEY', base64.urlsafe_b64encode(b's' * 32).decode())
+    env.setdefault('TRACCAR_SYNC_ENABLED', 'false')
+    return env
+
+
+def measure_import(env: dict):
+    output = subprocess.run([sys.executable, '-c', _IMPORT_PROBE], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), float(output[1]), int(output[2])
+
+
+def measure_ready(env: dict, port: int) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        while time.perf_counter() - started < 60:
+            if process.poll() is not None:
+                raise RuntimeError(f"Backend beendet (Exit-Code {process.returncode})")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        raise RuntimeError("Backend nicht innerhalb von 60 s erreichbar")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def slowest_imports(env: dict, count: int):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.removeprefix('import time:').split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].rstrip()
+            # Nur direkt aus main bzw. Django-Setup importierte Module (eine Ebene tief)
+            if len(name) - len(name.lstrip()) == 3:
+                rows.append((int(parts[1]), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kaltstartzeit des Backends messen')
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--serve', action='store_true', help='Zusätzlich Zeit bis /api/health antwortet')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--target-import-ms', type=float, default=TARGET_IMPORT_MS)
+    parser.add_argument('--target-ready-ms', type=float, default=TARGET_READY_MS)
+    parser.add_argument('--imports', type=int, default=0, help='Anzahl der langsamsten Importe anzeigen')
+    args = parser.parse_args()
+
+    env = backend_env()
+    imports = [measure_import(env) for _ in range(args.runs)]
+    wall = statistics.median(run[0] for run in imports)
+    cpu = statistics.median(run[1] for run in imports)
+    print(f"import main: Median {wall:.0f} ms (CPU {cpu:.0f} ms, min {min(r[0] for r in imports):.0f} ms), "
+          f"{imports[0][2]} Module, Ziel {args.target_import_ms:.0f} ms")
+    failed = wall > args.target_import_ms
+
+    if args.serve:
+        ready = statistics.median(measure_ready(env, args.port) for _ in range(args.runs))
+        print(f"bereit (/api/health): Median {ready:.0f} ms, Ziel {args.target_ready_ms:.0f} ms")
+        failed = failed or ready > args.target_ready_ms
+
+    if args.imports:
+        print("Langsamste Importe (kumuliert):")
+        for micros, name in slowest_imports(env, args.imports):
+            print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    if failed:
+        print("Zielwert überschritten")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Lokaler KeyCloak-Ersatz (OpenID Connect) für Last- und Latenztests (scripts/benchmark.py).
+
+Stellt unter /realms/<realm>/protocol/openid-connect/ die Endpunkte auth, token (Grants
+authorization_code und refresh_token), certs und userinfo bereit. Tokens werden mit einem
+beim Start erzeugten RSA-Schlüssel signiert und enthalten die konfigurierten Gruppen,
+sodass das Backend sie wie echte KeyCloak-Tokens lokal gegen den JWKS prüft.
+
+    python3 scripts/oidc_standin.py --port 8083 --realm eizes --client-id eizes-gis --groups gis-users
+
+Danach das Backend mit KEYCLOAK_URL=http://127.0.0.1:8083 starten.
+"""
+import argparse
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+TOKEN_LIFETIME = 300
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    realm = 'eizes'
+    client_id = 'eizes-gis'
+    username = 'benchmark'
+    groups = ['gis-users']
+    # Künstliche Antwortzeit pro Anfrage, um die Latenz eines entfernten KeyCloak nachzubilden
+    latency = 0.0
+    key = None
+    kid = 'standin'
+    codes = {}
+    refresh_tokens = {}
+    codes_lock = threading.Lock()
+
+    @property
+    def issuer(self) -> str:
+        return f"http://{self.headers.get('Host')}/realms/{self.realm}"
+
+    def _send(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _redirect(self, location: str):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _claims(self, username: str) -> dict:
+        now = int(time.time())
+        return {
+            'iss': self.issuer,
+            'sub': f"user-{username}",
+            'aud': self.client_id,
+            'azp': self.client_id,
+            'iat': now,
+            'exp': now + TOKEN_LIFETIME,
+            'preferred_username': username,
+            'email': f"{username}@example.org",
+            'name': username.title(),
+            'groups': self.groups
+        }
+
+    def _tokens(self, username: str) -> dict:
+        claims = self._claims(username)
+        headers = {'kid': self.kid}
+        refresh_token = secrets.token_urlsafe(24)
+        with self.codes_lock:
+            self.refresh_tokens[refresh_token] = username
+        return {
+            'access_token': jwt.encode({**claims, 'typ': 'Bearer'}, self.key, algorithm='RS256', headers=headers),
+            'id_token': jwt.encode({**claims, 'typ': 'ID'}, self.key, algorithm='RS256', headers=headers),
+            'refresh_token': refresh_token,
+            'token_type': 'Bearer',
+            'expires_in': TOKEN_LIFETIME
+        }
+
+    def _endpoint(self, path: str):
+        prefix = f"/realms/{self.realm}/protocol/openid-connect/"
+        return path[len(prefix):] if path.startswith(prefix) else None
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        endpoint = self._endpoint(url.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if endpoint == 'auth':
+            if 'redirect_uri' not in query:
+                return self._send(400, {'error': 'invalid_request'})
+            code = secrets.token_urlsafe(16)
+            with self.codes_lock:
+                self.codes[code] = query.get('login_hint', self.username)
+            return self._redirect(f"{query['redirect_uri']}?{urlencode({'code': code, 'state': query.get('state', '')})}")
+        if endpoint == 'certs':
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.key.public_key()))
+            return self._send(200, {'keys': [{**jwk, 'kid': self.kid, 'use': 'sig', 'alg': 'RS256'}]})
+        if endpoint == 'userinfo':
+            token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+            try:
+                claims = jwt.decode(token, self.key.public_key(), algorithms=['RS256'], audience=self.client_id)
+            except jwt.InvalidTokenError:
+                return self._send(401, {'error': 'invalid_token'})
+            return self._send(200, {k: claims[k] for k in ('sub', 'preferred_username', 'email', 'name', 'groups')})
+        self._send(404, {'error': 'not_found'})
+
+    def do_POST(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._endpoint(urlparse(self.path).path) != 'token':
+            return self._send(404, {'error': 'not_found'})
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        if form.get('client_id') != self.client_id:
+            return self._send(401, {'error': 'invalid_client'})
+        grant_type = form.get('grant_type')
+        if grant_type == 'authorization_code':
+            with self.codes_lock:
+                username = self.codes.pop(form.get('code'), None)
+            if username is None:
+                return self._send(400, {'error': 'invalid_grant'})
+            return self._send(200, self._tokens(username))
+        if grant_type == 'refresh_token':
+            with self.codes_lock:
+                username = self.refresh_tokens.pop(form.get('refresh_token'), None)
+            if username is None:
+                return self._send(400, {'error': 'invalid_grant'})
+            return self._send(200, self._tokens(username))
+        self._send(400, {'error': 'unsupported_grant_type'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port: int = 0, realm: str = 'eizes', client_id: str = 'eizes-gis', username: str = 'benchmark',
+                groups=('gis-users',), latency: float = 0.0) -> ThreadingHTTPServer:
+    """Erzeugt den Server (port=0: freier Port); gestartet wird er mit serve_forever()."""
+    Handler.realm, Handler.client_id, Handler.username = realm, client_id, username
+    Handler.groups, Handler.latency = list(groups), latency
+    Handler.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lokaler KeyCloak-Ersatz (OIDC)')
+    parser.add_argument('--port', type=int, default=8083)
+    parser.add_argument('--realm', default='eizes')
+    parser.add_argument('--client-id', default='eizes-gis')
+    parser.add_argument('--username', default='benchmark')
+    parser.add_argument('--groups', default='gis-users', help='Kommagetrennte Gruppen im Token')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Künstliche Antwortzeit pro Anfrage')
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.realm, args.client_id, args.username,
+                         [g for g in args.groups.split(',') if g], args.latency_ms / 1000)
+    print(f"OIDC-Ersatz auf http://127.0.0.1:{args.port}/realms/{args.realm}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
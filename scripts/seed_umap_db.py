@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Befüllt eine lokale PostgreSQL-Datenbank mit uMap-Testdaten (scripts/benchmark.py).
+
+Legt die vom Backend gelesenen Tabellen auth_user, umap_map und umap_datalayer in ihrer
+minimalen Form an (nur die benötigten Spalten) und schreibt die GeoJSON-Dateien der
+Datalayer unter MEDIA_ROOT. Die Daten sind deterministisch; ein erneuter Lauf mit
+derselben Größe ersetzt den vorherigen Stand.
+
+    python3 scripts/seed_umap_db.py --dsn postgresql://localhost/gis_bench_umap --media /tmp/umap-media --size medium
+
+Das Backend braucht danach UMAP_MEDIA_ROOT=<media> und eine 'umap'-Zeile in Settings.
+"""
+import argparse
+import json
+import math
+import random
+import shutil
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psycopg
+
+# Größe -> (Karten des Benchmark-Benutzers, Datalayer pro Karte, Features pro Datalayer, Karten anderer Benutzer)
+SIZES = {
+    'small': (20, 2, 50, 20),
+    'medium': (200, 4, 200, 1000),
+    'large': (2000, 5, 200, 10000),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS auth_user (
+    id serial PRIMARY KEY,
+    username varchar(150) NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS umap_map (
+    id serial PRIMARY KEY,
+    name varchar(200) NOT NULL,
+    slug varchar(50) NOT NULL,
+    share_status integer NOT NULL DEFAULT 1,
+    created_at timestamptz NOT NULL,
+    modified_at timestamptz NOT NULL,
+    owner_id integer REFERENCES auth_user(id)
+);
+CREATE INDEX IF NOT EXISTS umap_map_owner_id ON umap_map (owner_id);
+CREATE TABLE IF NOT EXISTS umap_datalayer (
+    id serial PRIMARY KEY,
+    map_id integer NOT NULL REFERENCES umap_map(id) ON DELETE CASCADE,
+    name varchar(200) NOT NULL,
+    geojson varchar(200) NOT NULL,
+    modified_at timestamptz NOT NULL
+);
+CREATE INDEX IF NOT EXISTS umap_datalayer_map_id ON umap_datalayer (map_id);
+"""
+
+
+def _feature(rng: random.Random, index: int) -> dict:
+    lon, lat = 6 + rng.random() * 9, 47 + rng.random() * 8
+    kind = index % 3
+    if kind == 0:
+        geometry = {'type': 'Point', 'coordinates': [lon, lat]}
+    elif kind == 1:
+        geometry = {'type': 'LineString', 'coordinates': [[lon + i * 0.01, lat + math.sin(i) * 0.01] for i in range(8)]}
+    else:
+        ring = [[lon + 0.02 * math.cos(a / 6 * math.pi), lat + 0.02 * math.sin(a / 6 * math.pi)] for a in range(12)]
+        geometry = {'type': 'Polygon', 'coordinates': [ring + [ring[0]]]}
+    return {'type': 'Feature', 'geometry': geometry, 'properties': {'name': f"Objekt {index}", 'wert': index}}
+
+
+def seed(dsn: str, media_root: str, size: str, username: str = 'benchmark') -> dict:
+    maps, layers_per_map, features_per_layer, foreign_maps = SIZES[size]
+    rng = random.Random(size)
+    media = Path(media_root)
+    shutil.rmtree(media / 'datalayer', ignore_errors=True)
+    (media / 'datalayer').mkdir(parents=True)
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    with psycopg.connect(dsn) as conn:
+        conn.execute(SCHEMA)
+        conn.execute("TRUNCATE umap_datalayer, umap_map, auth_user RESTART IDENTITY CASCADE")
+        owner_id = conn.execute("INSERT INTO auth_user (username) VALUES (%s) RETURNING id", [username]).fetchone()[0]
+        other_id = conn.execute("INSERT INTO auth_user (username) VALUES ('andere') RETURNING id").fetchone()[0]
+
+        with conn.cursor() as cur:
+            with cur.copy("COPY umap_map (name, slug, share_status, created_at, modified_at, owner_id) FROM STDIN") as copy:
+                for i in range(maps + foreign_maps):
+                    created = base + timedelta(hours=i)
+                    copy.write_row([f"Karte {i}", f"karte-{i}", i % 3 + 1, created,
+                                    created + timedelta(minutes=rng.randint(0, 10000)),
+                                    owner_id if i < maps else other_id])
+
+            # Dateien nur für die Karten des Benchmark-Benutzers (nur diese liest das Backend)
+            with cur.copy("COPY umap_datalayer (map_id, name, geojson, modified_at) FROM STDIN") as copy:
+                for map_id in range(1, maps + 1):
+                    for layer in range(layers_per_map):
+                        relative = f"datalayer/{map_id % 100}/{map_id}_{layer}.geojson"
+                        path = media / relative
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        features = [_feature(rng, n) for n in range(features_per_layer)]
+                        path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+                        copy.write_row([map_id, f"Ebene {layer}", relative, base + timedelta(days=map_id)])
+        conn.execute("ANALYZE umap_map")
+        conn.execute("ANALYZE umap_datalayer")
+
+    return {
+        'size': size,
+        'maps': maps,
+        'datalayers': maps * layers_per_map,
+        'features_per_layer': features_per_layer,
+        'foreign_maps': foreign_maps
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='uMap-Testdaten erzeugen')
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--media', required=True, help='MEDIA_ROOT für die GeoJSON-Dateien')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--username', default='benchmark')
+    args = parser.parse_args()
+    print(json.dumps(seed(args.dsn, args.media, args.size, args.username)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Lokaler Traccar-Ersatz zum Testen der Positions-Synchronisation (backend/traccar_sync.py).
+
+Stellt /api/devices und /api/positions?deviceId=&from=&to= bereit. Jedes Gerät meldet
+rechnerisch alle INTERVAL Sekunden eine Position auf einer Kreisbahn; die Daten sind
+deterministisch, sodass wiederholte Abfragen dieselben IDs liefern.
+
+    python3 scripts/traccar_standin.py --port 8082 --devices 5 --token test
+
+Danach in den Settings für 'traccar' die URL http://localhost:8082 und das Token eintragen.
+"""
+import argparse
+import json
+import math
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _format_time(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000+00:00')
+
+
+def make_position(device_id: int, index: int, interval: int) -> dict:
+    fix_time = datetime.fromtimestamp(EPOCH.timestamp() + index * interval, tz=timezone.utc)
+    angle = (index % 360) * math.pi / 180
+    return {
+        'id': device_id * 1_000_000_000 + index,
+        'deviceId': device_id,
+        'protocol': 'osmand',
+        'serverTime': _format_time(fix_time),
+        'deviceTime': _format_time(fix_time),
+        'fixTime': _format_time(fix_time),
+        'outdated': False,
+        'valid': True,
+        'latitude': 52.52 + 0.01 * device_id + 0.005 * math.sin(angle),
+        'longitude': 13.40 + 0.005 * math.cos(angle),
+        'altitude': 34.0,
+        'speed': 12.5,
+        'course': (index % 360) * 1.0,
+        'address': None,
+        'accuracy': 5.0,
+        'attributes': {'batteryLevel': 100 - index % 100, 'motion': True}
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    devices = 3
+    interval = 30
+    token = None
+
+    def _send(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        # Wie beim echten Server ohne Anmeldung abrufbar
+        if urlparse(self.path).path == '/api/server':
+            return self._send(200, {'id': 1, 'version': 'standin', 'registration': False})
+        if self.token and self.headers.get('Authorization') != f"Bearer {self.token}":
+            return self._send(401, {'message': 'Unauthorized'})
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/api/devices':
+            return self._send(200, [
+                {'id': i, 'name': f"Fahrzeug {i}", 'uniqueId': f"standin-{i}", 'status': 'online'}
+                for i in range(1, self.devices + 1)
+            ])
+        if url.path == '/api/positions':
+            try:
+                device_id = int(query['deviceId'][0])
+                start, end = _parse_time(query['from'][0]), _parse_time(query['to'][0])
+            except (KeyError, ValueError):
+                return self._send(400, {'message': 'deviceId, from und to erforderlich'})
+            # Nur vergangene Positionen, wie beim echten Server
+            end = min(end, datetime.now(timezone.utc))
+            first = max(0, math.ceil((start - EPOCH).total_seconds() / self.interval))
+            last = math.floor((end - EPOCH).total_seconds() / self.interval)
+            return self._send(200, [make_position(device_id, i, self.interval) for i in range(first, last + 1)])
+        self._send(404, {'message': 'Not found'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lokaler Traccar-Ersatz')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--devices', type=int, default=3)
+    parser.add_argument('--interval', type=int, default=30, help='Sekunden zwischen zwei Positionen')
+    parser.add_argument('--token', help='Erwartetes Bearer-Token (optional)')
+    args = parser.parse_args()
+
+    Handler.devices, Handler.interval, Handler.token = args.devices, args.interval, args.token
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    print(f"Traccar-Ersatz auf http://127.0.0.1:{args.port} ({args.devices} Geräte)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()